@@ -30,8 +30,6 @@ from gbp.errors import GbpError
 from gbp.git.repository import GitRepository, GitRepositoryError
 from gbp.scripts.common.buildpackage import dump_tree
 
-bb = None
-
 #   pylint: disable=bad-continuation
 
 
@@ -497,5 +495,29 @@ def guess_pkg(tinfoil, pkg):
     return pkg_bb
 
 
+class _LazyBitbake(object):
+    """
+    The bitbake module, imported when used or tested for the first time.
+    Locating and importing bitbake is slow and not needed for e.g. --help.
+    """
+    _loaded = False
+    _module = None
+
+    def _load(self):
+        """Import bitbake, C{None} if not available"""
+        if not self._loaded:
+            self._module = import_bb()
+            self._loaded = True
+        return self._module
+
+    def __nonzero__(self):
+        return self._load() is not None
+
+    def __getattr__(self, name):
+        module = self._load()
+        if module is None:
+            raise AttributeError(name)
+        return getattr(module, name)
+
 # Initialize module
-bb = import_bb()
+bb = _LazyBitbake()
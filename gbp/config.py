@@ -635,6 +635,11 @@ class GbpOptionParserRpm(GbpOptionParser):
             'spawn-editor'              : 'always',
             'editor-cmd'                : 'vim',
             'meta-bts'                  : '(Close|Closes|Fixes|Fix)',
+            'spec-cache'                : 'False',
+            'orig-cache-dir'            : '',
+            'orig-cache-size'           : '4G',
+            'compression-threads'       : '1',
+            'deterministic-tarballs'    : 'False',
                     })
 
     help = dict(GbpOptionParser.help)
@@ -712,6 +717,29 @@ class GbpOptionParserRpm(GbpOptionParser):
                 "default is '%(git-author)s'",
             'meta-bts':
                 "Meta tags for the bts commands, default is '%(meta-bts)s'",
+            'spec-cache':
+                "Store spec file parse results on disk, under the "
+                "'gbp-cache' directory in the git dir, so that an unchanged "
+                "spec file is not re-parsed by later runs, default is "
+                "'%(spec-cache)s'",
+            'orig-cache-dir':
+                "Directory for caching generated upstream tarballs, shared "
+                "between builds, default is '%(orig-cache-dir)s' (no cache)",
+            'orig-cache-size':
+                "Maximum total size of the upstream tarball cache, least "
+                "recently used tarballs are removed when exceeded, default is "
+                "'%(orig-cache-size)s'",
+            'compression-threads':
+                "Number of threads for compressing generated tarballs, "
+                "'auto' for the number of CPUs. More than one thread uses a "
+                "multi-threaded compressor if available, whose output "
+                "differs from the standard tools, default is "
+                "'%(compression-threads)s'",
+            'deterministic-tarballs':
+                "Always compress generated tarballs with the standard "
+                "single-threaded tools so that the output is byte-identical "
+                "between builds and hosts, default is "
+                "'%(deterministic-tarballs)s'",
                  })
 
 class GbpOptionParserBB(GbpOptionParserRpm):
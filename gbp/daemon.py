@@ -0,0 +1,217 @@
+# vim: set fileencoding=utf-8 :
+#
+# (C) 2026 agent <agent@local>
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+Run gbp commands in a long-running server, see L{gbp.scripts.daemon}
+
+This module has the client side and the wire format. The supercommand
+imports it on every invocation so it only uses cheap standard modules.
+"""
+
+import errno
+import os
+import signal
+import stat
+import struct
+import sys
+
+# Frames sent by the server: stdout and stderr data, the exit status and
+# the request to run the command locally
+STDOUT, STDERR, EXIT, LOCAL = 'o', 'e', 'x', 'l'
+# Frames sent by the client: signals to pass to the command
+SIGNAL = 's'
+_HEADER = struct.Struct('!cI')
+_LENGTH = struct.Struct('!I')
+
+
+def socket_path():
+    """
+    The path of the server socket, I{GBP_DAEMON_SOCKET} if set in the
+    environment. An empty I{GBP_DAEMON_SOCKET} disables the server.
+
+    @rtype: C{str}
+    """
+    path = os.environ.get('GBP_DAEMON_SOCKET')
+    if path is None:
+        tmpdir = os.environ.get('XDG_RUNTIME_DIR') or '/tmp'
+        path = os.path.join(tmpdir, 'gbp-daemon-%d.sock' % os.getuid())
+    return path
+
+
+def code_identity():
+    """
+    Version and location of the gbp modules, the server only runs commands
+    of clients using the same code
+
+    @rtype: C{str}
+    """
+    try:
+        from gbp.version import gbp_version
+    except ImportError:
+        gbp_version = '[Unknown version]'
+    return '%s %s' % (gbp_version, os.path.dirname(os.path.abspath(__file__)))
+
+
+def _stdin_unused():
+    """
+    Check that the standard input can't carry data for the command, i.e.
+    it's closed or I{/dev/null}. Commands run in the server don't get it.
+    """
+    try:
+        info = os.fstat(0)
+    except OSError:
+        return True
+    devnull = os.stat(os.devnull)
+    return stat.S_ISCHR(info.st_mode) and info.st_rdev == devnull.st_rdev
+
+
+def recv_exactly(sock, size):
+    """Receive I{size} bytes, less only if the connection is closed"""
+    import socket
+    data = []
+    while size:
+        try:
+            chunk = sock.recv(size)
+        except socket.error as err:
+            # Interrupted by a signal that is passed on to the command
+            if err.args[0] == errno.EINTR:
+                continue
+            raise
+        if not chunk:
+            break
+        data.append(chunk)
+        size -= len(chunk)
+    return ''.join(data)
+
+
+def send_frame(sock, channel, data):
+    """Send a frame of output or the exit status to the client"""
+    sock.sendall(_HEADER.pack(channel, len(data)) + data)
+
+
+def read_frame(sock):
+    """
+    Read a frame sent with L{send_frame}
+
+    @return: the channel and the data, C{None} if the connection is closed
+    @rtype: C{tuple}
+    """
+    header = recv_exactly(sock, _HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+    channel, size = _HEADER.unpack(header)
+    data = recv_exactly(sock, size)
+    if len(data) < size:
+        return None
+    return channel, data
+
+
+def read_request(sock):
+    """
+    Read a request sent by L{forward}
+
+    @return: L{code_identity}, working directory, umask, command line and
+        environment of the client, C{None} if the client went away
+    @rtype: C{tuple}
+    """
+    header = recv_exactly(sock, _LENGTH.size)
+    if len(header) < _LENGTH.size:
+        return None
+    size = _LENGTH.unpack(header)[0]
+    fields = recv_exactly(sock, size).split('\0')
+    identity, cwd, umask, argc = fields[:4]
+    argv = fields[4:4 + int(argc)]
+    env = dict([var.split('=', 1) for var in fields[4 + int(argc):]])
+    return identity, cwd, int(umask), argv, env
+
+
+def forward(argv, path=None):
+    """
+    Run a gbp command in the server
+
+    @param argv: the command line, starting with the program name
+    @type argv: C{list} of C{str}
+    @param path: path of the server socket, L{socket_path} if not given
+    @type path: C{str}
+    @return: the exit status of the command or C{None} if the command has
+        to be run locally, e.g. because no server is running
+    @rtype: C{int}
+    """
+    # The server can't pass on data from the standard input, or the
+    # terminal e.g. for an editor
+    if not _stdin_unused():
+        return None
+    path = socket_path() if path is None else path
+    try:
+        # Only trust sockets of our own
+        if not path or os.stat(path).st_uid != os.getuid():
+            return None
+    except OSError:
+        return None
+    # Not imported before there's a server to talk to as it's costly
+    import socket
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        sock.close()
+        return None
+
+    umask = os.umask(0)
+    os.umask(umask)
+    fields = [code_identity(), os.getcwd(), str(umask), str(len(argv))]
+    fields += list(argv)
+    fields += ['%s=%s' % item for item in os.environ.items()]
+    request = '\0'.join(fields)
+
+    # Pass interruptions on to the command
+    signals = []
+    def pass_signal(signum, dummy):
+        signals.append(signum)
+        try:
+            send_frame(sock, SIGNAL, str(signum))
+        except socket.error:
+            pass
+    old_handlers = {}
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        old_handlers[signum] = signal.signal(signum, pass_signal)
+    try:
+        sock.sendall(_LENGTH.pack(len(request)) + request)
+        streams = {STDOUT: sys.stdout, STDERR: sys.stderr}
+        while True:
+            frame = read_frame(sock)
+            if frame is None:
+                break
+            channel, data = frame
+            if channel == EXIT:
+                return int(data)
+            elif channel == LOCAL:
+                return None
+            streams[channel].write(data)
+            streams[channel].flush()
+    except socket.error as err:
+        sys.stderr.write("gbp daemon: %s\n" % err)
+    finally:
+        sock.close()
+        for signum, handler in old_handlers.items():
+            signal.signal(signum, handler)
+    if signals:
+        # Killed by the signal, like the shell reports it
+        return 128 + signals[-1]
+    sys.stderr.write("gbp daemon: connection lost\n")
+    return 1
+
+# vim:et:ts=4:sw=4:et:sts=4:ai:set list listchars=tab\:»·,trail\:·:
@@ -26,6 +26,8 @@ from gbp.git import GitRepositoryError
 # Make sure these are available with 'import gbp.deb'
 from gbp.deb.changelog import ChangeLog, NoChangeLogError
 from gbp.deb.policy import DebianPkgPolicy
+from gbp.deb.version import DebianVersion, DebianVersionError, sort_versions
+from gbp.deb.version import compare_versions
 
 class DpkgCompareVersions(gbpc.Command):
     dpkg = '/usr/bin/dpkg'
@@ -98,9 +100,4 @@ def get_arch():
     return arch
 
 
-def compare_versions(version1, version2):
-    """compares to Debian versionnumbers suitable for sort()"""
-    return DpkgCompareVersions()(version1, version2)
-
-
 # vim:et:ts=4:sw=4:et:sts=4:ai:set list listchars=tab\:»·,trail\:·:
@@ -18,8 +18,10 @@
 
 from __future__ import print_function
 
+import calendar
 import email
 import os
+import re
 import subprocess
 from gbp.command_wrappers import Command
 
@@ -32,6 +34,34 @@ class ParseChangeLogError(Exception):
     pass
 
 
+# Regular expressions from dpkg's Dpkg::Changelog::Entry::Debian
+_name_chars = r'[-+0-9a-z.]'
+_header_re = re.compile(r'^(\w%s*) \(([^\(\) \t]+)\)((?:\s+%s+)+)\;(.*?)\s*$'
+                        % (_name_chars, _name_chars), re.I)
+_trailer_re = re.compile(r'^ \-\- (.*) \<(.*)\>(  ?)'
+                         r'(((\w+)\,\s*)?(\d{1,2})\s+(\w+)\s+(\d{4})\s+'
+                         r'(\d{1,2}):(\d\d):(\d\d)\s+([-+])(\d\d)(\d\d))\s*$')
+_closes_re = re.compile(r'closes:\s*(?:bug)?\#?\s?\d+(?:,\s*(?:bug)?\#?\s?\d+)*',
+                        re.I)
+_end_re = re.compile(r'^((;;\s*)?Local variables:|vim:)', re.I)
+_skip_re = re.compile(r'^(\$\w+:.*\$|\# |/\*.*\*/)')
+
+_weekdays = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+_months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep',
+           'Oct', 'Nov', 'Dec']
+
+
+def _lines(contents):
+    """Iterate over the lines of a string without splitting all of it"""
+    start = 0
+    while start < len(contents):
+        end = contents.find('\n', start)
+        if end < 0:
+            end = len(contents)
+        yield contents[start:end]
+        start = end + 1
+
+
 class ChangeLogSection(object):
     """A section in the changelog describing one particular version"""
     def __init__(self, package, version):
@@ -62,6 +92,187 @@ class ChangeLogSection(object):
         return klass(package, version)
 
 
+class _TopEntry(object):
+    """
+    Parse the topmost entry of a changelog like I{dpkg-parsechangelog}
+    does without running it
+
+    Only entries that dpkg parses without warnings are handled, L{parse}
+    returns C{None} for anything else so the caller can let dpkg report
+    the problem.
+    """
+    @classmethod
+    def parse(klass, contents):
+        """
+        Parse the topmost changelog entry
+
+        >>> print(_TopEntry.parse("foo (1:1.0-1) unstable; urgency=HIGH\\n\\n"
+        ...       "  * Closes: #12, 3\\n\\n"
+        ...       " -- Joe <joe@example.com>  Mon, 17 Oct 2011 10:15:22 +0200\\n"),
+        ...       end='')
+        Source: foo
+        Version: 1:1.0-1
+        Distribution: unstable
+        Urgency: high
+        Maintainer: Joe <joe@example.com>
+        Timestamp: 1318839322
+        Date: Mon, 17 Oct 2011 10:15:22 +0200
+        Closes: 3 12
+        Changes:
+         foo (1:1.0-1) unstable; urgency=HIGH
+         .
+           * Closes: #12, 3
+        >>> _TopEntry.parse("foo (1.0-1) unstable; urgency=low\\n")
+
+        @param contents: the changelog
+        @type contents: C{str}
+        @return: the entry in the output format of I{dpkg-parsechangelog}
+            or C{None} if dpkg needs to parse the changelog
+        @rtype: C{str}
+        """
+        lines = _lines(contents)
+        for line in lines:
+            if not _skip_re.match(line):
+                break
+        else:
+            return None
+        header = _header_re.match(line)
+        if not header:
+            return None
+        source, version, dists, options = header.groups()
+        fields = klass._header_fields(options)
+        if fields is None or not klass._valid_version(version):
+            return None
+
+        changes = []
+        blanks = []
+        for line in lines:
+            if not line.strip():
+                if changes:
+                    blanks.append(line)
+            elif line[0] not in ' \t':
+                return None
+            elif line.startswith(' --'):
+                break
+            elif re.match(r'\s{2,}\S', line):
+                changes.extend(blanks)
+                changes.append(line)
+                blanks = []
+            else:
+                return None
+        else:
+            return None
+        trailer = _trailer_re.match(line)
+        if not trailer or not changes:
+            return None
+        timestamp = klass._timestamp(trailer)
+        if timestamp is None:
+            return None
+        # dpkg adds stray lines after the trailer to the entry, so only
+        # blank lines and comments may come before the next header
+        for line in lines:
+            if _header_re.match(line) or _end_re.match(line):
+                break
+            elif line.strip() and not _skip_re.match(line):
+                return None
+
+        closes = set()
+        for match in _closes_re.finditer('\n'.join(changes)):
+            closes.update(re.findall(r'\#?\s?(\d+)', match.group(0)))
+        out = [('Source', source)]
+        if 'Binary-Only' in fields:
+            out.append(('Binary-Only', fields.pop('Binary-Only')))
+        urgency = fields.pop('Urgency', 'unknown').split()[0].lower()
+        out += [('Version', version),
+                ('Distribution', ' '.join(dists.split())),
+                ('Urgency', urgency),
+                ('Maintainer', '%s <%s>' % trailer.group(1, 2)),
+                ('Timestamp', str(timestamp)),
+                ('Date', trailer.group(4))]
+        if closes:
+            out.append(('Closes', ' '.join(sorted(closes, key=int))))
+        out.append(('Changes', '\n%s\n\n%s' % (header.group(0).rstrip(),
+                                               '\n'.join(changes))))
+        out += sorted(fields.items())
+        return ''.join([klass._field(name, value) for name, value in out])
+
+    @staticmethod
+    def _header_fields(options):
+        """The key=value pairs of the header, C{None} if dpkg would warn"""
+        fields = {}
+        options = options.strip()
+        if not options:
+            return fields
+        for option in re.split(r'\s*,\s*', options):
+            match = re.match(r'^([-0-9a-z]+)\=\s*(.*\S)$', option, re.I)
+            if not match:
+                return None
+            key = '-'.join([part.capitalize()
+                            for part in match.group(1).split('-')])
+            value = match.group(2)
+            if key in fields:
+                return None
+            elif key == 'Urgency':
+                if not re.match(r'^([-0-9a-z]+)((\s+.*)?)$', value, re.I):
+                    return None
+            elif key == 'Binary-Only':
+                if value != 'yes':
+                    return None
+            elif not re.match(r'^X[BCS]+-', key, re.I):
+                return None
+            fields[key] = value
+        return fields
+
+    @staticmethod
+    def _valid_version(version):
+        """Whether dpkg considers the version of an entry valid"""
+        match = re.match(r'^([^:]*):(.+)$', version)
+        upstream = match.group(2) if match else version
+        if match and not re.match(r'^\d+$', match.group(1)):
+            return False
+        match = re.match(r'^(.*)-(.*)$', upstream)
+        if match:
+            upstream, revision = match.groups()
+            if not revision:
+                return False
+        return bool(re.match(r'^\d', upstream) and
+                    re.match(r'^[-+:.0-9a-zA-Z~]+$', version))
+
+    @staticmethod
+    def _timestamp(trailer):
+        """The time of a changelog trailer, C{None} if dpkg would warn"""
+        (sep, weekday, day, month, year, hour, minute, second, sign, tz_hour,
+         tz_minute) = trailer.group(3, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15)
+        if sep != '  ' or month not in _months:
+            return None
+        if weekday is not None and weekday not in _weekdays:
+            return None
+        month = _months.index(month) + 1
+        day, year, hour, minute, second, tz_hour, tz_minute = [
+            int(value) for value in (day, year, hour, minute, second,
+                                     tz_hour, tz_minute) ]
+        if (not 1 <= day <= calendar.monthrange(year, month)[1] or
+                hour > 23 or minute > 59 or second > 59 or tz_minute > 59):
+            return None
+        offset = (tz_hour * 60 + tz_minute) * 60
+        if sign == '-':
+            offset = -offset
+        return calendar.timegm((year, month, day, hour, minute, second)) - offset
+
+    @staticmethod
+    def _field(name, value):
+        """Format a field like dpkg's control file output does it"""
+        lines = value.split('\n')
+        out = '%s:%s\n' % (name, ' %s' % lines[0] if lines[0] else '')
+        for line in lines[1:]:
+            line = line.rstrip()
+            if not line or re.match(r'^\.+$', line):
+                out += ' .%s\n' % line
+            else:
+                out += ' %s\n' % line
+        return out
+
+
 class ChangeLog(object):
     """A Debian changelog"""
 
@@ -91,14 +302,9 @@ class ChangeLog(object):
 
     def _parse(self):
         """Parse a changelog based on the already read contents."""
-        cmd = subprocess.Popen(['dpkg-parsechangelog', '-l-'],
-                                stdin=subprocess.PIPE,
-                                stdout=subprocess.PIPE,
-                                stderr=subprocess.PIPE)
-        (output, errors) = cmd.communicate(self._contents)
-        if cmd.returncode:
-            raise ParseChangeLogError("Failed to parse changelog. "
-                                      "dpkg-parsechangelog said:\n%s" % (errors, ))
+        output = _TopEntry.parse(self._contents)
+        if output is None:
+            output = self._parse_dpkg()
         # Parse the result of dpkg-parsechangelog (which looks like
         # email headers)
         cp = email.message_from_string(output)
@@ -116,6 +322,18 @@ class ChangeLog(object):
 
         self._cp = cp
 
+    def _parse_dpkg(self):
+        """Parse the topmost entry with dpkg-parsechangelog"""
+        cmd = subprocess.Popen(['dpkg-parsechangelog', '-l-'],
+                                stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        (output, errors) = cmd.communicate(self._contents)
+        if cmd.returncode:
+            raise ParseChangeLogError("Failed to parse changelog. "
+                                      "dpkg-parsechangelog said:\n%s" % (errors, ))
+        return output
+
     def _read(self):
             with open(self.filename) as f:
                 self._contents = f.read()
@@ -196,14 +414,12 @@ class ChangeLog(object):
         """
         Iterate over sections in the changelog
         """
-        section = ''
-        for line in self._contents.split('\n'):
-            if line and line[0] not in [ ' ', '\t' ]:
-                section += line
-            else:
-                if section:
-                    yield ChangeLogSection.parse(section)
-                    section = ''
+        for line in _lines(self._contents):
+            if _end_re.match(line):
+                break
+            header = _header_re.match(line)
+            if header:
+                yield ChangeLogSection(*header.group(1, 2))
 
     @property
     def sections(self):
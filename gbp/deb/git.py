@@ -50,7 +50,7 @@ class DebianGitRepository(GitRepository):
         legacy_tag = self._build_legacy_tag(format, version)
         if self.has_tag(tag): # new tags are injective
             # dereference to a commit object
-            return self.rev_parse("%s^0" % tag)
+            return self._ref_commit('refs/tags/%s' % tag)
         elif self.has_tag(legacy_tag):
             out, ret = self._git_getoutput('cat-file', args=['-p', legacy_tag])
             if ret:
@@ -0,0 +1,194 @@
+# vim: set fileencoding=utf-8 :
+#
+# (C) 2026 agent <agent@local>
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""Compare Debian version numbers like dpkg does"""
+
+import re
+import string
+
+
+class DebianVersionError(Exception):
+    pass
+
+
+class DebianVersion(object):
+    """
+    A Debian version number
+
+    Versions compare like I{dpkg --compare-versions} does it. The parts
+    of the version are turned into a sort key once so comparing versions
+    and sorting lists of them doesn't need to parse them again.
+
+    >>> v = DebianVersion('1:2.0~rc1-3')
+    >>> (v.epoch, v.upstream, v.revision)
+    (1, '2.0~rc1', '3')
+    >>> DebianVersion('2.0~rc1') < DebianVersion('2.0') < DebianVersion('2.0-1')
+    True
+    >>> DebianVersion('1.0-0') == DebianVersion('1.0')
+    True
+    >>> DebianVersion('1.0 1')
+    Traceback (most recent call last):
+    ...
+    DebianVersionError: Version '1.0 1' has embedded spaces
+    """
+    _part_re = re.compile(r'(\D*)(\d*)')
+    # A part of a version that is compared with the remaining parts of a
+    # longer version
+    _end = ((0,), 0)
+
+    def __init__(self, version):
+        self.version = version
+        self.epoch, self.upstream, self.revision = self._parse(version)
+        self.key = (self.epoch,
+                    self.part_key(self.upstream),
+                    self.part_key(self.revision))
+
+    @staticmethod
+    def _parse(version):
+        """Split a version into epoch, upstream version and revision"""
+        rest = version.strip()
+        if not rest:
+            raise DebianVersionError("Version is empty")
+        if len(rest.split()) > 1:
+            raise DebianVersionError("Version '%s' has embedded spaces" %
+                                     version)
+        epoch = 0
+        if ':' in rest:
+            epoch, rest = rest.split(':', 1)
+            if not epoch:
+                raise DebianVersionError("Epoch in version '%s' is empty" %
+                                         version)
+            if not epoch.isdigit():
+                raise DebianVersionError("Epoch in version '%s' is not a "
+                                         "number" % version)
+            if not rest:
+                raise DebianVersionError("Nothing after colon in version "
+                                         "'%s'" % version)
+            epoch = int(epoch)
+        upstream, hyphen, revision = rest.rpartition('-')
+        if not hyphen:
+            upstream, revision = revision, ''
+        elif not revision:
+            raise DebianVersionError("Revision of version '%s' is empty" %
+                                     version)
+        if not upstream:
+            raise DebianVersionError("Upstream version of '%s' is empty" %
+                                     version)
+        return epoch, upstream, revision
+
+    @staticmethod
+    def _char_order(char):
+        """Sort order of non-digits, '~' sorts even before the end"""
+        if char == '~':
+            return -1
+        elif char in string.ascii_letters:
+            return ord(char)
+        return ord(char) + 256
+
+    @classmethod
+    def part_key(cls, part):
+        """
+        Sort key of the upstream version or revision
+
+        The key is a tuple of (non-digits, number) pairs closed by
+        a pair comparing like the end of the string.
+
+        >>> DebianVersion.part_key('1.0~a')
+        (((0,), 1), ((302, 0), 0), ((-1, 97, 0), 0), ((0,), 0))
+        """
+        key = []
+        for nondigits, digits in cls._part_re.findall(part):
+            if not (nondigits or digits) and key:
+                continue
+            key.append((tuple([ cls._char_order(char)
+                                for char in nondigits ]) + (0,),
+                        int(digits or 0)))
+        key.append(cls._end)
+        return tuple(key)
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+    def __ne__(self, other):
+        return self.key != other.key
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+    def __le__(self, other):
+        return self.key <= other.key
+
+    def __gt__(self, other):
+        return self.key > other.key
+
+    def __ge__(self, other):
+        return self.key >= other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __str__(self):
+        return self.version
+
+    def __repr__(self):
+        return "<gbp.deb.version.DebianVersion '%s'>" % self.version
+
+
+def compare_versions(version1, version2):
+    """
+    Compare two Debian versions
+
+    >>> compare_versions('1.0', '1.0~rc1')
+    1
+    >>> compare_versions('1:1.0', '2.0')
+    1
+    >>> compare_versions('1.0-1', '1.0-1')
+    0
+
+    @return: -1 if I{version1} is lower than I{version2}, 0 if they are
+        equal and 1 otherwise
+    @rtype: C{int}
+    @raises DebianVersionError: if one of the versions is invalid
+    """
+    key1 = DebianVersion(version1).key
+    key2 = DebianVersion(version2).key
+    return (key1 > key2) - (key1 < key2)
+
+
+def sort_versions(items, key=None, reverse=False):
+    """
+    Sort a list by Debian version, each version is parsed only once
+
+    >>> sort_versions(['1.0', '1.0~rc1', '0.9-1', '1:0.1'])
+    ['0.9-1', '1.0~rc1', '1.0', '1:0.1']
+
+    @param items: the items to sort
+    @type items: C{list}
+    @param key: function returning the version of an item, the item
+        is the version if not given
+    @type key: C{callable}
+    @param reverse: sort from highest to lowest version
+    @type reverse: C{bool}
+    @return: the sorted items
+    @rtype: C{list}
+    @raises DebianVersionError: if one of the versions is invalid
+    """
+    if key is None:
+        key = lambda item: item
+    return sorted(items, key=lambda item: DebianVersion(key(item)).key,
+                  reverse=reverse)
+
+# vim:et:ts=4:sw=4:et:sts=4:ai:set list listchars=tab\:»·,trail\:·:
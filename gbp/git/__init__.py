@@ -23,8 +23,11 @@ import rfc822
 from gbp.git.modifier import GitModifier
 from gbp.git.commit import GitCommit
 from gbp.git.errors import GitError
-from gbp.git.repository import GitRepository, GitRepositoryError
+from gbp.git.repository import (GitRepository, GitRepositoryError,
+                                GitRefTransaction)
+from gbp.git.catfile import GitCatFile, GitCatFileError
 from gbp.git.fastimport import FastImport
+from gbp.git.treewriter import GitTreeWriter, GitTreeWriterError
 from gbp.git.args import GitArgs
 from gbp.git.vfs import GitVfs
 
@@ -0,0 +1,168 @@
+# vim: set fileencoding=utf-8 :
+#
+# (C) 2026 agent <agent@local>
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""Read objects from a Git repository using persistent git-cat-file processes"""
+
+import os
+import subprocess
+
+import gbp.log as log
+from gbp.git.errors import GitError
+
+
+class GitCatFileError(GitError):
+    """Exception thrown by L{GitCatFile}"""
+    pass
+
+
+class GitCatFile(object):
+    """
+    Look up and read objects of a git repository through long running
+    I{git cat-file --batch-check} and I{git cat-file --batch} processes so
+    that no new process needs to be spawned for each object.
+
+    The processes are started on first use and stopped by L{close}.
+
+    >>> GitCatFile.supports('HEAD:debian/changelog')
+    True
+    >>> GitCatFile.supports(':debian/changelog')
+    False
+    >>> GitCatFile.supports('foo\\nbar')
+    False
+    """
+
+    def __init__(self, path):
+        """
+        @param path: path to the git repository
+        @type path: C{str}
+        """
+        self._path = path
+        self._procs = {}
+
+    @staticmethod
+    def supports(name):
+        """
+        Check if I{name} can be looked up in batch mode. Object names that
+        refer to the index (like I{:path}) can't since the index is read only
+        once by the batch process and names must fit on a single line.
+
+        @param name: object name
+        @type name: C{str}
+        @rtype: C{bool}
+        """
+        return bool(name) and not name.startswith(':') and '\n' not in name
+
+    def _get_proc(self, mode):
+        """Get the batch process for I{mode}, start it if needed"""
+        proc = self._procs.get(mode)
+        if proc is None:
+            cmd = ['git', 'cat-file', '--%s' % mode]
+            log.debug(cmd)
+            try:
+                with open(os.devnull, 'w') as devnull:
+                    proc = subprocess.Popen(cmd,
+                                            stdin=subprocess.PIPE,
+                                            stdout=subprocess.PIPE,
+                                            stderr=devnull,
+                                            close_fds=True,
+                                            cwd=self._path)
+            except OSError as err:
+                raise GitCatFileError("Failed to run git cat-file: %s" % err)
+            self._procs[mode] = proc
+        return proc
+
+    def _query(self, mode, name):
+        """Send one object name and read back the header line"""
+        if not self.supports(name):
+            raise GitCatFileError("Invalid object name '%s'" % name)
+        proc = self._get_proc(mode)
+        try:
+            proc.stdin.write(name + '\n')
+            proc.stdin.flush()
+            header = proc.stdout.readline()
+        except (IOError, OSError) as err:
+            self._stop(mode)
+            raise GitCatFileError("git cat-file --%s failed: %s" % (mode, err))
+        if not header.endswith('\n'):
+            self._stop(mode)
+            raise GitCatFileError("git cat-file --%s died unexpectedly" % mode)
+        fields = header[:-1].split(' ')
+        if len(fields) == 3 and fields[2].isdigit():
+            return fields[0], fields[1], int(fields[2])
+        if fields[-1] in ('missing', 'ambiguous'):
+            # "<name> missing", the name may contain spaces
+            return None
+        self._stop(mode)
+        raise GitCatFileError("Unexpected reply from git cat-file --%s: '%s'"
+                              % (mode, header[:-1]))
+
+    def info(self, name):
+        """
+        Look up an object
+
+        @param name: object name, anything git-rev-parse understands
+        @type name: C{str}
+        @return: sha1, type and size of the object or C{None} if there's no
+            such object
+        @rtype: C{tuple} of C{str}, C{str} and C{int}
+        """
+        return self._query('batch-check', name)
+
+    def read(self, name):
+        """
+        Read an object
+
+        @param name: object name, anything git-rev-parse understands
+        @type name: C{str}
+        @return: sha1, type and the raw content of the object or C{None} if
+            there's no such object
+        @rtype: C{tuple} of C{str}, C{str} and C{str}
+        """
+        info = self._query('batch', name)
+        if info is None:
+            return None
+        sha1, obj_type, size = info
+        proc = self._procs['batch']
+        try:
+            data = proc.stdout.read(size + 1)
+        except (IOError, OSError) as err:
+            self._stop('batch')
+            raise GitCatFileError("git cat-file --batch failed: %s" % err)
+        if len(data) != size + 1:
+            self._stop('batch')
+            raise GitCatFileError("Short read of object '%s'" % name)
+        return sha1, obj_type, data[:-1]
+
+    def _stop(self, mode):
+        """Stop the batch process for I{mode}"""
+        proc = self._procs.pop(mode, None)
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+        except (IOError, OSError):
+            pass
+        proc.stdout.close()
+        proc.wait()
+
+    def close(self):
+        """Stop all batch processes"""
+        for mode in list(self._procs.keys()):
+            self._stop(mode)
+
+    def __del__(self):
+        if getattr(self, '_procs', None):
+            self.close()
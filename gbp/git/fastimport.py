@@ -17,17 +17,27 @@
 #    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 """Git fast import class"""
 
+import re
 import subprocess
 import time
 from gbp.errors import GbpError
 
 class FastImport(object):
-    """Add data to a git repository using I{git fast-import}"""
-    _bufsize = 1024
+    """
+    Add data to a git repository using I{git fast-import}
+
+    Blobs, commits and tags can be given a mark that later commands can
+    refer to instead of a sha1. The sha1 of marked objects can be read back
+    with L{get_mark}. Refs are updated when fast-import finishes or on
+    L{checkpoint}.
+    """
+    # Size of data chunks copied to and buffered for fast-import
+    _bufsize = 1024 * 1024
 
     m_regular = 644
     m_exec    = 755
     m_symlink = 120000
+    m_tree    = 40000
 
     def __init__(self, repo):
         """
@@ -35,9 +45,14 @@ class FastImport(object):
         @type repo: L{GitRepository}
         """
         self._repo = repo
+        self._next_mark = 1
+        # Branches committed to in this stream
+        self._branches = set()
         try:
             self._fi = subprocess.Popen([ 'git', 'fast-import', '--quiet'],
-                                        stdin=subprocess.PIPE, cwd=repo.path)
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE,
+                                        bufsize=self._bufsize, cwd=repo.path)
             self._out = self._fi.stdin
         except OSError as err:
             raise GbpError("Error spawning git fast-import: %s" % err)
@@ -45,18 +60,65 @@ class FastImport(object):
             raise GbpError(
                 "Invalid argument when spawning git fast-import: %s" % err)
 
+    @staticmethod
+    def _quote_path(path):
+        """
+        Quote a path for fast-import if needed
+
+        >>> FastImport._quote_path('foo/bar')
+        'foo/bar'
+        >>> FastImport._quote_path('foo "bar"')
+        'foo "bar"'
+        >>> FastImport._quote_path('"foo\\nbar"')
+        '"\\\\"foo\\\\nbar\\\\""'
+        >>> FastImport._quote_path('')
+        '""'
+        """
+        if path and not path.startswith('"') and '\n' not in path:
+            return path
+        return '"%s"' % path.replace('\\', '\\\\').replace('"', '\\"').\
+                            replace('\n', '\\n')
+
+    def _new_mark(self):
+        """Allocate a new mark"""
+        mark = ':%d' % self._next_mark
+        self._next_mark += 1
+        self._out.write("mark %s\n" % mark)
+        return mark
+
+    def _ident(self, modifier):
+        """
+        Format author, committer or tagger information, the committer of
+        the repository if I{modifier} is not given
+        """
+        if not modifier:
+            return self._repo._committer_ident()
+        info = dict(modifier.items())
+        if not info.get('name') or not info.get('email'):
+            default = self._repo.get_author_info()
+            info['name'] = info.get('name') or default.name
+            info['email'] = info.get('email') or default.email
+        date = info.get('date') or "%d %s" % (time.time(),
+                                              time.strftime("%z"))
+        return "%s <%s> %s" % (info['name'], info['email'], date)
+
     def _do_data(self, fd, size):
         self._out.write("data %s\n" % size)
-        while True:
-            data = fd.read(self._bufsize)
-            self._out.write(data)
-            if len(data) != self._bufsize:
+        left = size
+        while left > 0:
+            data = fd.read(min(left, self._bufsize))
+            if not data:
                 break
+            self._out.write(data)
+            left -= len(data)
         self._out.write("\n")
 
+    def _do_msg(self, msg):
+        self._out.write("data %d\n%s\n" % (len(msg), msg))
+
     def _do_file(self, filename, mode, fd, size):
         name = "/".join(filename.split('/')[1:])
-        self._out.write("M %d inline %s\n" % (mode, name))
+        self._out.write("M %d inline %s\n" % (mode, self._quote_path(name)))
         self._do_data(fd, size)
 
     def add_file(self, filename, fd, size, mode=m_regular):
@@ -74,6 +136,23 @@ class FastImport(object):
         """
         self._do_file(filename, mode, fd, size)
 
+    def add_blob(self, fd, size):
+        """
+        Add a blob that is not part of a commit, e.g. for writing trees
+        with other means or for referring to it in multiple commits
+
+        @param fd: stream to read data from
+        @type fd: C{File} like object
+        @param size: size of the blob
+        @type size: C{int}
+        @return: mark of the blob
+        @rtype: C{str}
+        """
+        self._out.write("blob\n")
+        mark = self._new_mark()
+        self._do_data(fd, size)
+        return mark
+
     def add_symlink(self, linkname, linktarget):
         """
         Add a symlink
@@ -83,43 +162,72 @@ class FastImport(object):
         @param linktarget: the target the symlink points to
         @type linktarget: C{str}
         """
-        self._out.write("M %d inline %s\n" % (self.m_symlink, linkname))
-        self._out.write("data %s\n" % len(linktarget))
-        self._out.write("%s\n" % linktarget)
+        self._out.write("M %d inline %s\n" % (self.m_symlink,
+                                              self._quote_path(linkname)))
+        self._do_msg(linktarget)
+
+    def modify(self, path, mode, dataref):
+        """
+        Add a file with existing content to the current commit. A tree
+        with an empty I{path} replaces the whole content of the commit.
+
+        @param path: path of the file
+        @type path: C{str}
+        @param mode: file mode, e.g. L{FastImport.m_regular}
+        @type mode: C{int} or C{str}
+        @param dataref: mark or sha1 of the content
+        @type dataref: C{str}
+        """
+        self._out.write("M %s %s %s\n" % (mode, dataref,
+                                          self._quote_path(path)))
+
+    def delete(self, path):
+        """
+        Remove a file or a directory from the current commit
+
+        @param path: path to remove
+        @type path: C{str}
+        """
+        self._out.write("D %s\n" % self._quote_path(path))
 
-    def start_commit(self, branch, committer, msg):
+    def start_commit(self, branch, committer, msg, author=None, parents=None):
         """
-        Start a fast import commit
+        Start a fast import commit. The commit continues the history of
+        I{branch} unless I{parents} are given. Add content with the
+        L{add_file}, L{modify}, L{delete} etc. methods.
 
         @param branch: branch to commit on
         @type branch: C{str}
-        @param committer: the committer information
+        @param committer: the committer information, C{None} for the
+            committer git would use
         @type committer: L{GitModifier}
         @param msg: the commit message
         @type msg: C{str}
+        @param author: the author information, same as committer by default
+        @type author: L{GitModifier}
+        @param parents: parents of the commit, marks or sha1s. Empty list
+            creates a commit without parents
+        @type parents: C{list} of C{str}
+        @return: mark of the commit
+        @rtype: C{str}
         """
-        length = len(msg)
-        if not committer.date:
-            committer.date = "%d %s" % (time.time(),
-                                        time.strftime("%z"))
-
-        if self._repo.has_branch(branch):
-            from_ = "from refs/heads/%(branch)s^0\n"
-        else:
-            from_ = ''
-
-        self._out.write("""commit refs/heads/%(branch)s
-committer %(name)s <%(email)s> %(time)s
-data %(length)s
-%(msg)s%(from)s""" %
-            { 'branch': branch,
-              'name':   committer.name,
-              'email':  committer.email,
-              'time':   committer.date,
-              'length': length,
-              'msg': msg,
-              'from': from_,
-              })
+        if parents == []:
+            # Start a new history
+            self.reset('refs/heads/%s' % branch)
+        self._out.write("commit refs/heads/%s\n" % branch)
+        mark = self._new_mark()
+        self._out.write("author %s\n" % self._ident(author or committer))
+        self._out.write("committer %s\n" % self._ident(committer))
+        self._do_msg(msg)
+        if parents is None:
+            if branch not in self._branches and self._repo.has_branch(branch):
+                self._out.write("from refs/heads/%s^0\n" % branch)
+        elif parents:
+            self._out.write("from %s\n" % parents[0])
+            for parent in parents[1:]:
+                self._out.write("merge %s\n" % parent)
+        self._branches.add(branch)
+        return mark
 
     def deleteall(self):
         """
@@ -127,14 +235,105 @@ data %(length)s
         """
         self._out.write("deleteall\n")
 
+    def create_tag(self, name, commit, msg, tagger=None):
+        """
+        Create an annotated tag
+
+        @param name: name of the tag
+        @type name: C{str}
+        @param commit: mark or sha1 of the commit to tag
+        @type commit: C{str}
+        @param msg: tag message
+        @type msg: C{str}
+        @param tagger: the tagger information
+        @type tagger: L{GitModifier}
+        @return: mark of the tag
+        @rtype: C{str}
+        """
+        self._out.write("tag %s\n" % name)
+        mark = self._new_mark()
+        self._out.write("from %s\n" % commit)
+        self._out.write("tagger %s\n" % self._ident(tagger))
+        self._do_msg(msg)
+        return mark
+
+    def reset(self, ref, commit=None):
+        """
+        Point a ref to a commit
+
+        @param ref: the full name of the ref, e.g. I{refs/heads/master}
+        @type ref: C{str}
+        @param commit: mark or sha1 of the commit, C{None} to start a new
+            history
+        @type commit: C{str}
+        """
+        self._out.write("reset %s\n" % ref)
+        if commit:
+            self._out.write("from %s\n" % commit)
+        self._out.write("\n")
+        if ref.startswith('refs/heads/'):
+            self._branches.add(ref[len('refs/heads/'):])
+
+    def _response(self):
+        """Read a response line of fast-import"""
+        self._out.flush()
+        line = self._fi.stdout.readline()
+        if not line:
+            raise GbpError("git fast-import failed")
+        return line.rstrip('\n')
+
+    def get_mark(self, mark):
+        """
+        Get the sha1 of a marked object
+
+        @param mark: the mark
+        @type mark: C{str}
+        @rtype: C{str}
+        """
+        self._out.write("get-mark %s\n" % mark)
+        return self._response()
+
+    def cat_blob(self, dataref):
+        """
+        Read back the content of a blob
+
+        @param dataref: mark or sha1 of the blob
+        @type dataref: C{str}
+        @rtype: C{str}
+        """
+        self._out.write("cat-blob %s\n" % dataref)
+        header = self._response()
+        match = re.match(r'^([0-9a-f]{40}) blob (\d+)$', header)
+        if not match:
+            raise GbpError("git fast-import: %s" % header)
+        data = self._fi.stdout.read(int(match.group(2)) + 1)
+        return data[:-1]
+
+    def checkpoint(self):
+        """
+        Write the objects and update the refs created so far, waiting for
+        fast-import to finish that
+        """
+        self._out.write("checkpoint\nprogress checkpoint\n")
+        while self._response() != 'progress checkpoint':
+            pass
+        self._repo.invalidate_refs()
+
     def close(self):
         """
         Close fast-import issuing all pending actions
         """
-        if self._out:
-            self._out.close()
         if self._fi:
-            self._fi.wait()
+            self._out.close()
+            ret = self._fi.wait()
+            self._fi.stdout.close()
+            self._fi = None
+            self._repo.invalidate_refs()
+            if ret:
+                raise GbpError("git fast-import failed with exit status %d" %
+                               ret)
 
     def __del__(self):
-        self.close()
+        if getattr(self, '_fi', None):
+            self._out.close()
+            self._fi.wait()
@@ -18,16 +18,22 @@
 
 import six
 import subprocess
+import os
 import os.path
 import re
 from collections import defaultdict
+import errno
+import fcntl
+import fnmatch
 import select
+import time
 
 import gbp.log as log
 from gbp.git.modifier import GitModifier
 from gbp.git.commit import GitCommit
 from gbp.git.errors import GitError
 from gbp.git.args import GitArgs
+from gbp.git.catfile import GitCatFile, GitCatFileError
 
 
 class GitRepositoryError(GitError):
@@ -64,6 +70,154 @@ class GitRemote(object):
         return self._push_urls
 
 
+class GitRefTransaction(object):
+    """
+    A set of ref updates that are applied atomically, with one
+    I{git update-ref --stdin} call. Either all of the updates succeed or
+    none of them are done. Used as a context manager the queued updates are
+    applied when the block exits normally and discarded if it raises.
+
+    A transaction can be committed several times, each commit applies the
+    updates queued since the previous one.
+    """
+    def __init__(self, repo, msg=None):
+        """
+        @param repo: the repository the refs belong to
+        @type repo: L{GitRepository}
+        @param msg: the reason for the updates, for the reflogs
+        @type msg: C{str}
+        """
+        self._repo = repo
+        self.msg = msg
+        self._refs = []
+        self._updates = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+    def update(self, ref, new, old=None):
+        """
+        Queue an update of a ref
+
+        @param ref: the ref to update, e.g. I{refs/heads/master} or I{HEAD}
+        @type ref: C{str}
+        @param new: the new value of the ref, C{None} deletes the ref
+        @type new: C{str}
+        @param old: the value the ref must currently have, empty string if the
+            ref must not exist, C{None} for no check
+        @type old: C{str}
+        """
+        if ref in self._updates:
+            # Only one update per ref is allowed, keep the original check
+            old = self._updates[ref][1]
+        else:
+            self._refs.append(ref)
+        self._updates[ref] = (new, old)
+
+    def delete(self, ref, old=None):
+        """
+        Queue deletion of a ref
+
+        @param ref: the ref to delete
+        @type ref: C{str}
+        @param old: the value the ref must currently have
+        @type old: C{str}
+        """
+        self.update(ref, None, old)
+
+    def get(self, ref):
+        """
+        Get the queued new value of a ref
+
+        @return: the new value or C{None} if there's no update for the ref
+        @rtype: C{str}
+        """
+        if ref in self._updates:
+            return self._updates[ref][0]
+        return None
+
+    def _tagger(self):
+        """Tagger info for annotated tags, like git-tag uses it"""
+        return self._repo._committer_ident()
+
+    def create_tag(self, name, commit, msg=None):
+        """
+        Queue creation of a tag. The tag object of an annotated tag is
+        written immediately. Signed tags are not supported, use
+        L{GitRepository.create_tag} for those.
+
+        @param name: the tag's name
+        @type name: C{str}
+        @param commit: the commit or object to tag
+        @type commit: C{str}
+        @param msg: the tag message, C{None} creates a lightweight tag
+        @type msg: C{str}
+        """
+        ref = 'refs/tags/%s' % name
+        if msg is None:
+            self.update(ref, commit, '')
+            return
+        try:
+            info = self._repo._batch_lookup(commit)
+        except GitCatFileError:
+            info = None
+        if info is None:
+            raise GitRepositoryError("Can't tag unknown object '%s'" % commit)
+        content = "object %s\ntype %s\ntag %s\ntagger %s\n\n%s\n" % (
+                        info[0], info[1], name, self._tagger(), msg.rstrip())
+        sha1, err, ret = self._repo._git_inout('mktag', [], content,
+                                               capture_stderr=True)
+        if ret:
+            raise GitRepositoryError("Failed to create tag '%s': %s" %
+                                     (name, err.strip()))
+        self.update(ref, sha1.strip(), '')
+
+    def abort(self):
+        """Discard the queued updates"""
+        self._refs = []
+        self._updates = {}
+
+    def commit(self):
+        """
+        Apply the queued updates
+
+        @raises GitRepositoryError: if any of the updates fails, in which case
+            none of the refs are changed
+        """
+        if not self._refs:
+            return
+        cmds = []
+        for ref in self._refs:
+            new, old = self._updates[ref]
+            if new is None:
+                cmd = ['delete', ref]
+            elif old == '':
+                cmd, old = ['create', ref, new], None
+            else:
+                cmd = ['update', ref, new]
+            cmds.append(' '.join(cmd + [old] if old else cmd))
+        args = GitArgs('--stdin')
+        args.add_true(self.msg, ['-m', self.msg])
+        refs = self._repo._refs
+        names = self._refs
+        self.abort()
+        dummy, err, ret = self._repo._git_inout('update-ref', args.args,
+                                                '\n'.join(cmds) + '\n',
+                                                capture_stderr=True)
+        if ret:
+            raise GitRepositoryError("Failed to update refs: %s" %
+                                     err.strip())
+        # Others, like HEAD, may be symbolic refs
+        if all(ref.startswith('refs/') for ref in names):
+            self._repo._refs_updated(refs, names)
+
+
 class GitRepository(object):
     """
     Represents a git repository at I{path}. It's currently assumed that the git
@@ -76,6 +230,16 @@ class GitRepository(object):
     @raises GitRepositoryError: on git errors GitRepositoryError is raised by
         all methods.
     """
+    # Size of the chunks of data read from and written to git commands
+    _IO_CHUNK_SIZE = 65536
+    # Git commands that may create, delete or move refs
+    _REF_UPDATE_COMMANDS = frozenset(['am', 'branch', 'checkout',
+        'cherry-pick', 'commit', 'fast-import', 'fetch', 'filter-branch',
+        'merge', 'notes', 'pull', 'push', 'rebase', 'remote', 'replace',
+        'reset', 'revert', 'stash', 'switch', 'tag', 'update-ref'])
+    # Repositories whose layout and refs a long-running process keeps up
+    # to date (see L{gbp.scripts.daemon}), indexed by path
+    _warm = {}
 
     def _check_dirs(self):
         """Get top level dir and git meta data dir"""
@@ -103,6 +267,15 @@ class GitRepository(object):
 
     def __init__(self, path):
         self._path = os.path.abspath(path)
+        self._object_reader = None
+        self._refs = None
+        self._ident = None
+        warm = GitRepository._warm.get(self._path)
+        if warm is not None:
+            self._bare, self._git_dir = warm._bare, warm._git_dir
+            self._path = warm._path
+            self._refs = dict(warm._ref_snapshot)
+            return
         try:
             # Check for bare repository
             out, dummy, ret = self._git_inout('rev-parse', ['--is-bare-repository'],
@@ -118,6 +291,164 @@ class GitRepository(object):
         except:
             raise GitRepositoryError("No Git repository at '%s' (or any parent dir)" % self.path)
 
+    @classmethod
+    def set_warm(klass, path, repo):
+        """
+        Make new objects for the repository at I{path} take the layout and
+        refs from I{repo} instead of asking git. The caller has to keep the
+        refs of I{repo} up to date.
+
+        @param path: path the objects are created with
+        @type path: C{str}
+        @param repo: the repository, C{None} to stop using one
+        @type repo: L{GitRepository}
+        """
+        path = os.path.abspath(path)
+        if repo is None:
+            klass._warm.pop(path, None)
+        else:
+            klass._warm[path] = repo
+
+    def close(self):
+        """
+        Stop any helper processes kept running by this repository object.
+        The object can still be used afterwards, helpers get restarted on
+        demand.
+        """
+        if self._object_reader:
+            self._object_reader.close()
+            self._object_reader = None
+
+    @property
+    def object_reader(self):
+        """
+        Reader for looking up and reading repository objects through a
+        persistent git-cat-file process
+
+        @rtype: L{GitCatFile}
+        """
+        if self._object_reader is None:
+            self._object_reader = GitCatFile(self.path)
+        return self._object_reader
+
+    @property
+    def _ref_snapshot(self):
+        """
+        All refs of the repository, read with one git-for-each-ref call and
+        kept until L{invalidate_refs} is called or a git command that may
+        change refs is run through this object.
+
+        @return: sha1, type, and for tags the sha1 and type of the tagged
+            object, indexed by the full name of the ref
+        @rtype: C{dict} of C{tuple} of C{str}
+        """
+        if self._refs is None:
+            fmt = '%(objectname) %(objecttype) %(*objectname) ' \
+                  '%(*objecttype) %(refname)'
+            refs = {}
+            for line in self._git_inout_lines('for-each-ref',
+                                              ['--format=%s' % fmt]):
+                sha1, obj_type, peeled, peeled_type, ref = line.split(' ', 4)
+                refs[ref] = (sha1, obj_type, peeled, peeled_type)
+            self._refs = refs
+        return self._refs
+
+    def _committer_ident(self):
+        """
+        Committer name, email and date in the format of git objects, the
+        same that git-commit would use
+        """
+        if self._ident is None:
+            out, err, ret = self._git_inout('var', ['GIT_COMMITTER_IDENT'],
+                                            capture_stderr=True)
+            if ret:
+                raise GitRepositoryError("Failed to get committer info: %s" %
+                                         err.strip())
+            self._ident = out.strip()
+        if 'GIT_COMMITTER_DATE' in os.environ:
+            return self._ident
+        ident, _timestamp, offset = self._ident.rsplit(' ', 2)
+        return '%s %d %s' % (ident, time.time(), offset)
+
+    def invalidate_refs(self):
+        """
+        Forget the cached refs. Needs to be called if refs of the repository
+        are changed by other means than the methods of this object, e.g. by
+        running git directly.
+        """
+        self._refs = None
+
+    def _lookup_ref(self, ref):
+        """Get the L{_ref_snapshot} entry of a ref from the object reader"""
+        try:
+            info = self._batch_lookup(ref)
+            if info is None:
+                return None
+            sha1, obj_type, peeled, peeled_type = info[0], info[1], '', ''
+            if obj_type == 'tag':
+                header = self._batch_lookup(sha1, read=True)[2].split('\n', 2)
+                peeled = header[0].split(' ', 1)[1]
+                peeled_type = header[1].split(' ', 1)[1]
+        except (GitCatFileError, IndexError):
+            raise GitRepositoryError("Failed to look up ref '%s'" % ref)
+        return sha1, obj_type, peeled, peeled_type
+
+    def _refs_updated(self, refs, names):
+        """
+        Update a ref snapshot taken before running a git command that
+        changed I{names}, and take it back into use
+
+        @param refs: the snapshot, may be C{None}
+        @type refs: C{dict}
+        @param names: full names of the changed refs
+        @type names: C{list} of C{str}
+        """
+        if refs is None:
+            return
+        for ref in names:
+            info = self._lookup_ref(ref)
+            if info:
+                refs[ref] = info
+            else:
+                refs.pop(ref, None)
+        self._refs = refs
+
+    def get_ref(self, ref):
+        """
+        Get the object a ref points to, without running git
+
+        @param ref: full name of the ref, e.g. I{refs/heads/master}
+        @type ref: C{str}
+        @return: sha1 of the object or C{None} if the ref doesn't exist
+        @rtype: C{str}
+        """
+        info = self._ref_snapshot.get(ref)
+        return info[0] if info else None
+
+    def _ref_commit(self, ref):
+        """The commit a ref, e.g. an annotated tag, points to"""
+        info = self._ref_snapshot.get(ref)
+        if info and info[1] == 'commit':
+            return info[0]
+        elif info and info[3] == 'commit':
+            return info[2]
+        return self.rev_parse('%s^0' % ref)
+
+    def _batch_lookup(self, name, read=False):
+        """
+        Look up (and optionally read) an object through the
+        L{object_reader}.
+
+        @return: see L{GitCatFile.info} and L{GitCatFile.read}, C{None} if
+            the object doesn't exist
+        @raises GitCatFileError: if the object name can't be used with the
+            batch reader or the reader failed
+        """
+        if not GitCatFile.supports(name):
+            raise GitCatFileError("Can't look up '%s' in batch mode" % name)
+        if read:
+            return self.object_reader.read(name)
+        return self.object_reader.info(name)
 
     @staticmethod
     def __build_env(extra_env):
@@ -149,14 +480,15 @@ class GitRepository(object):
 
         if not cwd:
             cwd = self.path
+        if command in self._REF_UPDATE_COMMANDS:
+            self.invalidate_refs()
 
         env = self.__build_env(extra_env)
         cmd = ['git', command] + args
         log.debug(cmd)
         popen = subprocess.Popen(cmd, stdout=subprocess.PIPE, env=env, cwd=cwd)
-        while popen.poll() == None:
-            output += popen.stdout.readlines()
-        output += popen.stdout.readlines()
+        output = popen.stdout.readlines()
+        popen.wait()
         return output, popen.returncode
 
     def _git_inout(self, command, args, input=None, extra_env=None, cwd=None,
@@ -179,18 +511,20 @@ class GitRepository(object):
         """
         if not cwd:
             cwd = self.path
+        if command in self._REF_UPDATE_COMMANDS:
+            self.invalidate_refs()
         ret = 0
-        stdout = ''
-        stderr = ''
+        stdout = []
+        stderr = []
         try:
             for outdata in self.__git_inout(command, args, input, extra_env,
                                             cwd, capture_stderr,
                                             capture_stdout):
-                stdout += outdata[0]
-                stderr += outdata[1]
+                stdout.append(outdata[0])
+                stderr.append(outdata[1])
         except GitRepositoryError as err:
             ret = err.returncode
-        return stdout, stderr, ret
+        return ''.join(stdout), ''.join(stderr), ret
 
     def _git_inout2(self, command, args, stdin=None, extra_env=None, cwd=None,
                     capture_stderr=False):
@@ -204,16 +538,43 @@ class GitRepository(object):
         """
         if not cwd:
             cwd = self.path
-        stderr = ''
+        if command in self._REF_UPDATE_COMMANDS:
+            self.invalidate_refs()
+        stderr = []
         try:
             for outdata in self.__git_inout(command, args, stdin, extra_env,
                                             cwd, capture_stderr, True):
-                stderr += outdata[1]
-                yield outdata[0]
+                if outdata[1]:
+                    stderr.append(outdata[1])
+                if outdata[0]:
+                    yield outdata[0]
         except GitRepositoryError as err:
-            err.stderr = stderr
+            err.stderr = ''.join(stderr)
             raise err
 
+    def _git_inout_lines(self, command, args, stdin=None, extra_env=None,
+                         cwd=None, capture_stderr=False, sep='\n'):
+        """
+        Like C{_git_inout2()} but returns the stdout output of the git
+        command split into lines. Lines are returned without the separator.
+
+        @param sep: line separator, e.g. '\\0' for the output of C{-z}
+        @type sep: C{str}
+
+        @note: The caller must consume the iterator that is returned, in order
+        to make sure that the git command runs and terminates.
+        """
+        tail = ''
+        for chunk in self._git_inout2(command, args, stdin, extra_env, cwd,
+                                      capture_stderr):
+            lines = chunk.split(sep)
+            lines[0] = tail + lines[0]
+            tail = lines.pop()
+            for line in lines:
+                yield line
+        if tail:
+            yield tail
+
     @classmethod
     def __git_inout(cls, command, args, stdin, extra_env, cwd, capture_stderr,
                     capture_stdout):
@@ -226,10 +587,6 @@ class GitRepository(object):
         @note: The caller must consume the iterator that is returned, in order
         to make sure that the git command runs and terminates.
         """
-        def rm_polled_fd(file_obj, select_list):
-            file_obj.close()
-            select_list.remove(file_obj)
-
         cmd = ['git', command] + args
         env = cls.__build_env(extra_env)
         stdout_arg = subprocess.PIPE if capture_stdout else None
@@ -244,27 +601,49 @@ class GitRepository(object):
                                  env=env,
                                  close_fds=True,
                                  cwd=cwd)
-        out_fds = [popen.stdout] if capture_stdout else []
+        # Use the raw file descriptors, file objects would block until they
+        # got all the data requested
+        out_fds = [popen.stdout.fileno()] if capture_stdout else []
+        err_fd = popen.stderr.fileno() if capture_stderr else None
         if capture_stderr:
-            out_fds.append(popen.stderr)
-        in_fds = [popen.stdin] if stdin else []
+            out_fds.append(err_fd)
+        in_fds = [popen.stdin.fileno()] if stdin else []
+        if in_fds:
+            # A blocking write to a full pipe would deadlock with git blocking
+            # on writing its output, write only as much as fits
+            flags = fcntl.fcntl(in_fds[0], fcntl.F_GETFL)
+            fcntl.fcntl(in_fds[0], fcntl.F_SETFL, flags | os.O_NONBLOCK)
         w_ind = 0
         while out_fds or in_fds:
             ready = select.select(out_fds, in_fds, [])
-            # Write in chunks of 512 bytes
             if ready[1]:
-                popen.stdin.write(stdin[w_ind:w_ind+512])
-                w_ind += 512
-                if w_ind > len(stdin):
-                    rm_polled_fd(popen.stdin, in_fds)
-            # Read in chunks of 4k
-            stdout = popen.stdout.read(4096) if popen.stdout in ready[0] else ''
-            stderr = popen.stderr.read(4096) if popen.stderr in ready[0] else ''
-            if popen.stdout in ready[0] and not stdout:
-                rm_polled_fd(popen.stdout, out_fds)
-            if popen.stderr in ready[0] and not stderr:
-                rm_polled_fd(popen.stderr, out_fds)
-            yield stdout, stderr
+                try:
+                    w_ind += os.write(in_fds[0],
+                                      stdin[w_ind:w_ind + cls._IO_CHUNK_SIZE])
+                except OSError as err:
+                    if err.errno == errno.EPIPE:
+                        # The command exited without reading all of its input
+                        w_ind = len(stdin)
+                    elif err.errno != errno.EAGAIN:
+                        raise
+                if w_ind >= len(stdin):
+                    popen.stdin.close()
+                    in_fds = []
+            stdout = stderr = ''
+            for fd in ready[0]:
+                data = os.read(fd, cls._IO_CHUNK_SIZE)
+                if not data:
+                    out_fds.remove(fd)
+                elif fd == err_fd:
+                    stderr = data
+                else:
+                    stdout = data
+            if stdout or stderr:
+                yield stdout, stderr
+        if capture_stdout:
+            popen.stdout.close()
+        if capture_stderr:
+            popen.stderr.close()
 
         if popen.wait():
             err = GitRepositoryError('git-%s failed' % command)
@@ -385,7 +764,10 @@ class GitRepository(object):
         @param newbranch: new name of the branch
         """
         args = GitArgs("-m", branch, newbranch)
+        refs = self._refs
         self._git_command("branch", args.args)
+        self._refs_updated(refs, ['refs/heads/%s' % branch,
+                                  'refs/heads/%s' % newbranch])
 
     def create_branch(self, branch, rev=None, force=False):
         """
@@ -400,7 +782,9 @@ class GitRepository(object):
         args = GitArgs(branch)
         args.add_true(force, '--force')
         args.add_true(rev, rev)
+        refs = self._refs
         self._git_command("branch", args.args)
+        self._refs_updated(refs, ['refs/heads/%s' % branch])
 
     def delete_branch(self, branch, remote=False):
         """
@@ -416,7 +800,11 @@ class GitRepository(object):
         args.add(branch)
 
         if self.branch != branch:
+            refs = self._refs
             self._git_command("branch", args.args)
+            self._refs_updated(refs, ['refs/%s/%s' %
+                                      ('remotes' if remote else 'heads',
+                                       branch)])
         else:
             raise GitRepositoryError("Can't delete the branch you're on")
 
@@ -438,10 +826,9 @@ class GitRepository(object):
         ref = out.split('\n')[0]
 
         # Check if ref really exists
-        try:
-            self._git_command('show-ref', [ ref ])
+        if ref in self._ref_snapshot:
             branch = ref[11:] # strip /refs/heads
-        except GitRepositoryError:
+        else:
             branch = None  # empty repo
         return branch
 
@@ -460,11 +847,7 @@ class GitRepository(object):
             ref = 'refs/remotes/%s' % branch
         else:
             ref = 'refs/heads/%s' % branch
-        try:
-            self._git_command('show-ref', [ ref ])
-        except GitRepositoryError:
-            return False
-        return True
+        return ref in self._ref_snapshot
 
     def set_branch(self, branch):
         """
@@ -577,10 +960,9 @@ class GitRepository(object):
         @return: local or remote branches
         @rtype: C{list}
         """
-        args = [ '--format=%(refname:short)' ]
-        args += [ 'refs/remotes/' ] if remote else [ 'refs/heads/' ]
-        out = self._git_getoutput('for-each-ref', args)[0]
-        return [ ref.strip() for ref in out ]
+        prefix = 'refs/remotes/' if remote else 'refs/heads/'
+        return sorted(ref[len(prefix):] for ref in self._ref_snapshot
+                      if ref.startswith(prefix))
 
     def get_local_branches(self):
         """
@@ -601,6 +983,16 @@ class GitRepository(object):
         """
         return self._get_branches(remote=True)
 
+    def ref_transaction(self, msg=None):
+        """
+        Start a transaction for updating refs atomically
+
+        @param msg: the reason for the updates
+        @type msg: C{str}
+        @rtype: L{GitRefTransaction}
+        """
+        return GitRefTransaction(self, msg)
+
     def update_ref(self, ref, new, old=None, msg=None):
         """
         Update ref I{ref} to commit I{new} if I{ref} currently points to
@@ -620,7 +1012,11 @@ class GitRepository(object):
             args += [ old ]
         if msg:
             args = [ '-m', msg ] + args
+        refs = self._refs
         self._git_command("update-ref", args)
+        # Others, like HEAD, may be symbolic refs
+        if ref.startswith('refs/'):
+            self._refs_updated(refs, [ref])
 
     def branch_contains(self, branch, commit, remote=False):
         """
@@ -723,7 +1119,9 @@ class GitRepository(object):
         args.add_true(annotate, '-a')
         args.add(name)
         args.add_true(commit, commit)
+        refs = self._refs
         self._git_command("tag", args.args, interactive=True)
+        self._refs_updated(refs, ['refs/tags/%s' % name])
 
     def delete_tag(self, tag):
         """
@@ -733,11 +1131,17 @@ class GitRepository(object):
         @type tag: C{str}
         """
         if self.has_tag(tag):
+            refs = self._refs
             self._git_command("tag", [ "-d", tag ])
+            self._refs_updated(refs, ['refs/tags/%s' % tag])
 
     def move_tag(self, old, new):
-        self._git_command("tag", [ new, old ])
-        self.delete_tag(old)
+        sha1 = self.get_ref('refs/tags/%s' % old)
+        if sha1 is None:
+            raise GitRepositoryError("Tag '%s' not found" % old)
+        with self.ref_transaction() as trans:
+            trans.update('refs/tags/%s' % new, sha1, '')
+            trans.delete('refs/tags/%s' % old, sha1)
 
     def has_tag(self, tag):
         """
@@ -748,8 +1152,7 @@ class GitRepository(object):
         @return: C{True} if the repository has that tag, C{False} otherwise
         @rtype: C{bool}
         """
-        out, ret = self._git_getoutput('tag', [ '-l', tag ])
-        return [ False, True ][len(out)]
+        return 'refs/tags/%s' % tag in self._ref_snapshot
 
     def describe(self, commitish, pattern=None, longfmt=False, always=False,
                  abbrev=None, tags=False, exact_match=False):
@@ -817,8 +1220,11 @@ class GitRepository(object):
         @return: tags
         @rtype: C{list} of C{str}
         """
-        args = [ '-l', pattern ] if pattern else []
-        return [ line.strip() for line in self._git_getoutput('tag', args)[0] ]
+        tags = sorted(ref[10:] for ref in self._ref_snapshot
+                      if ref.startswith('refs/tags/'))
+        if pattern:
+            return [tag for tag in tags if fnmatch.fnmatchcase(tag, pattern)]
+        return tags
 
     def verify_tag(self, tag):
         """
@@ -971,6 +1377,16 @@ class GitRepository(object):
         @return: the name's sha1
         @rtype: C{str}
         """
+        if not short:
+            try:
+                info = self._batch_lookup(name)
+            except GitCatFileError:
+                pass
+            else:
+                if info is None:
+                    raise GitRepositoryError("revision '%s' not found" % name)
+                return info[0]
+
         args = GitArgs("--quiet", "--verify")
         args.add_cond(short, '--short=%d' % short)
         args.add(name)
@@ -1047,6 +1463,27 @@ class GitRepository(object):
                                            capture_stderr=True)
         return [ True, False ][ret != 0]
 
+    def read_tree(self, treeish, index_file=None):
+        """
+        Read a tree into the index
+
+        @param treeish: the tree to read
+        @type treeish: C{str}
+        @param index_file: alternate index file to read the tree into
+        @type index_file: C{str}
+        """
+        if index_file:
+            extra_env = {'GIT_INDEX_FILE': index_file }
+        else:
+            extra_env = None
+
+        dummy, stderr, ret = self._git_inout('read-tree', [treeish],
+                                             extra_env=extra_env,
+                                             capture_stderr=True)
+        if ret:
+            raise GitRepositoryError("Can't read tree '%s': %s" %
+                                     (treeish, stderr.strip()))
+
     def write_tree(self, index_file=None):
         """
         Create a tree object from the current index
@@ -1097,6 +1534,15 @@ class GitRepository(object):
         @return: type of the repository object
         @rtype: C{str}
         """
+        try:
+            info = self._batch_lookup(obj)
+        except GitCatFileError:
+            pass
+        else:
+            if info is None:
+                raise GitRepositoryError("Not a Git repository object: '%s'" % obj)
+            return info[1]
+
         out, ret = self._git_getoutput('cat-file', args=['-t', obj])
         if ret:
             raise GitRepositoryError("Not a Git repository object: '%s'" % obj)
@@ -1120,15 +1566,13 @@ class GitRepository(object):
         args.add("--")
         args.add_cond(paths, paths)
 
-        out, err, ret =  self._git_inout('ls-tree', args.args, capture_stderr=True)
-        if ret:
-            raise GitRepositoryError("Failed to ls-tree '%s': '%s'" % (treeish, err))
-
-        tree = []
-        for line in out.split('\0'):
-            if line:
-                tree.append(line.split(None, 3))
-        return tree
+        try:
+            return [line.split(None, 3) for line in
+                    self._git_inout_lines('ls-tree', args.args,
+                                          capture_stderr=True, sep='\0')]
+        except GitRepositoryError as err:
+            raise GitRepositoryError("Failed to ls-tree '%s': '%s'" %
+                                     (treeish, err.stderr))
 
 #}
 
@@ -1530,7 +1974,8 @@ class GitRepository(object):
         return self.write_tree(git_index_file)
 
     def commit_dir(self, unpack_dir, msg, branch, other_parents=None,
-                   author={}, committer={}, create_missing_branch=False):
+                   author={}, committer={}, create_missing_branch=False,
+                   transaction=None):
         """
         Replace the current tip of branch I{branch} with the contents from I{unpack_dir}
 
@@ -1550,10 +1995,32 @@ class GitRepository(object):
         @param create_missing_branch: create I{branch} as detached branch if it
             doesn't already exist.
         @type create_missing_branch: C{bool}
+        @param transaction: queue the update of I{branch} in this transaction
+            instead of updating it immediately
+        @type transaction: L{GitRefTransaction}
         """
         tree = self.create_tree(unpack_dir)
+        return self.commit_tree_to_branch(tree, msg, branch, other_parents,
+                                          author, committer,
+                                          create_missing_branch, transaction)
 
-        if branch:
+    def commit_tree_to_branch(self, tree, msg, branch, other_parents=None,
+                              author={}, committer={},
+                              create_missing_branch=False, transaction=None):
+        """
+        Replace the current tip of branch I{branch} with tree I{tree}. Same
+        as L{commit_dir} but for a tree that already is in the repository,
+        e.g. one written with L{GitTreeWriter}.
+
+        @param tree: the tree to commit
+        @type tree: C{str}
+        @return: the sha1 of the created commit
+        @rtype: C{str}
+        """
+        if branch and transaction and \
+                transaction.get('refs/heads/%s' % branch):
+            cur = transaction.get('refs/heads/%s' % branch)
+        elif branch:
             try:
                 cur = self.rev_parse(branch)
             except GitRepositoryError:
@@ -1580,7 +2047,10 @@ class GitRepository(object):
                                   author=author, committer=committer)
         if not commit:
             raise GitRepositoryError("Failed to commit tree")
-        self.update_ref("refs/heads/%s" % branch, commit, cur)
+        if transaction:
+            transaction.update("refs/heads/%s" % branch, commit, cur)
+        else:
+            self.update_ref("refs/heads/%s" % branch, commit, cur)
         return commit
 
     def commit_tree(self, tree, msg, parents, author={}, committer={}):
@@ -1618,6 +2088,9 @@ class GitRepository(object):
 
 #{ Commit Information
 
+    # Fields of get_commit_info() and get_commits_info(), separated by NUL
+    _commit_info_format = '%an%x00%ae%x00%ad%x00%cn%x00%ce%x00%cd%x00%s%x00%f%x00%b%x00'
+
     def get_commits(self, since=None, until=None, paths=None, num=0,
                     first_parent=False, options=None):
         """
@@ -1658,7 +2131,21 @@ class GitRepository(object):
         return [ commit.strip() for commit in commits ]
 
     def show(self, id):
-        """git-show id"""
+        """
+        git-show id
+
+        Blobs are read through the L{object_reader}, everything else (and
+        errors) is left to git-show.
+        """
+        try:
+            info = self._batch_lookup(id)
+            if info and info[1] == 'blob':
+                obj = self._batch_lookup(id, read=True)
+                if obj:
+                    return obj[2]
+        except GitCatFileError:
+            pass
+
         obj, stderr, ret = self._git_inout('show', ["--pretty=medium", id],
                                               capture_stderr=True)
         if ret:
@@ -1712,7 +2199,7 @@ class GitRepository(object):
         @rtype: dict
         """
         commit_sha1 = self.rev_parse("%s^0" % commitish)
-        args = GitArgs('--pretty=format:%an%x00%ae%x00%ad%x00%cn%x00%ce%x00%cd%x00%s%x00%f%x00%b%x00',
+        args = GitArgs('--pretty=format:%s' % self._commit_info_format,
                        '-z', '--date=raw', '--no-renames', '--name-status',
                        commit_sha1)
         out, err, ret =  self._git_inout('show', args.args)
@@ -1746,6 +2233,69 @@ class GitRepository(object):
                 'body' : fields[8],
                 'files' : files}
 
+    def get_commits_info(self, since=None, until=None, paths=None, num=0,
+                         first_parent=False, options=None):
+        """
+        Look up data of all commits from since to until touching paths with a
+        single git-log call. Takes the same arguments as L{get_commits} and
+        returns the commits in the same order.
+
+        @return: list of commit info dicts, see L{get_commit_info}. The 'id'
+            of each commit is its full SHA1.
+        @rtype: C{list} of C{dict}
+        """
+        args = GitArgs('--pretty=format:%%H%%x00%s' % self._commit_info_format,
+                       '-z', '--date=raw', '--no-renames', '--name-status')
+        args.add_true(num, '-%d' % num)
+        args.add_true(first_parent, '--first-parent')
+        if since:
+            args.add("%s..%s" % (since, until or 'HEAD'))
+        elif until:
+            args.add(until)
+        args.add_cond(options, options)
+        if isinstance(paths, six.string_types):
+            paths = [ paths ]
+        # Always list all files changed by a commit, like get_commit_info()
+        args.add_true(paths, '--full-diff')
+        args.add("--")
+        args.add_cond(paths, paths)
+
+        out, err, ret = self._git_inout('log', args.args, capture_stderr=True)
+        if ret:
+            where = " on %s" % paths if paths else ""
+            raise GitRepositoryError("Error getting commits %s..%s%s: %s" %
+                        (since, until, where, err.strip()))
+
+        commits = []
+        if not out:
+            return commits
+        fields = out.split('\x00')
+        pos = 0
+        while pos + 10 <= len(fields):
+            commit = fields[pos:pos + 10]
+            pos += 10
+            files = defaultdict(list)
+            # Changed files (if any) are listed after a newline and terminated
+            # by an empty field that separates commits
+            if pos < len(fields) and fields[pos].startswith('\n'):
+                fields[pos] = fields[pos][1:]
+                while pos + 1 < len(fields) and fields[pos] != '':
+                    files[fields[pos].strip()].append(fields[pos + 1])
+                    pos += 2
+            pos += 1
+            commits.append({'id' : commit[0],
+                            'author' : GitModifier(commit[1].strip(),
+                                                   commit[2].strip(),
+                                                   commit[3].strip()),
+                            'committer' : GitModifier(commit[4].strip(),
+                                                      commit[5].strip(),
+                                                      commit[6].strip()),
+                            'subject' : commit[7],
+                            'patchname' : commit[8],
+                            'body' : commit[9],
+                            'files' : files})
+        return commits
+
 #{ Patches
     def format_patches(self, start, end, output_dir,
                        signature=True,
@@ -1773,17 +2323,28 @@ class GitRepository(object):
         output, ret = self._git_getoutput('format-patch', options.args)
         return [ line.strip() for line in output ]
 
-    def apply_patch(self, patch, index=True, context=None, strip=None):
-        """Apply a patch using git apply"""
+    def apply_patch(self, patch, index=True, context=None, strip=None,
+                    cached=False, index_file=None):
+        """
+        Apply a patch using git apply
+
+        @param cached: only apply to the index, not the working copy
+        @type cached: C{bool}
+        @param index_file: alternate index file to apply to
+        @type index_file: C{str}
+        """
         args = []
         if context:
             args += [ '-C', context ]
-        if index:
+        if cached:
+            args.append("--cached")
+        elif index:
             args.append("--index")
         if strip != None:
             args += [ '-p', str(strip) ]
         args.append(patch)
-        self._git_command("apply", args)
+        extra_env = {'GIT_INDEX_FILE': index_file} if index_file else None
+        self._git_command("apply", args, extra_env)
 
     def diff(self, obj1, obj2=None, paths=None, stat=False, summary=False,
              text=False, ignore_submodules=True):
@@ -1824,6 +2385,79 @@ class GitRepository(object):
             raise GitRepositoryError("Git diff failed")
         return output
 
+    def diff_commits(self, commits, stat=False, summary=False, text=False,
+                     ignore_submodules=True):
+        """
+        Diff a list of commits against their parents using a single git-log
+        process. This gives the same diffs as running L{diff} with
+        I{<commit>^!} for every (non-merge) commit but scales with the size
+        of the diffs instead of the number of commits.
+
+        @param commits: commits to diff
+        @type commits: C{list} of C{str}
+        @param stat: Show diffstat
+        @type stat: C{bool} or C{int} or C{str}
+        @param summary: Show diffstat
+        @type summary: C{bool}
+        @param text: Generate textual diffs, treat all files as text
+        @type text: C{bool}
+        @param ignore_submodules: ignore changes to submodules
+        @type ignore_submodules: C{bool}
+        @return: generator yielding a (commit, diff) tuple for each commit,
+            in the order the commits were given
+        @rtype: generator of C{tuple} of C{str}, C{str}
+        """
+        if not commits:
+            return
+        options = GitArgs('--no-walk=unsorted', '--stdin', '--format=%x00%H',
+                          '-p', '--no-ext-diff')
+        if stat is True:
+            options.add('--stat')
+        elif stat:
+            options.add('--stat=%s' % stat)
+        options.add_true(summary, '--summary')
+        options.add_true(text, '--text')
+        options.add_true(ignore_submodules, '--ignore-submodules')
+
+        def strip_header(chunk, commit):
+            header = '\x00%s\n' % commit
+            if not chunk.startswith(header):
+                raise GitRepositoryError("Unexpected output diffing %s" %
+                                         commit)
+            chunk = chunk[len(header):]
+            # git-log separates the diffstat and the diff from the header
+            if chunk.startswith('---\n'):
+                return chunk[4:]
+            elif chunk.startswith('\n'):
+                return chunk[1:]
+            return chunk
+
+        shas = [self.rev_parse('%s^0' % commit) for commit in commits]
+        buf = ''
+        ind = 0
+        search_pos = 1
+        try:
+            for data in self._git_inout2('log', options.args,
+                                         '\n'.join(shas) + '\n',
+                                         capture_stderr=True):
+                buf += data
+                while ind + 1 < len(shas):
+                    marker = '\x00%s\n' % shas[ind + 1]
+                    end = buf.find(marker, search_pos)
+                    if end < 0:
+                        search_pos = max(1, len(buf) - len(marker))
+                        break
+                    yield commits[ind], strip_header(buf[:end], shas[ind])
+                    buf = buf[end:]
+                    search_pos = 1
+                    ind += 1
+        except GitRepositoryError as err:
+            raise GitRepositoryError("Git diff failed: %s" %
+                                     err.stderr.strip())
+        if ind + 1 != len(shas):
+            raise GitRepositoryError("Git diff failed: missing commits")
+        yield commits[ind], strip_header(buf, shas[ind])
+
     def diff_status(self, obj1, obj2):
         """
         Get file-status of two git repository objects
@@ -1860,9 +2494,11 @@ class GitRepository(object):
         @type format: C{str}
         @param prefix: prefix to prepend to each filename in the archive
         @type prefix: C{str}
-        @param output: the name of the archive to create, empty string or
-            C{None} gives data as return value
-        @type output: C{str} or C{None}
+        @param output: the name of the archive to create, or a file object
+            that the archive is directly written to (e.g. the stdin of a
+            compressor process), empty string or C{None} gives data as return
+            value
+        @type output: C{str}, C{file} or C{None}
         @param treeish: the treeish to create the archive from
         @type treeish: C{str}
         @param paths: List of paths to include in the archive
@@ -1871,13 +2507,30 @@ class GitRepository(object):
         @return: archive data as a generator object
         @rtype: C{None} or C{generator} of C{str}
         """
+        to_file = hasattr(output, 'fileno')
         args = GitArgs('--format=%s' % format, '--prefix=%s' % prefix)
-        args.add_true(output, '--output=%s' % output)
+        args.add_true(output and not to_file, '--output=%s' % output)
         args.add(treeish)
         args.add("--")
         args.add_cond(paths, paths)
 
-        if output:
+        if to_file:
+            # Let git write to the file directly, data doesn't go through us
+            cmd = ['git', 'archive'] + args.args
+            log.debug(cmd)
+            try:
+                popen = subprocess.Popen(cmd, stdout=output,
+                                         stderr=subprocess.PIPE,
+                                         close_fds=True, cwd=self.path)
+                err = popen.communicate()[1]
+            except OSError as err:
+                raise GitRepositoryError("Unable to archive %s: %s" %
+                                         (treeish, err))
+            if popen.returncode:
+                raise GitRepositoryError("Unable to archive %s: %s" %
+                        (treeish, err.strip() or
+                                  "exit status %d" % popen.returncode))
+        elif output:
             out, err, ret = self._git_inout('archive', args.args)
             if ret:
                 raise GitRepositoryError("Unable to archive %s: %s" % (treeish,
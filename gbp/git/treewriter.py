@@ -0,0 +1,309 @@
+# vim: set fileencoding=utf-8 :
+#
+# (C) 2026 agent <agent@local>
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""Write git trees from file data without a working copy or an index"""
+
+import hashlib
+import os
+import subprocess
+from StringIO import StringIO
+
+import gbp.log as log
+from gbp.git.fastimport import FastImport
+from gbp.git.repository import GitRepositoryError
+
+
+class GitTreeWriterError(GitRepositoryError):
+    """Exception thrown by L{GitTreeWriter}"""
+    pass
+
+
+class _TreeNode(dict):
+    """A directory, maps names to sub-directories or (mode, sha1) tuples"""
+    def __init__(self):
+        super(_TreeNode, self).__init__()
+        # Sha1 of the written tree, None if not written since last change
+        self.sha1 = None
+
+
+class _HashingReader(object):
+    """File-like object that calculates the git blob sha1 of the data read"""
+    def __init__(self, fobj, size):
+        self._fobj = fobj
+        self._hash = hashlib.sha1('blob %d\0' % size)
+        self.length = 0
+
+    def read(self, size=-1):
+        data = self._fobj.read(size)
+        self._hash.update(data)
+        self.length += len(data)
+        return data
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+class GitTreeWriter(object):
+    """
+    Build a git tree one file at a time. File content is streamed into
+    the repository with I{git fast-import} and the trees are written with a
+    I{git mktree --batch} process, so nothing needs to be written to the
+    disk outside the object database.
+
+    The tree can be written any number of times, in between files can be
+    added and removed. Only directories that changed are re-written.
+    """
+    m_regular = '100644'
+    m_exec = '100755'
+    m_symlink = '120000'
+    m_tree = '040000'
+
+    def __init__(self, repo):
+        """
+        @param repo: the repository to write to
+        @type repo: L{GitRepository}
+        """
+        self._repo = repo
+        self._root = _TreeNode()
+        self._fastimport = None
+
+    @property
+    def repo(self):
+        """The repository the tree is written to"""
+        return self._repo
+
+    def _dir(self, path, create=False):
+        """
+        Get the directory node of a path and the basename of the path,
+        marking the directories on the way as changed if I{create}
+        """
+        components = [comp for comp in path.split('/') if
+                      comp and comp != '.']
+        if not components:
+            raise GitTreeWriterError("Invalid path '%s'" % path)
+        node = self._root
+        if create:
+            node.sha1 = None
+        for name in components[:-1]:
+            child = node.get(name)
+            if not isinstance(child, _TreeNode):
+                if not create:
+                    return None, components[-1]
+                child = node[name] = _TreeNode()
+            node = child
+            if create:
+                node.sha1 = None
+        return node, components[-1]
+
+    def _set(self, path, entry):
+        """Add or replace an entry"""
+        node, name = self._dir(path, create=True)
+        node[name] = entry
+
+    def add_file(self, path, fobj, size, executable=False):
+        """
+        Add a regular file
+
+        @param path: path of the file in the tree
+        @type path: C{str}
+        @param fobj: file-like object to read exactly I{size} bytes from
+        @type fobj: C{file}
+        @param size: size of the file
+        @type size: C{int}
+        @param executable: whether the file is executable
+        @type executable: C{bool}
+        @return: sha1 of the file content
+        @rtype: C{str}
+        """
+        sha1 = self.add_blob(fobj, size, path)
+        self._set(path, (self.m_exec if executable else self.m_regular, sha1))
+        return sha1
+
+    def add_blob(self, fobj, size, name='blob'):
+        """
+        Add a blob to the repository without adding it to the tree
+
+        @param fobj: file-like object to read exactly I{size} bytes from
+        @type fobj: C{file}
+        @param size: size of the data
+        @type size: C{int}
+        @param name: name of the data for error messages
+        @type name: C{str}
+        @return: sha1 of the blob
+        @rtype: C{str}
+        """
+        if self._fastimport is None:
+            self._fastimport = FastImport(self._repo)
+        reader = _HashingReader(fobj, size)
+        try:
+            self._fastimport.add_blob(reader, size)
+        except (IOError, OSError) as err:
+            raise GitTreeWriterError("Failed to write '%s': %s" % (name, err))
+        if reader.length != size:
+            raise GitTreeWriterError("Failed to write '%s': expected %d "
+                                     "bytes of data, got %d" %
+                                     (name, size, reader.length))
+        return reader.hexdigest()
+
+    def add_symlink(self, path, target):
+        """
+        Add a symbolic link
+
+        @param path: path of the link in the tree
+        @type path: C{str}
+        @param target: the target of the link
+        @type target: C{str}
+        """
+        self.add_file(path, StringIO(target), len(target))
+        self._set(path, (self.m_symlink, self.get_entry(path)[1]))
+
+    def add_entry(self, path, mode, sha1):
+        """
+        Add an object that already exists in the repository, e.g. a blob
+        previously added with L{add_file}
+
+        @param path: path in the tree
+        @type path: C{str}
+        @param mode: git file mode, e.g. L{m_regular}
+        @type mode: C{str}
+        @param sha1: sha1 of the object
+        @type sha1: C{str}
+        """
+        self._set(path, (mode, sha1))
+
+    def get_entry(self, path):
+        """
+        Get a file of the tree
+
+        @return: mode and sha1 of the file, C{None} if the path doesn't exist
+            or is a directory
+        @rtype: C{tuple} of C{str}
+        """
+        node, name = self._dir(path)
+        if node is None or isinstance(node.get(name), _TreeNode):
+            return None
+        return node.get(name)
+
+    def remove(self, path):
+        """Remove a file or a directory"""
+        node, name = self._dir(path)
+        if node is not None and name in node:
+            self._dir(path, create=True)
+            del node[name]
+
+    def read_tree(self, treeish):
+        """
+        Replace the content of the tree with that of a tree in the repository
+
+        @param treeish: the tree to read
+        @type treeish: C{str}
+        """
+        self._root = _TreeNode()
+        for mode, _type, sha1, path in self._repo.list_tree(treeish,
+                                                            recurse=True):
+            self._set(path, (mode, sha1))
+
+    def has_dir(self, path):
+        """Check if the tree has a (non-empty) directory at I{path}"""
+        node, name = self._dir(path)
+        return node is not None and isinstance(node.get(name), _TreeNode)
+
+    def chroot(self, path):
+        """
+        Make a sub-directory the root of the tree, dropping everything else
+
+        @param path: path of the directory
+        @type path: C{str}
+        """
+        node, name = self._dir(path)
+        if node is None or not isinstance(node.get(name), _TreeNode):
+            raise GitTreeWriterError("No directory '%s' in tree" % path)
+        self._root = node[name]
+
+    def _write_node(self, node, mktree):
+        """Write a directory and its changed sub-directories"""
+        if node.sha1 is None:
+            entries = []
+            for name, entry in node.items():
+                if isinstance(entry, _TreeNode):
+                    sha1 = self._write_node(entry, mktree)
+                    if sha1:
+                        entries.append('%s tree %s\t%s' % (self.m_tree, sha1,
+                                                            name))
+                else:
+                    entries.append('%s blob %s\t%s' % (entry[0], entry[1],
+                                                        name))
+            if entries:
+                # Empty record ends a tree in batch mode
+                mktree.stdin.write('\0'.join(entries) + '\0\0')
+                mktree.stdin.flush()
+                node.sha1 = mktree.stdout.readline().strip()
+                if not node.sha1:
+                    raise GitTreeWriterError("git mktree failed")
+            else:
+                # Git doesn't store empty directories
+                node.sha1 = ''
+        return node.sha1
+
+    def write(self):
+        """
+        Write the tree to the repository
+
+        @return: sha1 of the (root) tree
+        @rtype: C{str}
+        """
+        if self._fastimport is not None:
+            # Blobs must be in the repository before trees referring to them
+            self._fastimport.close()
+            self._fastimport = None
+        if not self._root:
+            # Read the (empty) content from a file, stdin would be inherited
+            sha1, err, ret = self._repo._git_inout('hash-object',
+                                                   ['-t', 'tree', '-w',
+                                                    os.devnull],
+                                                   capture_stderr=True)
+            if ret:
+                raise GitTreeWriterError("Failed to write tree: %s" % err)
+            return sha1.strip()
+
+        cmd = ['git', 'mktree', '-z', '--batch']
+        log.debug(cmd)
+        try:
+            mktree = subprocess.Popen(cmd, stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE,
+                                      close_fds=True, cwd=self._repo.path)
+        except OSError as err:
+            raise GitTreeWriterError("Failed to run git mktree: %s" % err)
+        try:
+            sha1 = self._write_node(self._root, mktree)
+        except (IOError, OSError) as err:
+            raise GitTreeWriterError("Failed to write tree: %s" % err)
+        finally:
+            mktree.stdin.close()
+            mktree.stdout.close()
+            ret = mktree.wait()
+        if ret:
+            raise GitTreeWriterError("git mktree failed with exit status %d" %
+                                     ret)
+        return sha1
+
+    def close(self):
+        """Stop the git processes"""
+        if self._fastimport is not None:
+            self._fastimport.close()
+            self._fastimport = None
+
+# vim:et:ts=4:sw=4:et:sts=4:ai:set list listchars=tab\:»·,trail\:·:
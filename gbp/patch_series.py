@@ -16,12 +16,329 @@
 #    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 """Handle Patches and Patch Series"""
 
+import base64
+import codecs
 import os
 import re
 import subprocess
 import tempfile
 from gbp.errors import GbpError
 
+
+class _MailInfo(object):
+    """
+    Parse the header and description of a patch in-process like
+    I{git mailinfo} does it
+
+    Only the part of the patch up to the start of the diff is read. MIME
+    encoded bodies are left to I{git mailinfo}, see L{parse}.
+    """
+    headers = ['from', 'subject', 'date']
+
+    _header_re = re.compile(r'(>?From |[!-9;-~]*:)')
+    _encoded_word_re = re.compile(r'=\?([^?]*)\?([^?])\?(.*?)\?=')
+    _separator_re = re.compile(r'From [0-9a-f]{40} Mon Sep 17 00:00:00 2001\n\Z')
+    _space_re = re.compile(r'[ \t\n\r\v\f]+')
+
+    def __init__(self):
+        self.mail_headers = {}
+        self.inbody_headers = {}
+        self.log = []
+        self.patch_found = False
+        self.mime = False
+        self._inbody_accum = ''
+
+    @classmethod
+    def _decode_header(cls, value):
+        """
+        Decode RFC 2047 encoded words to UTF-8, whitespace between encoded
+        words is dropped
+
+        >>> _MailInfo._decode_header('=?utf-8?q?G=C3=BCnther?= <a@b.c>')
+        'G\\xc3\\xbcnther <a@b.c>'
+        >>> _MailInfo._decode_header('=?ISO-8859-1?Q?a?= =?ISO-8859-1?B?/A==?=')
+        'a\\xc3\\xbc'
+        >>> _MailInfo._decode_header('=?x-unknown?q?foo?=')
+        '=?x-unknown?q?foo?='
+        """
+        out = []
+        pos = 0
+        for match in cls._encoded_word_re.finditer(value):
+            gap = value[pos:match.start()]
+            if gap.strip() or pos == 0:
+                out.append(gap)
+            charset, encoding, text = match.groups()
+            try:
+                if encoding in 'bB':
+                    text = base64.b64decode(text)
+                elif encoding in 'qQ':
+                    text = re.sub(r'=([0-9A-Fa-f]{2})',
+                                  lambda m: chr(int(m.group(1), 16)),
+                                  text.replace('_', ' '))
+                else:
+                    return value
+                if codecs.lookup(charset).name != 'utf-8':
+                    text = text.decode(charset).encode('utf-8')
+            except (TypeError, ValueError, LookupError):
+                return value
+            out.append(text)
+            pos = match.end()
+        out.append(value[pos:])
+        return ''.join(out)
+
+    @classmethod
+    def _cleanup_space(cls, value):
+        """Replace runs of whitespace by a single space"""
+        return cls._space_re.sub(' ', value)
+
+    @classmethod
+    def _cleanup_subject(cls, subject):
+        """
+        Strip reply markers and bracketed prefixes like I{[PATCH 1/2]}
+
+        >>> _MailInfo._cleanup_subject('[PATCH 01/10] foo: bar')
+        'foo: bar'
+        >>> _MailInfo._cleanup_subject('Re: [RFC][PATCH]  foo  [bar]')
+        'foo [bar]'
+        """
+        while subject:
+            if subject[:3].lower() == 're:' and len(subject) > 3:
+                subject = subject[3:]
+            elif subject[0] in ' \t:':
+                subject = subject[1:]
+            elif subject[0] == '[' and ']' in subject:
+                subject = subject[subject.index(']') + 1:]
+            else:
+                break
+        return cls._cleanup_space(subject).strip()
+
+    @staticmethod
+    def _unquote(value):
+        """Unquote quoted strings and comments of an address"""
+        out = []
+        chars = iter(value)
+        for char in chars:
+            if char == '"':
+                for char in chars:
+                    if char == '\\':
+                        char = next(chars, '')
+                    elif char == '"':
+                        break
+                    out.append(char)
+            elif char == '(':
+                out.append(char)
+                depth = 1
+                for char in chars:
+                    if char == '\\':
+                        char = next(chars, '')
+                    elif char == '(':
+                        depth += 1
+                    elif char == ')':
+                        depth -= 1
+                    out.append(char)
+                    if not depth:
+                        break
+            else:
+                out.append(char)
+        return ''.join(out)
+
+    @classmethod
+    def _parse_from(cls, value):
+        """
+        Split an address into author name and email
+
+        >>> _MailInfo._parse_from('"Doe, John" <john@example.com>')
+        ('Doe, John', 'john@example.com')
+        >>> _MailInfo._parse_from('john@example.com (John Doe)')
+        ('John Doe', 'john@example.com')
+        >>> _MailInfo._parse_from('<jo@example.com>')
+        ('jo@example.com', 'jo@example.com')
+        >>> _MailInfo._parse_from('John Doe <john>')
+        ('John Doe', 'john')
+        """
+        def sane_name(name, email):
+            if not name or len(name) > 60 or re.search('[@<>]', name):
+                return email
+            return name
+
+        value = cls._cleanup_space(value)
+        unquoted = cls._unquote(value)
+        at = unquoted.find('@')
+        if at < 0:
+            match = re.match(r'([^<]*)<([^>]*)>', value)
+            if not match:
+                return '', ''
+            email = match.group(2)
+            return sane_name(match.group(1).strip(), email), email
+        start = at
+        while start > 0 and not unquoted[start - 1].isspace():
+            if unquoted[start - 1] == '<':
+                unquoted = unquoted[:start - 1] + ' ' + unquoted[start:]
+                break
+            start -= 1
+        end = re.match(r'[^ \n\t\r\v\f>]*', unquoted[start:]).end() + start
+        email = unquoted[start:end]
+        name = cls._cleanup_space(unquoted[:start] + unquoted[end + 1:]).strip()
+        if name.startswith('(') and name.endswith(')'):
+            name = name[1:-1]
+        return sane_name(name, email), email
+
+    @staticmethod
+    def _parse_header(line, headers):
+        """Get name and value of one of I{headers} from a header line"""
+        name, sep, value = line.partition(':')
+        name = name.lower()
+        if sep and name in headers:
+            return name, value.lstrip(' \t\n\r\v\f')
+        return None, None
+
+    def _check_header(self, line):
+        """Check a line of the mail header"""
+        name, value = self._parse_header(line, self.headers +
+                                         ['content-type',
+                                          'content-transfer-encoding'])
+        if name in self.headers:
+            self.mail_headers[name] = self._decode_header(value)
+        elif name == 'content-type':
+            content_type = value.lower()
+            if (content_type.split(';')[0].strip() != 'text/plain' or
+                    'format=flowed' in content_type or
+                    ('charset' in content_type and
+                     not re.search(r'charset="?utf-?8"?(;|$)',
+                                   content_type.replace(' ', '')))):
+                self.mime = True
+        elif name == 'content-transfer-encoding':
+            if value.strip().lower() not in ('7bit', '8bit', 'binary'):
+                self.mime = True
+
+    def _flush_inbody_header(self):
+        if self._inbody_accum:
+            missing = [ name for name in self.headers
+                        if name not in self.inbody_headers ]
+            name, value = self._parse_header(self._inbody_accum, missing)
+            if name:
+                self.inbody_headers[name] = self._decode_header(value)
+            self._inbody_accum = ''
+
+    def _check_inbody_header(self, line):
+        """Check if a line of the body is an in-body header"""
+        if self._inbody_accum and line[:1] in ' \t':
+            if self._inbody_accum.endswith('\n'):
+                self._inbody_accum = self._inbody_accum[:-1]
+            self._inbody_accum += line
+            return True
+        self._flush_inbody_header()
+        if line.startswith('>From') and line[5:6].isspace():
+            return bool(self._separator_re.match(line[1:]))
+        if line.startswith('[PATCH]') and line[7:8].isspace():
+            self.inbody_headers['subject'] = line
+            return True
+        missing = [ name for name in self.headers
+                    if name not in self.inbody_headers ]
+        if self._parse_header(line, missing)[0]:
+            self._inbody_accum = line
+            return True
+        return False
+
+    @staticmethod
+    def _patchbreak(line):
+        """
+        Check if a line starts the diff
+
+        >>> _MailInfo._patchbreak('---\\n')
+        True
+        >>> _MailInfo._patchbreak('--- a/foo\\n')
+        True
+        >>> _MailInfo._patchbreak('----\\n')
+        False
+        """
+        if line.startswith('diff -') or line.startswith('Index: '):
+            return True
+        if len(line) < 4 or not line.startswith('---'):
+            return False
+        if line[3] == ' ' and not line[4:5].isspace():
+            return True
+        rest = line[3:]
+        stripped = rest.lstrip(' \t\r\v\f')
+        return stripped.startswith('\n')
+
+    def _read_header(self, lines):
+        """
+        Read the mail header
+
+        @return: the first line of the body
+        """
+        line = next(lines, '')
+        while True:
+            line = line.rstrip()
+            if not line or not self._header_re.match(line):
+                return line + '\n'
+            for next_line in lines:
+                if next_line[:1] not in ' \t':
+                    break
+                line += ' ' + next_line[1:].rstrip()
+            else:
+                next_line = ''
+            self._check_header(line)
+            if self.mime:
+                return ''
+            if not next_line:
+                return ''
+            line = next_line
+
+    def _read_body(self, line, lines):
+        """Read the commit message up to the start of the diff"""
+        header_stage = True
+        while line:
+            if header_stage and line == '\n':
+                if self._inbody_accum:
+                    self._flush_inbody_header()
+                    header_stage = False
+            elif header_stage and self._check_inbody_header(line):
+                pass
+            else:
+                header_stage = False
+                if self._patchbreak(line):
+                    self.patch_found = True
+                    break
+                self.log.append(line)
+            line = next(lines, '')
+        self._flush_inbody_header()
+
+    @classmethod
+    def parse(cls, fd):
+        """
+        Parse the header of a patch
+
+        @param fd: the patch file
+        @type fd: C{file}
+        @return: the patch information as L{Patch.info} and the long
+            description or C{None} if I{git mailinfo} needs to decode
+            the patch
+        @rtype: C{tuple} of C{dict} and C{str}
+        """
+        mailinfo = cls()
+        lines = iter(fd)
+        first = mailinfo._read_header(lines)
+        if mailinfo.mime:
+            return None
+        mailinfo._read_body(first, lines)
+
+        headers = dict(mailinfo.mail_headers)
+        if mailinfo.patch_found:
+            headers.update(mailinfo.inbody_headers)
+        info = {}
+        if 'from' in headers:
+            info['author'], info['email'] = cls._parse_from(headers['from'])
+        if 'subject' in headers:
+            info['subject'] = cls._cleanup_subject(headers['subject'])
+        if 'date' in headers:
+            info['date'] = cls._cleanup_space(headers['date']).strip()
+        for key, value in info.items():
+            info[key] = value.strip()
+        return info, ''.join(mailinfo.log)
+
+
 class Patch(object):
     """
     A patch in a L{PatchSeries}
@@ -58,6 +375,23 @@ class Patch(object):
         """
         Read patch information into a structured form
 
+        The patch header is parsed in-process, I{git mailinfo} is only
+        used for MIME encoded patches.
+        """
+        try:
+            with open(self.path) as patch:
+                parsed = _MailInfo.parse(patch)
+        except IOError:
+            parsed = None
+        if parsed:
+            self.info, self.long_desc = parsed
+        else:
+            self._read_mailinfo()
+
+    def _read_mailinfo(self):
+        """
+        Read patch information into a structured form
+
         using I{git mailinfo}
         """
         self.info = {}
@@ -76,7 +410,7 @@ class Patch(object):
             body.close()
         except IOError as msg:
             raise GbpError("Failed to read patch header of '%s': %s" %
-                           (self.patch, msg))
+                           (self.path, msg))
         finally:
             if os.path.exists(body.name):
                 os.unlink(body.name)
@@ -22,18 +22,27 @@ import re
 import glob
 import stat
 import subprocess
-import zipfile
+import tempfile
+from distutils.spawn import find_executable
 
 import six
 
 import gbp.command_wrappers as gbpc
+import gbp.log
 from gbp.errors import GbpError
 
 # compression types, extra options and extensions
 compressor_opts = { 'gzip'  : [ ['-n'], 'gz' ],
                     'bzip2' : [ [], 'bz2' ],
                     'lzma'  : [ [], 'lzma' ],
-                    'xz'    : [ [], 'xz' ] }
+                    'xz'    : [ [], 'xz' ],
+                    'zstd'  : [ ['-q'], 'zst' ] }
+
+# Multi-threaded compressors: program and option for the number of threads
+parallel_compressors = { 'gzip'  : [ 'pigz', '-p%d' ],
+                         'bzip2' : [ 'pbzip2', '-p%d' ],
+                         'xz'    : [ 'xz', '-T%d' ],
+                         'zstd'  : [ 'zstd', '-T%d' ] }
 
 # Map frequently used names of compression types to the internal ones:
 compressor_aliases = { 'bz2' : 'bzip2',
@@ -48,6 +57,63 @@ archive_ext_aliases = { 'tgz'   : ('tar', 'gzip'),
                         'tlz'   : ('tar', 'lzma'),
                         'txz'   : ('tar', 'xz')}
 
+def compressor_threads(threads):
+    """
+    Get the number of threads to use for compression
+
+    @param threads: number of threads or 'auto' for the number of CPUs
+    @type threads: C{str} or C{int}
+    @rtype: C{int}
+
+    >>> compressor_threads('4')
+    4
+    >>> from multiprocessing import cpu_count
+    >>> compressor_threads('auto') == cpu_count()
+    True
+    >>> compressor_threads('foo')
+    Traceback (most recent call last):
+    ...
+    GbpError: Invalid number of compression threads 'foo'
+    """
+    if threads == 'auto':
+        from multiprocessing import cpu_count
+        return cpu_count()
+    try:
+        num = int(threads)
+    except ValueError:
+        num = 0
+    if num < 1:
+        raise GbpError("Invalid number of compression threads '%s'" % threads)
+    return num
+
+
+def compressor_cmd(comp_type, threads=1):
+    """
+    Get the program to compress with and the options for it, for running
+    I{threads} threads. A multi-threaded implementation is used if more than
+    one thread is requested and one is available. Only the standard,
+    single-threaded, programs produce output that is byte-identical with
+    the output of other versions of gbp and other machines.
+
+    @param comp_type: compression type
+    @type comp_type: C{str}
+    @param threads: number of threads to use
+    @type threads: C{int}
+    @return: program and options specific to it
+    @rtype: C{tuple} of C{str} and C{list} of C{str}
+
+    >>> compressor_cmd('gzip')
+    ('gzip', [])
+    >>> compressor_cmd('lzma', 4)
+    ('lzma', [])
+    """
+    if threads > 1 and comp_type in parallel_compressors:
+        prog, thread_opt = parallel_compressors[comp_type]
+        if find_executable(prog):
+            return prog, [thread_opt % threads]
+    return comp_type, []
+
+
 def parse_archive_filename(filename):
     """
     Given an filename return the basename (i.e. filename without the
@@ -71,6 +137,8 @@ def parse_archive_filename(filename):
     ('abc', 'zip', None)
     >>> parse_archive_filename("abc.lzma")
     ('abc', None, 'lzma')
+    >>> parse_archive_filename("abc.tar.zst")
+    ('abc', 'tar', 'zstd')
     >>> parse_archive_filename("abc.tar.foo")
     ('abc.tar.foo', None, None)
     >>> parse_archive_filename("abc")
@@ -416,6 +484,7 @@ class UpstreamSource(object):
         else:
             files = []
             if self._archive_fmt == 'zip':
+                import zipfile
                 archive = zipfile.ZipFile(self.path)
                 for info in archive.infolist():
                     typ = 'd' if stat.S_ISDIR(info.external_attr >> 16) else '?'
@@ -491,6 +560,43 @@ class UpstreamSource(object):
                 return True
         return False
 
+    def import_tree(self, writer, filters=[]):
+        """
+        Import packed upstream sources into a git tree. The content of the
+        tree is the same as that of the source tree returned by L{unpack}.
+        The sources are only unpacked to the disk if git would convert the
+        content of the files, e.g. because of I{.gitattributes}.
+
+        @param writer: tree to add the files to
+        @type writer: L{GitTreeWriter}
+        @param filters: tar exclude patterns of files to leave out
+        @type filters: C{list} of C{str}
+        """
+        from gbp.pkg.archiveimport import (import_archive,
+                                           ArchiveConversionError)
+
+        if self.is_dir():
+            raise GbpError("Cannot import directory %s" % self.path)
+        ext = os.path.splitext(self.path)[1]
+        archive_fmt = 'zip' if ext in [".zip", ".xpi"] else 'tar'
+        try:
+            import_archive(writer, self.path, archive_fmt, self.compression,
+                           filters, self._prefix)
+            return
+        except ArchiveConversionError as err:
+            gbp.log.debug("%s, unpacking '%s'" % (err, self.path))
+
+        # Let git convert the files when adding them from the disk
+        unpack_dir = tempfile.mkdtemp(prefix='import_')
+        try:
+            unpacked = self.unpack(unpack_dir, filters).unpacked
+            if os.path.exists(os.path.join(unpacked, '.git')):
+                raise GbpError("Archive '%s' contains .git metadata - "
+                               "giving up." % self.path)
+            writer.read_tree(writer.repo.create_tree(unpacked))
+        finally:
+            gbpc.RemoveTree(unpack_dir)()
+
     def _unpack_zip(self, dir):
         try:
             gbpc.UnpackZipArchive(self.path, dir)()
@@ -0,0 +1,299 @@
+# vim: set fileencoding=utf-8 :
+#
+# (C) 2026 agent <agent@local>
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""Import the content of source archives into git without unpacking"""
+
+import fnmatch
+import os
+import re
+import stat
+import subprocess
+import tarfile
+import zipfile
+
+import gbp.log
+from gbp.errors import GbpError
+
+
+class ArchiveConversionError(GbpError):
+    """Git would convert the content of the archive when adding it"""
+    pass
+
+
+class ExcludeFilter(object):
+    """
+    Match paths against exclude patterns the way I{tar --exclude} does:
+    a pattern matches at any directory level, excludes everything under a
+    matching directory and C{*} also matches C{/}
+
+    >>> excl = ExcludeFilter(['*.o', 'debian', 'doc/*.txt'])
+    >>> excl.match('foo.o'), excl.match('src/foo.o'), excl.match('foo.c')
+    (True, True, False)
+    >>> excl.match('debian'), excl.match('debian/rules')
+    (True, True)
+    >>> excl.match('pkg/debian/rules'), excl.match('debianize.sh')
+    (True, False)
+    >>> excl.match('doc/a.txt'), excl.match('pkg/doc/a.txt')
+    (True, True)
+    >>> excl.match('mydoc/a.txt'), excl.match('a.txt')
+    (False, False)
+    >>> ExcludeFilter([]).match('foo')
+    False
+    """
+    def __init__(self, patterns):
+        self._regexps = [re.compile(fnmatch.translate(pattern)) for pattern in
+                         patterns]
+
+    def match(self, path):
+        """Check if I{path} is excluded"""
+        if not self._regexps:
+            return False
+        components = path.split('/')
+        for start in range(len(components)):
+            for end in range(start + 1, len(components) + 1):
+                subpath = '/'.join(components[start:end])
+                for regexp in self._regexps:
+                    if regexp.match(subpath):
+                        return True
+        return False
+
+
+def normalize_path(path):
+    """
+    Normalize the name of an archive member like tar does on extraction
+
+    @return: the path, C{None} if the member would not be extracted
+    @rtype: C{str}
+
+    >>> normalize_path('./foo/./bar/')
+    'foo/bar'
+    >>> normalize_path('/foo//bar')
+    'foo/bar'
+    >>> normalize_path('./') is None
+    True
+    >>> normalize_path('foo/../../bar') is None
+    True
+    """
+    components = [comp for comp in path.split('/') if comp and comp != '.']
+    if not components or '..' in components:
+        return None
+    return '/'.join(components)
+
+
+def converts_content(repo):
+    """
+    Check if git may convert the content of files added to a repository
+    regardless of the files themselves, i.e. if line endings are converted
+    or there are attributes from outside the tree
+
+    @param repo: the repository
+    @type repo: L{GitRepository}
+    @rtype: C{bool}
+    """
+    try:
+        if repo.get_config('core.autocrlf').lower() in ['true', 'input',
+                                                        'yes', 'on', '1']:
+            return True
+    except KeyError:
+        pass
+    attr_files = [os.path.join(repo.git_dir, 'info', 'attributes')]
+    try:
+        attr_files.append(os.path.expanduser(
+                                repo.get_config('core.attributesFile')))
+    except KeyError:
+        config_home = os.getenv('XDG_CONFIG_HOME') or \
+                        os.path.expanduser('~/.config')
+        attr_files.append(os.path.join(config_home, 'git', 'attributes'))
+    return any(os.path.exists(path) for path in attr_files)
+
+
+class _ArchiveImporter(object):
+    """Feed archive members to a L{GitTreeWriter}"""
+    def __init__(self, writer, filters, prefix):
+        self.writer = writer
+        self.prefix = prefix
+        self._exclude = ExcludeFilter(filters or [])
+        # Hard links to files not in the tree, by the link target
+        self.links = {}
+
+    def accept(self, name):
+        """Get the path of a member in the tree, C{None} if it's skipped"""
+        path = normalize_path(name)
+        if path is None:
+            if name.strip('./'):
+                gbp.log.warn("Skipping archive member '%s'" % name)
+            return None
+        if self._exclude.match(path):
+            return None
+        # Git never adds nested git metadata, the top-level .git is checked
+        # separately, after stripping the prefix
+        components = path.split('/')
+        if '.git' in components[1:] and \
+                (components[1:2] != ['.git'] or components[0] != self.prefix):
+            return None
+        if components[-1] == '.gitattributes':
+            raise ArchiveConversionError("Archive has git attributes in "
+                                         "'%s'" % path)
+        return path
+
+    def add_file(self, path, fobj, size, mode):
+        """Add a regular file"""
+        self.writer.add_file(path, fobj, size, bool(mode & stat.S_IXUSR))
+
+    def add_tar_member(self, archive, member):
+        """Add a member of a tar archive"""
+        name = self.accept(member.name)
+        if name is None:
+            return
+        if member.isfile():
+            self.add_file(name, archive.extractfile(member), member.size,
+                          member.mode)
+        elif member.issym():
+            self.writer.add_symlink(name, member.linkname)
+        elif member.islnk():
+            target = normalize_path(member.linkname) or member.linkname
+            entry = self.writer.get_entry(target)
+            if entry is None:
+                # Tar extracts links to files filtered out, the content is
+                # only read if needed
+                self.links.setdefault(target, []).append(name)
+            else:
+                self.writer.add_entry(name, entry[0], entry[1])
+        # Directories (and devices etc.) are not stored in git
+
+    def add_tar_link_target(self, archive, member):
+        """Add the hard links to a member of a tar archive"""
+        names = self.links.pop(normalize_path(member.name), None)
+        if names and member.isfile():
+            self.add_file(names[0], archive.extractfile(member), member.size,
+                          member.mode)
+            for name in names[1:]:
+                self.writer.add_entry(name, *self.writer.get_entry(names[0]))
+
+
+def _read_tar(path, compression, add_member):
+    """
+    Read the members of a (compressed) tarball, decompressing with
+    external tools
+    """
+    if compression:
+        cmd = [compression, '-dc', path]
+        gbp.log.debug(cmd)
+        try:
+            popen = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+        except OSError as err:
+            raise GbpError("Failed to run %s: %s" % (compression, err))
+        fobj = popen.stdout
+    else:
+        popen = None
+        fobj = open(path, 'rb')
+    try:
+        # Detect compression, for tarballs without a compression suffix
+        archive = tarfile.open(fileobj=fobj, mode='r|*')
+        for member in archive:
+            add_member(archive, member)
+        archive.close()
+        # Let the decompressor finish
+        while fobj.read(65536):
+            pass
+    except (tarfile.TarError, EnvironmentError) as err:
+        raise GbpError("Failed to read archive '%s': %s" % (path, err))
+    finally:
+        fobj.close()
+        ret = popen.wait() if popen else 0
+    if ret:
+        raise GbpError("Failed to decompress '%s'" % path)
+
+
+def _import_tar(importer, path, compression):
+    """Import a (compressed) tarball"""
+    _read_tar(path, compression, importer.add_tar_member)
+    if importer.links:
+        # Read again for the content of the files that are only hard linked
+        _read_tar(path, compression, importer.add_tar_link_target)
+    if importer.links:
+        target, names = importer.links.popitem()
+        raise GbpError("Cannot hard link '%s' to '%s': no such file" %
+                       (names[0], target))
+
+
+def _import_zip(importer, path):
+    """Import a zip archive"""
+    try:
+        archive = zipfile.ZipFile(path)
+        for info in archive.infolist():
+            name = importer.accept(info.filename)
+            if name is None or info.filename.endswith('/'):
+                continue
+            mode = info.external_attr >> 16
+            if stat.S_ISLNK(mode):
+                importer.writer.add_symlink(name, archive.read(info))
+            elif stat.S_ISDIR(mode):
+                continue
+            else:
+                # Files of archives created on non-unix systems have no mode
+                fobj = archive.open(info)
+                importer.add_file(name, fobj, info.file_size, mode)
+                fobj.close()
+        archive.close()
+    except (zipfile.BadZipfile, EnvironmentError) as err:
+        raise GbpError("Failed to read archive '%s': %s" % (path, err))
+
+
+def import_archive(writer, path, archive_fmt, compression, filters=None,
+                   prefix=''):
+    """
+    Import the content of an archive into a git tree without unpacking it.
+    File content is stored as-is, so archives whose content git would
+    convert, i.e. archives with I{.gitattributes} files or any archive if
+    L{converts_content} the repository, are refused with
+    L{ArchiveConversionError}. Otherwise the resulting tree is the same as
+    what committing the sources unpacked with L{UpstreamSource.unpack} would
+    give.
+
+    @param writer: the tree the files are added to
+    @type writer: L{GitTreeWriter}
+    @param path: path to the archive
+    @type path: C{str}
+    @param archive_fmt: archive format, C{tar} or C{zip}
+    @type archive_fmt: C{str}
+    @param compression: compression of the archive, e.g. C{gzip}
+    @type compression: C{str} or C{None}
+    @param filters: tar exclude patterns of files to leave out
+    @type filters: C{list} of C{str}
+    @param prefix: leading directory of the archive, stripped from the
+        imported paths if the archive contains the directory
+    @type prefix: C{str}
+    """
+    if converts_content(writer.repo):
+        raise ArchiveConversionError("Git may convert the content of files "
+                                     "added to the repository")
+    importer = _ArchiveImporter(writer, filters, prefix)
+    if archive_fmt == 'zip':
+        _import_zip(importer, path)
+    elif archive_fmt == 'tar':
+        _import_tar(importer, path, compression)
+    else:
+        raise GbpError("Unsupported archive format %s, unable to import "
+                       "'%s'" % (archive_fmt, path))
+    if prefix and writer.has_dir(prefix):
+        writer.chroot(prefix)
+    # Don't mess up the repository with git metadata from the archive
+    if writer.has_dir('.git') or writer.get_entry('.git'):
+        raise GbpError("Archive '%s' contains .git metadata - giving up." %
+                       path)
+
+# vim:et:ts=4:sw=4:et:sts=4:ai:set list listchars=tab\:»·,trail\:·:
@@ -27,6 +27,8 @@ class PristineTar(Command):
 
     def __init__(self, repo):
         self.repo = repo
+        # Commits found by get_commit(), per head of the branch
+        self._commits = {}
         super(PristineTar, self).__init__(self.cmd, cwd=repo.path, capture_stderr=True)
 
     def has_commit(self, archive_regexp):
@@ -48,13 +50,16 @@ class PristineTar(Command):
         if not self.repo.has_pristine_tar_branch():
             return None
 
-        regex = ('pristine-tar .* %s' % archive_regexp)
-        commits = self.repo.grep_log(regex, self.branch)
-        if commits:
-            commit = commits[-1]
+        head = self.repo.get_ref('refs/heads/%s' % self.branch)
+        key = (head, archive_regexp)
+        if key not in self._commits:
+            regex = ('pristine-tar .* %s' % archive_regexp)
+            commits = self.repo.grep_log(regex, self.branch)
+            self._commits[key] = commits[-1] if commits else None
+        commit = self._commits[key]
+        if commit:
             gbp.log.debug("Found pristine-tar commit at '%s'" % commit)
-            return commit
-        return None
+        return commit
 
     def checkout(self, archive):
         """
@@ -79,4 +84,5 @@ class PristineTar(Command):
         self.run_error = ("Couldn't commit to '%s' with upstream '%s': {stderr}" %
                           (self.branch, upstream))
         self.__call__(['commit', archive, upstream])
+        self.repo.invalidate_refs()
 
@@ -0,0 +1,191 @@
+# vim: set fileencoding=utf-8 :
+#
+# (C) 2026 agent <agent@local>
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""Content-addressed cache of generated source tarballs"""
+
+import errno
+import hashlib
+import os
+import shutil
+import stat
+import tempfile
+
+import gbp.log
+
+
+def unshare_file(path):
+    """
+    Remove a regular file that may be shared with L{TarballCache}, i.e. one
+    that has other hardlinks or is read-only, so that it can be re-created
+    without modifying the cached file
+
+    @param path: path to the file
+    @type path: C{str}
+    """
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return
+    if stat.S_ISREG(info.st_mode) and (info.st_nlink > 1 or
+                                       not info.st_mode & stat.S_IWUSR):
+        os.unlink(path)
+
+
+class TarballCache(object):
+    """
+    Cache of generated (compressed) tarballs, indexed by a key computed from
+    everything that affects the content of the tarball. Files are handed out
+    as hardlinks to the cached file, or copies if that is not possible.
+    Cached files are read-only and the least recently used ones are removed
+    when the total size of the cache exceeds a limit.
+
+    >>> import shutil, tempfile
+    >>> tmpdir = tempfile.mkdtemp(prefix='gbp_tarballcache_')
+    >>> cache = TarballCache(os.path.join(tmpdir, 'cache'), 10)
+    >>> key = TarballCache.make_key('3a2b', 'foo/', 'tar', 'xz', '9')
+    >>> key
+    '381d5fb9570e7ae93c71f1da16c281034d69db9f'
+    >>> tarball = os.path.join(tmpdir, 'foo.tar.xz')
+    >>> with open(tarball, 'w') as fobj:
+    ...     fobj.write('12345678')
+    >>> cache.get(key, tarball + '.copy')
+    False
+    >>> cache.put(key, tarball)
+    >>> cache.get(key, tarball + '.copy')
+    True
+    >>> open(tarball + '.copy').read()
+    '12345678'
+    >>> cache.put('bar', tarball)
+    >>> cache.get(key, tarball + '.copy')
+    False
+    >>> shutil.rmtree(tmpdir)
+    """
+    def __init__(self, path, max_size):
+        """
+        @param path: directory of the cache
+        @type path: C{str}
+        @param max_size: maximum size of the cache, in bytes
+        @type max_size: C{int}
+        """
+        self.path = path
+        self.max_size = max_size
+
+    @staticmethod
+    def make_key(*fields):
+        """
+        Create a cache key
+
+        @param fields: properties affecting the tarball content, e.g. sha1 of
+            the tree, prefix, archive format and compression
+        @type fields: C{str}
+        @rtype: C{str}
+        """
+        return hashlib.sha1('\0'.join(str(field) for field in
+                                      fields)).hexdigest()
+
+    def _entry(self, key):
+        """Path of a cache entry"""
+        return os.path.join(self.path, key)
+
+    @staticmethod
+    def _link_or_copy(src, dst):
+        """Hardlink src to dst, copy it if hardlinking is not possible"""
+        if os.path.lexists(dst):
+            os.unlink(dst)
+        try:
+            os.link(src, dst)
+        except OSError as err:
+            if err.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+            shutil.copy2(src, dst)
+
+    def get(self, key, output):
+        """
+        Get a file from the cache
+
+        @param key: cache key
+        @type key: C{str}
+        @param output: where to put the file
+        @type output: C{str}
+        @return: C{True} if the file was found in the cache
+        @rtype: C{bool}
+        """
+        entry = self._entry(key)
+        try:
+            self._link_or_copy(entry, output)
+            # Mark as recently used
+            os.utime(entry, None)
+        except (IOError, OSError) as err:
+            if err.errno != errno.ENOENT:
+                gbp.log.warn("Failed to get %s from cache: %s" % (output, err))
+            return False
+        gbp.log.debug("Got %s from cache (%s)" % (output, key))
+        return True
+
+    def put(self, key, filename):
+        """
+        Add a file to the cache
+
+        @param key: cache key
+        @type key: C{str}
+        @param filename: file to add
+        @type filename: C{str}
+        """
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            # Link/copy under a temporary name first, then rename, so that
+            # concurrent users never see partial files
+            fd, tmp = tempfile.mkstemp(dir=self.path, prefix='.tmp-')
+            os.close(fd)
+            try:
+                self._link_or_copy(filename, tmp)
+                os.chmod(tmp, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                os.utime(tmp, None)
+                os.rename(tmp, self._entry(key))
+            except:
+                os.unlink(tmp)
+                raise
+        except (IOError, OSError) as err:
+            gbp.log.warn("Failed to add %s to cache: %s" % (filename, err))
+            return
+        gbp.log.debug("Added %s to cache (%s)" % (filename, key))
+        self.expire()
+
+    def expire(self):
+        """Remove least recently used entries to fit in the size limit"""
+        entries = []
+        total = 0
+        for fname in os.listdir(self.path):
+            if fname.startswith('.'):
+                continue
+            try:
+                info = os.stat(os.path.join(self.path, fname))
+            except OSError:
+                continue
+            entries.append((info.st_mtime, info.st_size, fname))
+            total += info.st_size
+        for _mtime, size, fname in sorted(entries):
+            if total <= self.max_size:
+                break
+            gbp.log.debug("Removing %s from cache" % fname)
+            try:
+                os.unlink(os.path.join(self.path, fname))
+            except OSError:
+                pass
+            total -= size
+
+# vim:et:ts=4:sw=4:et:sts=4:ai:set list listchars=tab\:»·,trail\:·:
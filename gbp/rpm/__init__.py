@@ -17,9 +17,11 @@
 #    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 """provides some rpm source package related helpers"""
 
+import glob
 import os
 import re
 import tempfile
+import time
 from optparse import OptionParser
 from collections import defaultdict
 
@@ -32,6 +34,7 @@ from gbp.pkg import (UpstreamSource, parse_archive_filename)
 from gbp.rpm.policy import RpmPkgPolicy
 from gbp.rpm.linkedlist import LinkedList
 from gbp.rpm.lib_rpm import librpm, get_librpm_log
+from gbp.rpm.speccache import SpecInfo, SpecInfoCache
 
 
 class NoSpecError(Exception):
@@ -100,7 +103,17 @@ class SrcRpmFile(object):
 
 
 class SpecFile(object):
-    """Class for parsing/modifying spec files"""
+    """
+    Class for parsing/modifying spec files
+
+    @cvar cache: cache of librpm parse results, shared by all instances
+    @type cache: L{SpecInfoCache}
+    @cvar parse_once: parse with librpm only once if the spec file does not
+        use macros before defining them
+    @type parse_once: C{bool}
+    @ivar parse_time: time (in seconds) librpm took to parse the spec file
+    @type parse_time: C{float}
+    """
     tag_re = re.compile(r'^(?P<name>[a-z]+)(?P<num>[0-9]+)?\s*:\s*'
                          '(?P<value>\S(.*\S)?)\s*$', flags=re.I)
     directive_re = re.compile(r'^%(?P<name>[a-z]+)(?P<num>[0-9]+)?'
@@ -113,6 +126,26 @@ class SpecFile(object):
             'clean', 'check', 'pre', 'preun', 'post', 'postun', 'verifyscript',
             'files', 'changelog', 'triggerin', 'triggerpostin', 'triggerun',
             'triggerpostun')
+    # Macros whose values affect the outcome of parsing a spec file
+    cache_macros = ('%{_arch}', '%{_target_cpu}', '%{_target_os}',
+                    '%{_vendor}', '%{?dist}', '%{?rhel}', '%{?fedora}',
+                    '%{?suse_version}', '%{?tizen}')
+    # Files rpm reads macro definitions from
+    macro_files = ('%{_rpmconfigdir}/macros', '%{_rpmconfigdir}/macros.d/*',
+                   '%{_rpmconfigdir}/platform/%{_target}/macros',
+                   '%{_rpmconfigdir}/*/macros', '%{_sysconfdir}/rpm/macros*',
+                   '%{_sysconfdir}/rpm/%{_target}/macros', '~/.rpmmacros')
+    # Spec files whose parse results depend on other files, programs or the
+    # environment, also when used in %{expand:}
+    uncacheable_re = re.compile(r'^\s*%(include|load)\b|%\(|'
+                                r'%\{[?!]*(lua|load|getenv):', flags=re.M)
+    cache = SpecInfoCache()
+    # Parse only once with rpm-python if no macro is used before its
+    # definition, otherwise parse twice
+    parse_once = True
+    macro_def_re = re.compile(r'^\s*%(define|global)\s+(?P<name>\w+)')
+    macro_use_re = re.compile(r'%(\{[?!]*)?(?P<name>[a-z_]\w*)',
+                              flags=re.I)
 
     def __init__(self, filename=None, filedata=None):
 
@@ -154,16 +187,20 @@ class SpecFile(object):
         self._specinfo = self._parse_filtered_spec(self._filtertags)
 
         # Other initializations
-        source_header = self._specinfo.packages[0].header
-        self.name = source_header[librpm.RPMTAG_NAME]
-        self.upstreamversion = source_header[librpm.RPMTAG_VERSION]
-        self.release = source_header[librpm.RPMTAG_RELEASE]
+        self.name = self._specinfo.header_value('name')
+        self.upstreamversion = self._specinfo.header_value('version')
+        self.release = self._specinfo.header_value('release')
         # rpm-python returns epoch as 'long', convert that to string
-        self.epoch = str(source_header[librpm.RPMTAG_EPOCH]) \
-            if source_header[librpm.RPMTAG_EPOCH] != None else None
-        self.packager = source_header[librpm.RPMTAG_PACKAGER]
+        epoch = self._specinfo.header_value('epoch')
+        self.epoch = str(epoch) if epoch != None else None
+        self.packager = self._specinfo.header_value('packager')
+        self.parse_time = self._specinfo.parse_time
         self._tags = {}
         self._special_directives = defaultdict(list)
+        # Tag and special directive line records indexed by (name, number),
+        # for not having to scan through all of them when updating patches
+        self._tag_index = defaultdict(list)
+        self._directive_index = defaultdict(list)
         self._gbp_tags = defaultdict(list)
 
         # Parse extra info from spec file
@@ -177,24 +214,134 @@ class SpecFile(object):
 
         self.orig_src = self._guess_orig_file()
 
+    def _spec_info(self, spec):
+        """
+        Pick the information we need from a spec parsed by rpm-python
+
+        @param spec: the parsed spec
+        @type spec: C{librpm.spec}
+        @rtype: L{SpecInfo}
+        """
+        header = spec.packages[0].header
+        tagnames = set(['name', 'version', 'release', 'epoch', 'packager',
+                        'vcs'])
+        for line in self._content:
+            matchobj = self.tag_re.match(str(line))
+            if matchobj:
+                tagnames.add(matchobj.group('name').lower())
+        values = {}
+        for tagname in tagnames:
+            try:
+                values[tagname] = header[getattr(librpm, 'RPMTAG_%s' %
+                                                 tagname.upper())]
+            except AttributeError:
+                pass
+        return SpecInfo(values, list(spec.sources))
+
+    @classmethod
+    def _has_forward_macro_refs(cls, lines):
+        """
+        Check if the spec file uses any macros before they are defined, i.e.
+        before a %define or %global or, for macros defined by rpm from tags,
+        before the tag. Spec files including other files or using Lua,
+        which can define macros anywhere in a block, are always considered
+        to have forward references.
+
+        @param lines: lines of the spec file
+        @type lines: C{list} of C{str}
+        @rtype: C{bool}
+        """
+        uses = {}
+        defs = {}
+        for linenum, line in enumerate(lines):
+            line = line.replace('%%', '')
+            if re.match(r'^\s*%include\s', line) or '%{lua:' in line:
+                return True
+            match = cls.macro_def_re.match(line)
+            if match:
+                defs[match.group('name')] = linenum
+                line = line[match.end():]
+            else:
+                match = cls.tag_re.match(line)
+                if match:
+                    defs[match.group('name').lower()] = linenum
+                    if match.group('num'):
+                        defs['%s%s' % (match.group('name').upper(),
+                                       match.group('num'))] = linenum
+            for match in cls.macro_use_re.finditer(line):
+                uses.setdefault(match.group('name'), linenum)
+        return any(name in defs and linenum < defs[name]
+                        for name, linenum in uses.items())
+
     def _parse_filtered_spec(self, skip_tags):
-        """Parse a filtered spec file in rpm-python"""
+        """
+        Parse a filtered spec file in rpm-python, or get the results from
+        the L{cache} if the same spec has already been parsed
+
+        @rtype: L{SpecInfo}
+        """
         skip_tags = [tag.lower() for tag in skip_tags]
+        content = ''.join(str(line) for line in self._content)
+        cache_key = None
+        if not self.uncacheable_re.search(content):
+            environment = '%s\n%s\n%s\n%s' % (
+                                getattr(librpm, '__version__', ''),
+                                ' '.join(skip_tags),
+                                librpm.expandMacro(' '.join(self.cache_macros)),
+                                self._macro_files_stamp())
+            cache_key = self.cache.make_key(content, environment)
+            specinfo = self.cache.get(cache_key)
+            if specinfo:
+                gbp.log.debug("Using cached parse results of %s" %
+                              self.specfile)
+                return specinfo
+
+        lines = [str(line) for line in self._content
+                    if str(line).split(":")[0].strip().lower() not in skip_tags]
+        # Parse two times to circumvent a rpm-python problem where macros are
+        # not expanded if used before their definition
+        passes = 1
+        if not self.parse_once or self._has_forward_macro_refs(lines):
+            passes = 2
         with tempfile.NamedTemporaryFile(prefix='gbp') as filtered:
-            filtered.writelines(str(line) for line in self._content
-                    if str(line).split(":")[0].strip().lower() not in skip_tags)
+            filtered.writelines(lines)
             filtered.flush()
+            start = time.time()
             try:
-                # Parse two times to circumvent a rpm-python problem where
-                # macros are not expanded if used before their definition
-                librpm.spec(filtered.name)
-                return librpm.spec(filtered.name)
+                for _ in range(passes):
+                    spec = librpm.spec(filtered.name)
+                specinfo = self._spec_info(spec)
             except ValueError as err:
                 rpmlog = get_librpm_log()
                 gbp.log.debug("librpm log:\n        %s" %
                                 "\n        ".join(rpmlog))
                 raise GbpError("RPM error while parsing %s: %s (%s)" %
                                 (self.specfile, err, rpmlog[-1]))
+            specinfo.parse_time = time.time() - start
+        gbp.log.debug("Parsed %s in %.3f seconds (%d pass%s)" %
+                      (self.specfile, specinfo.parse_time, passes,
+                       'es' if passes > 1 else ''))
+        if cache_key:
+            self.cache.put(cache_key, specinfo)
+        return specinfo
+
+    @classmethod
+    def _macro_files_stamp(cls):
+        """
+        Stat information of the rpm macro files, changes whenever a macro
+        definition may have changed
+        """
+        stamp = []
+        for pattern in cls.macro_files:
+            pattern = os.path.expanduser(librpm.expandMacro(pattern))
+            for path in sorted(glob.glob(pattern)):
+                try:
+                    info = os.stat(path)
+                except OSError:
+                    continue
+                stamp.append('%s %d %d %s' % (path, info.st_ino, info.st_size,
+                                              info.st_mtime))
+        return '\n'.join(stamp)
 
     @property
     def version(self):
@@ -292,11 +439,7 @@ class SpecFile(object):
             tagnum = -1 if tagnum is None else tagnum
 
         # Record all tag locations
-        try:
-            header = self._specinfo.packages[0].header
-            tagvalue = header[getattr(librpm, 'RPMTAG_%s' % tagname.upper())]
-        except AttributeError:
-            tagvalue = None
+        tagvalue = self._specinfo.header_value(tagname)
         # We don't support "multivalue" tags like "Provides:" or "SourceX:"
         # Rpm python doesn't support many of these, thus the explicit list
         if type(tagvalue) is int or type(tagvalue) is long:
@@ -317,6 +460,7 @@ class SpecFile(object):
             self._tags[tagname]['lines'].append(linerecord)
         else:
             self._tags[tagname] = {'value': tagvalue, 'lines': [linerecord]}
+        self._tag_index[(tagname, tagnum)].append(linerecord)
 
         return tagname
 
@@ -375,6 +519,8 @@ class SpecFile(object):
                           'id': directiveid,
                           'args': matchobj.group('args')}
             self._special_directives[directivename].append(linerecord)
+            self._directive_index[(directivename, directiveid)].append(
+                    linerecord)
         return directivename
 
     def _parse_gbp_tag(self, linenum, lineobj):
@@ -435,25 +581,38 @@ class SpecFile(object):
                 else:
                     gbp.log.err("BUG: failed to parse all 'Patch' tags!")
 
+    def _delete_tags(self, tag, nums):
+        """
+        Delete tags, generator yielding the line preceding the deleted
+        tag(s), for each number in I{nums}. The caller may modify the
+        content between the deletions but must exhaust the generator.
+        """
+        key = tag.lower()
+        deleted = set()
+        for num in nums:
+            tagname = '%s%s' % (tag, num) if num is not None else tag
+            prev = None
+            for line in self._tag_index.pop((key, num), []):
+                gbp.log.debug("Removing '%s:' tag from spec" % tagname)
+                prev = self._content.delete(line['line'])
+            deleted.add(num)
+            yield prev
+
+        if key in self._tags:
+            sparedlines = [line for line in self._tags[key]['lines'] if
+                                line['num'] not in deleted]
+            self._tags[key]['lines'] = sparedlines
+            if not sparedlines:
+                self._tags.pop(key)
+
     def _delete_tag(self, tag, num):
         """Delete a tag"""
-        key = tag.lower()
-        tagname = '%s%s' % (tag, num) if num is not None else tag
-        if key not in self._tags:
+        if tag.lower() not in self._tags:
             gbp.log.warn("Trying to delete non-existent tag '%s:'" % tag)
             return None
-
-        sparedlines = []
         prev = None
-        for line in self._tags[key]['lines']:
-            if line['num'] == num:
-                gbp.log.debug("Removing '%s:' tag from spec" % tagname)
-                prev = self._content.delete(line['line'])
-            else:
-                sparedlines.append(line)
-        self._tags[key]['lines'] = sparedlines
-        if not self._tags[key]['lines']:
-            self._tags.pop(key)
+        for prev in self._delete_tags(tag, [num]):
+            pass
         return prev
 
     def _set_tag(self, tag, num, value, insertafter):
@@ -465,11 +624,7 @@ class SpecFile(object):
             raise GbpError("Cannot set empty value to '%s:' tag" % tag)
 
         # Check type of tag, we don't support values for 'multivalue' tags
-        try:
-            header = self._specinfo.packages[0].header
-            tagvalue = header[getattr(librpm, 'RPMTAG_%s' % tagname.upper())]
-        except AttributeError:
-            tagvalue = None
+        tagvalue = self._specinfo.header_value(tagname)
         tagvalue = None if type(tagvalue) is list else value
 
         # Try to guess the correct indentation from the previous or next tag
@@ -481,12 +636,12 @@ class SpecFile(object):
         text = '%-*s%s\n' % (indent, '%s:' % tagname, value)
         if key in self._tags:
             self._tags[key]['value'] = tagvalue
-            for line in reversed(self._tags[key]['lines']):
-                if line['num'] == num:
-                    gbp.log.debug("Updating '%s:' tag in spec" % tagname)
-                    line['line'].set_data(text)
-                    line['linevalue'] = value
-                    return line['line']
+            if self._tag_index.get((key, num)):
+                line = self._tag_index[(key, num)][-1]
+                gbp.log.debug("Updating '%s:' tag in spec" % tagname)
+                line['line'].set_data(text)
+                line['linevalue'] = value
+                return line['line']
 
         gbp.log.debug("Adding '%s:' tag after '%s...' line in spec" %
                       (tagname, str(insertafter)[0:20]))
@@ -496,6 +651,7 @@ class SpecFile(object):
             self._tags[key]['lines'].append(linerec)
         else:
             self._tags[key] = {'value': tagvalue, 'lines': [linerec]}
+        self._tag_index[(key, num)].append(linerec)
         return line
 
     def set_tag(self, tag, num, value, insertafter=None):
@@ -515,24 +671,38 @@ class SpecFile(object):
         else:
             raise GbpError("Setting '%s:' tag not supported" % tagname)
 
-    def _delete_special_macro(self, name, identifier):
-        """Delete a special macro line in spec file content"""
+    def _delete_special_macros(self, name, identifiers):
+        """
+        Delete special macro lines in spec file content, generator yielding
+        the line preceding the deleted macro(s), for each identifier. The
+        caller may modify the content between the deletions but must exhaust
+        the generator.
+        """
         if name != 'patch':
             raise GbpError("Deleting '%s:' macro not supported" % name)
 
         key = name.lower()
-        fullname = '%%%s%s' % (name, identifier)
-        sparedlines = []
-        prev = None
-        for line in self._special_directives[key]:
-            if line['id'] == identifier:
+        deleted = set()
+        for identifier in identifiers:
+            fullname = '%%%s%s' % (name, identifier)
+            prev = None
+            for line in self._directive_index.pop((key, identifier), []):
                 gbp.log.debug("Removing '%s' macro from spec" % fullname)
                 prev = self._content.delete(line['line'])
-            else:
-                sparedlines.append(line)
-        self._special_directives[key] = sparedlines
-        if not prev:
-            gbp.log.warn("Tried to delete non-existent macro '%s'" % fullname)
+            if not prev:
+                gbp.log.warn("Tried to delete non-existent macro '%s'" %
+                             fullname)
+            deleted.add(identifier)
+            yield prev
+
+        self._special_directives[key] = [line for line in
+                self._special_directives[key] if line['id'] not in deleted]
+
+    def _delete_special_macro(self, name, identifier):
+        """Delete a special macro line in spec file content"""
+        prev = None
+        for prev in self._delete_special_macros(name, [identifier]):
+            pass
         return prev
 
     def _set_special_macro(self, name, identifier, args, insertafter):
@@ -544,19 +714,19 @@ class SpecFile(object):
 
         updated = 0
         text = "%%%s%d %s\n" % (name, identifier, args)
-        for line in self._special_directives[key]:
-            if line['id'] == identifier:
-                gbp.log.debug("Updating '%s' macro in spec" % fullname)
-                line['args'] = args
-                line['line'].set_data(text)
-                ret = line['line']
-                updated += 1
+        for line in self._directive_index.get((key, identifier), []):
+            gbp.log.debug("Updating '%s' macro in spec" % fullname)
+            line['args'] = args
+            line['line'].set_data(text)
+            ret = line['line']
+            updated += 1
         if not updated:
             gbp.log.debug("Adding '%s' macro after '%s...' line in spec" %
                           (fullname, str(insertafter)[0:20]))
             ret = self._content.insert_after(insertafter, text)
             linerec = {'line': ret, 'id': identifier, 'args': args}
             self._special_directives[key].append(linerec)
+            self._directive_index[(key, identifier)].append(linerec)
         return ret
 
     def _set_section(self, name, text):
@@ -603,36 +773,62 @@ class SpecFile(object):
         return text
 
     def update_patches(self, patches, commands):
-        """Update spec with new patch tags and patch macros"""
+        """
+        Update spec with new patch tags and patch macros
+
+        @param patches: filenames of the patches
+        @type patches: C{list} of C{str}
+        @param commands: extra commands (like C{if} or C{ifarch}) for the
+            C{%patch} macros, indexed by patch filename
+        @type commands: C{dict}
+        @return: C{True} if the content of the spec file changed, C{False}
+            if the spec already had the same patches
+        @rtype: C{bool}
+        """
+        orig_content = [str(line) for line in self._content]
+        self._update_patches(patches, commands)
+        if len(self._content) != len(orig_content):
+            return True
+        for line, orig_line in zip(self._content, orig_content):
+            if str(line) != orig_line:
+                return True
+        gbp.log.debug("Patches of %s not changed" % self.specfile)
+        return False
+
+    def _update_patches(self, patches, commands):
+        """Re-create the patch tags and patch macros"""
         # Remove non-ignored patches
         tag_prev = None
         macro_prev = None
         ignored = self.ignorepatches
         # Remove 'Patch:̈́' tags
-        for tag in self._patches().values():
-            if not tag['num'] in ignored:
-                tag_prev = self._delete_tag('patch', tag['num'])
-                # Remove a preceding comment if it seems to originate from GBP
-                if re.match("^\s*#.*patch.*auto-generated",
-                            str(tag_prev), flags=re.I):
-                    tag_prev = self._content.delete(tag_prev)
+        nums = [num for num in self._patches() if num not in ignored]
+        for tag_prev in self._delete_tags('patch', nums):
+            # Remove a preceding comment if it seems to originate from GBP
+            if re.match("^\s*#.*patch.*auto-generated",
+                        str(tag_prev), flags=re.I):
+                tag_prev = self._content.delete(tag_prev)
 
         # Remove '%patch:' macros
+        ids = []
+        seen = set(ignored)
         for macro in self._special_directives['patch']:
-            if not macro['id'] in ignored:
-                macro_prev = self._delete_special_macro('patch', macro['id'])
-                # Remove surrounding if-else
-                macro_next = macro_prev.next
-                if (str(macro_prev).startswith('%if') and
-                        str(macro_next).startswith('%endif')):
-                    self._content.delete(macro_next)
-                    macro_prev = self._content.delete(macro_prev)
-
-                # Remove a preceding comment line if it ends with '.patch' or
-                # '.diff' plus an optional compression suffix
-                if re.match("^\s*#.+(patch|diff)(\.(gz|bz2|xz|lzma))?\s*$",
-                            str(macro_prev), flags=re.I):
-                    macro_prev = self._content.delete(macro_prev)
+            if macro['id'] not in seen:
+                seen.add(macro['id'])
+                ids.append(macro['id'])
+        for macro_prev in self._delete_special_macros('patch', ids):
+            # Remove surrounding if-else
+            macro_next = macro_prev.next
+            if (str(macro_prev).startswith('%if') and
+                    str(macro_next).startswith('%endif')):
+                self._content.delete(macro_next)
+                macro_prev = self._content.delete(macro_prev)
+
+            # Remove a preceding comment line if it ends with '.patch' or
+            # '.diff' plus an optional compression suffix
+            if re.match("^\s*#.+(patch|diff)(\.(gz|bz2|xz|lzma))?\s*$",
+                        str(macro_prev), flags=re.I):
+                macro_prev = self._content.delete(macro_prev)
 
         if len(patches) == 0:
             return
@@ -90,9 +90,22 @@ class _ChangelogSection(object):
     def __init__(self, pkgpolicy, *args, **kwargs):
         self._pkgpolicy = pkgpolicy
         self.header = _ChangelogHeader(pkgpolicy, *args, **kwargs)
-        self.entries = []
+        self._entries = []
+        self._parse_entries = None
         self._trailer = '\n'
 
+    @property
+    def entries(self):
+        """The entries of the section, parsed on first access"""
+        if self._parse_entries:
+            self._entries = self._parse_entries()
+            self._parse_entries = None
+        return self._entries
+
+    @entries.setter
+    def entries(self, entries):
+        self._entries = entries
+        self._parse_entries = None
 
     def __str__(self):
         text = str(self.header)
@@ -112,18 +125,87 @@ class _ChangelogSection(object):
         return entry
 
 
+class _ChangelogSections(object):
+    """
+    The sections of an RPM changelog
+
+    Sections of the raw changelog text are only recorded by their offsets
+    and are sliced out of the text when accessed. Sections that are
+    replaced or added are kept as given and the untouched parts of the
+    text are copied verbatim when the changelog is written out.
+    """
+
+    def __init__(self, text='', offsets=()):
+        """
+        @param text: the raw changelog
+        @type text: C{str}
+        @param offsets: start offsets of the sections in I{text}
+        @type offsets: C{list} of C{int}
+        """
+        self._text = text
+        ends = list(offsets[1:]) + [len(text)]
+        # Raw sections are (start, end) tuples
+        self._items = zip(offsets, ends)
+
+    def _get(self, item):
+        if isinstance(item, tuple):
+            return self._text[item[0]:item[1]]
+        return item
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        for item in self._items:
+            yield self._get(item)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._get(item) for item in self._items[index]]
+        return self._get(self._items[index])
+
+    def __setitem__(self, index, section):
+        self._items[index] = section
+
+    def __delitem__(self, index):
+        del self._items[index]
+
+    def insert(self, index, section):
+        """Insert a section before I{index}"""
+        self._items.insert(index, section)
+
+    def append(self, section):
+        """Add a section to the end"""
+        self._items.append(section)
+
+    def __str__(self):
+        parts = []
+        start = end = None
+        for item in self._items:
+            if isinstance(item, tuple) and item[0] == end:
+                end = item[1]
+                continue
+            if end is not None:
+                parts.append(self._text[start:end])
+                start = end = None
+            if isinstance(item, tuple):
+                start, end = item
+            else:
+                parts.append(str(item))
+        if end is not None:
+            parts.append(self._text[start:end])
+        return ''.join(parts)
+
+
 class Changelog(object):
     """An RPM changelog"""
 
     def __init__(self, pkgpolicy):
         self._pkgpolicy = pkgpolicy
-        self.sections = []
+        self.sections = _ChangelogSections()
 
     def __str__(self):
-        string = ""
-        for section in self.sections:
-            string += str(section)
-        return string
+        return str(self.sections)
 
     def create_entry(self, *args, **kwargs):
         """Create and return new entry object"""
@@ -141,27 +223,33 @@ class ChangelogParser(object):
 
     def __init__(self, pkgpolicy):
         self._pkgpolicy = pkgpolicy
-        self.section_match_re = pkgpolicy.Changelog.section_match_re
-        self.section_split_re = pkgpolicy.Changelog.section_split_re
-        self.header_split_re = pkgpolicy.Changelog.header_split_re
-        self.header_name_split_re = pkgpolicy.Changelog.header_name_split_re
-        self.body_name_re = pkgpolicy.Changelog.body_name_re
+        policy = pkgpolicy.Changelog
+        self.section_match_re = re.compile('^(?:%s)' % policy.section_match_re,
+                                           re.M)
+        self.section_split_re = re.compile(policy.section_split_re,
+                                           re.M | re.S)
+        self.header_split_re = re.compile(policy.header_split_re, re.M)
+        self.header_name_split_re = re.compile(policy.header_name_split_re)
+        self.body_name_re = re.compile(policy.body_name_re)
 
     def raw_parse_string(self, string):
-        """Parse changelog - only splits out raw changelog sections."""
+        """
+        Parse changelog - only splits out raw changelog sections.
+
+        The sections are only located, they are parsed with
+        L{parse_section} when needed.
+        """
+        # Line endings are normalized like splitting lines would do it
+        if '\r' in string:
+            string = ''.join([line + '\n' for line in string.splitlines()])
+        elif string and not string.endswith('\n'):
+            string += '\n'
+        offsets = [match.start() for match in
+                   self.section_match_re.finditer(string)]
+        if string and (not offsets or offsets[0] != 0):
+            raise ChangelogError("First line in changelog is invalid")
         changelog = Changelog(self._pkgpolicy)
-        ch_section = ""
-        for line in string.splitlines():
-            if re.match(self.section_match_re, line, re.M | re.S):
-                if ch_section:
-                    changelog.sections.append(ch_section)
-                ch_section = line + '\n'
-            elif ch_section:
-                ch_section += line + '\n'
-            else:
-                raise ChangelogError("First line in changelog is invalid")
-        if ch_section:
-            changelog.sections.append(ch_section)
+        changelog.sections = _ChangelogSections(string, offsets)
         return changelog
 
     def raw_parse_file(self, changelog):
@@ -175,7 +263,7 @@ class ChangelogParser(object):
     def _parse_section_header(self, text):
         """Parse one changelog section header"""
         # Try to split out time stamp and "changelog name"
-        match = re.match(self.header_split_re, text, re.M)
+        match = self.header_split_re.match(text)
         if not match:
             raise ChangelogError("Unable to parse changelog header: %s" % text)
         try:
@@ -187,7 +275,7 @@ class ChangelogParser(object):
         # Parse "name" part which consists of name and/or email and an optional
         # revision
         name_text = match.group('ch_name')
-        match = re.match(self.header_name_split_re, name_text)
+        match = self.header_name_split_re.match(name_text)
         if not match:
             raise ChangelogError("Unable to parse changelog header: invalid "
                                  "name / revision '%s'" % name_text)
@@ -204,7 +292,7 @@ class ChangelogParser(object):
         entry_text = []
         author = default_author
         for line in text.splitlines():
-            match = re.match(self.body_name_re, line)
+            match = self.body_name_re.match(line)
             if match:
                 if entry_text:
                     entries.append(self._create_entry(author, entry_text))
@@ -229,18 +317,17 @@ class ChangelogParser(object):
     def parse_section(self, text):
         """Parse one section"""
         # Check that the first line(s) look like a changelog header
-        match = re.match(self.section_split_re, text, re.M | re.S)
+        match = self.section_split_re.match(text)
         if not match:
             raise ChangelogError("Doesn't look like changelog header: %s..." %
                                  text.splitlines()[0])
         # Parse header
         section = self._parse_section_header(match.group('ch_header'))
         header = section.header
-        # Parse entries
+        # Entries are parsed when they are accessed
         default_author = header['name'] if 'name' in header else header['email']
-        for entry in self._parse_section_entries(match.group('ch_body'),
-                                                 default_author):
-            section.append_entry(entry)
-
+        body = match.group('ch_body')
+        section._parse_entries = lambda: self._parse_section_entries(
+                                                body, default_author)
         return section
 
@@ -21,7 +21,169 @@ from gbp.format import format_str
 from gbp.errors import GbpError
 from gbp.git import GitRepository, GitRepositoryError
 from gbp.pkg.pristinetar import PristineTar
-from gbp.rpm import compose_version_str
+from gbp.rpm import compose_version_str, split_version_str
+from gbp.rpm.version import RpmVersion
+
+
+class RpmTagIndex(object):
+    """
+    The versions of the tags matching a tag format
+
+    Tags are parsed back through the tag format and indexed by their
+    version, so finding the tag of a version doesn't need to probe tag
+    names. Format fields that are not part of the version, e.g. time
+    stamps, match any value.
+
+    Versions are indexed as they appear in the tags and looked up
+    sanitized like tag names, so only the tag with exactly the wanted
+    version matches; a missing epoch equals epoch 0. Tag names can't tell
+    a '~' from a '_' so versions order like rpm orders the version strings
+    of the tags, i.e. with '_' as a separator.
+
+    >>> index = RpmTagIndex({'packaging/1.0-1': 'a', 'packaging/1%1.0_rc1-2': 'b',
+    ...                      'packaging/0.9-1': 'c', 'packaging/1.0_1-1': 'e',
+    ...                      'upstream/1.0': 'd'},
+    ...                     'packaging/%(version)s')
+    >>> index.find({'upstreamversion': '1.0', 'release': '1'})
+    'a'
+    >>> index.find({'version': '0:1.0-1'})
+    'a'
+    >>> index.find_tag({'version': '0:1.0-1'})
+    'packaging/1.0-1'
+    >>> index.find({'epoch': '1', 'upstreamversion': '1.0~rc1', 'release': '2'})
+    'b'
+    >>> index.find({'upstreamversion': '1.0_1', 'release': '1'})
+    'e'
+    >>> index.find({'upstreamversion': '1.0.1', 'release': '1'})
+    >>> index.find({'upstreamversion': '1.0', 'release': '01'})
+    >>> [ str(version) for version in index.versions() ]
+    ['0.9-1', '1.0-1', '1.0_1-1', '1:1.0_rc1-2']
+    """
+    version_fields = ['version', 'epoch', 'upstreamversion', 'release']
+    # Values the fields can have in tags
+    _field_res = {'version': r'[^/]+',
+                  'epoch': r'[0-9]+',
+                  'upstreamversion': r'[^/-]+',
+                  'release': r'[^/-]+'}
+
+    def __init__(self, tags, format):
+        """
+        @param tags: the commits of the tags, indexed by tag name
+        @type tags: C{dict} of C{str}
+        @param format: the tag format
+        @type format: C{str}
+        """
+        self.format = format
+        self._fields = set()
+        self._tag_re = self._format_re(format)
+        # Tags and versions, indexed by the version strings of the tags
+        self._tags = {}
+        self._versions = {}
+        for tag in sorted(tags):
+            match = self._tag_re.match(tag)
+            if match:
+                fields = match.groupdict()
+                evr = self._evr(fields)
+                key = self._key(evr)
+                self._tags.setdefault(key, []).append((tag, fields,
+                                                       tags[tag]))
+                self._versions[key] = RpmVersion.from_fields(evr)
+
+    def _format_re(self, format):
+        """Regular expression matching the tags of a tag format"""
+        regex = ''
+        for part in re.split(r'(%\(\w+\)s|%%)', format):
+            match = re.match(r'%\((\w+)\)s$', part)
+            if match:
+                field = match.group(1)
+                if field in self._fields:
+                    regex += '(?P=%s)' % field
+                else:
+                    self._fields.add(field)
+                    regex += '(?P<%s>%s)' % (field,
+                                             self._field_res.get(field, '.+?'))
+            elif part == '%%':
+                regex += re.escape('%')
+            else:
+                regex += re.escape(RpmGitRepository._sanitize_tag(part))
+        return re.compile('^%s$' % regex)
+
+    def _evr(self, fields):
+        """
+        The epoch, version and release of a tag from the fields of the tag
+        format that are part of the version, as they appear in the tag
+        """
+        evr = {}
+        if 'version' in self._fields and fields.get('version'):
+            # The epoch separator is the only character that can be mapped
+            # back unambiguously
+            evr = split_version_str(fields['version'].replace('%', ':'))
+        for field in ['epoch', 'upstreamversion', 'release']:
+            if field in self._fields and fields.get(field):
+                evr[field] = fields[field]
+        return evr
+
+    @staticmethod
+    def _key(evr):
+        """Index key of a version, a missing epoch equals epoch 0"""
+        return (evr.get('epoch') or '0', evr.get('upstreamversion') or '',
+                evr.get('release') or '')
+
+    def _find(self, str_fields):
+        """The name and commit of the newest tag of a version"""
+        fields = dict(str_fields)
+        if not fields.get('version'):
+            fields['version'] = compose_version_str(fields)
+        # Versions are looked up like they are stored in tag names
+        for field in self.version_fields:
+            if fields.get(field):
+                fields[field] = RpmGitRepository._sanitize_tag(fields[field])
+        found = (None, None)
+        for tag, tag_fields, commit in self._tags.get(self._key(self._evr(fields)),
+                                                      []):
+            for field, value in tag_fields.items():
+                if (field not in self.version_fields and field in fields and
+                        RpmGitRepository._sanitize_tag(str(fields[field])) !=
+                        value):
+                    break
+            else:
+                found = (tag, commit)
+        return found
+
+    def find(self, str_fields):
+        """
+        Find the commit of a version
+
+        @param str_fields: the version and other fields of the tag format,
+            like for L{RpmGitRepository.find_version}
+        @type str_fields: C{dict} of C{str}
+        @return: sha1 of the commit the (newest) tag of the version points
+            to or C{None} if the version is not tagged
+        @rtype: C{str}
+        """
+        return self._find(str_fields)[1]
+
+    def find_tag(self, str_fields):
+        """
+        Find the tag of a version
+
+        @param str_fields: see L{find}
+        @type str_fields: C{dict} of C{str}
+        @return: the name of the (newest) tag of the version or C{None} if
+            the version is not tagged
+        @rtype: C{str}
+        """
+        return self._find(str_fields)[0]
+
+    def versions(self):
+        """
+        The tagged versions, as they appear in the tags
+
+        @return: the versions, lowest first
+        @rtype: C{list} of L{RpmVersion}
+        """
+        return sorted(self._versions.values())
+
 
 class RpmGitRepository(GitRepository):
     """A git repository that holds the source of an RPM package"""
@@ -48,9 +210,29 @@ class RpmGitRepository(GitRepository):
             return None
         if self.has_tag(tag): # new tags are injective
             # dereference to a commit object
-            return self.rev_parse("%s^0" % tag)
+            return self._ref_commit('refs/tags/%s' % tag)
         return None
 
+    def version_index(self, format):
+        """
+        Index the versions of all tags matching a tag format
+
+        @param format: tag pattern
+        @type format: C{str}
+        @return: the index, taken from the current tags of the repository
+        @rtype: L{RpmTagIndex}
+        """
+        tags = {}
+        for ref, (sha1, obj_type, peeled, peeled_type) in \
+                self._ref_snapshot.items():
+            if not ref.startswith('refs/tags/'):
+                continue
+            if obj_type == 'commit':
+                tags[ref[len('refs/tags/'):]] = sha1
+            elif peeled_type == 'commit':
+                tags[ref[len('refs/tags/'):]] = peeled
+        return RpmTagIndex(tags, format)
+
     @staticmethod
     def version_to_tag(format, str_fields):
         """
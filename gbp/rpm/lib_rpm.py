@@ -21,24 +21,63 @@ import tempfile
 import gbp.log
 from gbp.rpm.policy import RpmPkgPolicy
 
-try:
-    # Try to load special RPM lib to be used for GBP (only)
-    librpm = __import__(RpmPkgPolicy.python_rpmlib_module_name)
-except ImportError:
-    gbp.log.warn("Failed to import '%s' as rpm python module, using host's "
-                    "default rpm library instead" %
-                    RpmPkgPolicy.python_rpmlib_module_name)
-    import rpm as librpm
-
-# Module initialization
-_rpmlog = tempfile.NamedTemporaryFile(prefix='gbp_rpmlog')
-_rpmlogfd = _rpmlog.file
-librpm.setVerbosity(librpm.RPMLOG_INFO)
-librpm.setLogFile(_rpmlogfd)
+_librpm = None
+_rpmlogfd = None
+
+
+def load_librpm():
+    """
+    Import the rpm python module and set it up for gbp, unless already done
+
+    @return: the rpm python module
+    """
+    global _librpm
+    if _librpm is None:
+        try:
+            # Try to load special RPM lib to be used for GBP (only)
+            module = __import__(RpmPkgPolicy.python_rpmlib_module_name)
+        except ImportError:
+            gbp.log.warn("Failed to import '%s' as rpm python module, using "
+                         "host's default rpm library instead" %
+                         RpmPkgPolicy.python_rpmlib_module_name)
+            import rpm as module
+        module.setVerbosity(module.RPMLOG_INFO)
+        _librpm = module
+        open_librpm_log()
+    return _librpm
+
+
+class _LazyLibrpm(object):
+    """
+    Stands in for the rpm python module which is only imported when first
+    used, loading the bindings takes a noticeable part of gbp's startup
+    time and many command invocations don't need them
+    """
+    def __getattr__(self, name):
+        return getattr(load_librpm(), name)
+
+librpm = _LazyLibrpm()
+
+
+def open_librpm_log():
+    """
+    Direct rpmlib log output to a new temporary file, e.g. in a forked
+    process that must not share the file with its parent
+    """
+    global _rpmlogfd
+    if _librpm is None:
+        # Opened when the bindings get loaded
+        return
+    # The file is unlinked right away so there's nothing to clean up
+    # even if the process doesn't exit normally
+    _rpmlogfd = tempfile.TemporaryFile(prefix='gbp_rpmlog')
+    _librpm.setLogFile(_rpmlogfd)
 
 
 def get_librpm_log(truncate=True):
     """Get rpmlib log output"""
+    if _rpmlogfd is None:
+        return []
     _rpmlogfd.seek(0)
     log = [line.strip() for line in _rpmlogfd.readlines()]
     if truncate:
@@ -23,6 +23,7 @@ import gbp.log
 
 class LinkedListNode(object):
     """Node of the linked list"""
+    __slots__ = ('prev', 'next', '_data')
 
     def __init__(self, data="", prev_node=None, next_node=None):
         self.prev = prev_node
@@ -90,14 +91,27 @@ class LinkedList(collections.Iterable):
     def __init__(self):
         self._first = None
         self._last = None
+        self._len = 0
 
     def __iter__(self):
         return LinkedListIterator(self)
 
     def __len__(self):
-        for num, data in enumerate(self):
-            pass
-        return num + 1
+        """
+        Get the number of nodes in the list
+
+        >>> list = LinkedList()
+        >>> len(list)
+        0
+        >>> node = list.append('foo')
+        >>> node = list.append('bar')
+        >>> len(list)
+        2
+        >>> prev = list.delete(node)
+        >>> len(list)
+        1
+        """
+        return self._len
 
     @property
     def first(self):
@@ -120,6 +134,7 @@ class LinkedList(collections.Iterable):
         """
         if self._first is None:
             new = self._first = self._last = LinkedListNode(data)
+            self._len += 1
         else:
             new = self.insert_before(self._first, data)
         return new
@@ -158,6 +173,7 @@ class LinkedList(collections.Iterable):
         else:
             self._first = new
         node.prev = new
+        self._len += 1
         return new
 
     def insert_after(self, node, data=""):
@@ -177,6 +193,7 @@ class LinkedList(collections.Iterable):
         else:
             self._last = new
         node.next = new
+        self._len += 1
         return new
 
     def delete(self, node):
@@ -209,6 +226,7 @@ class LinkedList(collections.Iterable):
         if node is self._last:
             self._last = self._last.prev
         node.delete()
+        self._len -= 1
         return ret
 
 # vim:et:ts=4:sw=4:et:sts=4:ai:set list listchars=tab\:»·,trail\:·:
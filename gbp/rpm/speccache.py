@@ -0,0 +1,181 @@
+# vim: set fileencoding=utf-8 :
+#
+# (C) 2026 agent <agent@local>
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""Content-addressed cache of rpm spec file parse results"""
+
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+from six.moves import cPickle as pickle
+
+import gbp.log
+
+
+class SpecInfo(object):
+    """
+    The information gbp needs from librpm about a spec file, as plain
+    (picklable) data
+
+    >>> info = SpecInfo({'name': 'foo', 'patch': ['a.patch']},
+    ...                 [('foo.tar.gz', 0, 1)])
+    >>> info.header_value('Name')
+    'foo'
+    >>> info.header_value('patch')
+    ['a.patch']
+    >>> info.header_value('patch1')
+    >>> info.sources
+    [('foo.tar.gz', 0, 1)]
+    >>> info.parse_time
+    0.0
+    """
+    def __init__(self, header, sources):
+        """
+        @param header: values of the source package header, indexed by
+            lowercase tag name
+        @type header: C{dict}
+        @param sources: the sources/patches of the spec as (name, number,
+            type) tuples
+        @type sources: C{list} of C{tuple}
+        """
+        self.header = header
+        self.sources = sources
+        # Time (in seconds) librpm took to parse the spec
+        self.parse_time = 0.0
+
+    def header_value(self, tagname):
+        """
+        Get the value of a tag, C{None} if the tag is not known
+
+        @param tagname: name of the tag
+        @type tagname: C{str}
+        """
+        return self.header.get(tagname.lower())
+
+
+class SpecInfoCache(object):
+    """
+    Cache of L{SpecInfo} objects, indexed by the content of the spec file and
+    the rpm macro environment it was parsed in. The most recently used
+    entries are kept in memory and, if a cache directory is set, all entries
+    are also stored on disk.
+
+    >>> cache = SpecInfoCache(max_entries=2)
+    >>> key = cache.make_key('Name: foo\\n', 'rpm-4.11')
+    >>> key == cache.make_key('Name: foo\\n', 'rpm-4.11')
+    True
+    >>> key == cache.make_key('Name: foo\\n', 'rpm-4.12')
+    False
+    >>> cache.get(key)
+    >>> cache.put(key, SpecInfo({'name': 'foo'}, []))
+    >>> cache.get(key).header_value('name')
+    'foo'
+    >>> cache.put('a', SpecInfo({}, []))
+    >>> cache.put('b', SpecInfo({}, []))
+    >>> sorted(cache.keys())
+    ['a', 'b']
+    >>> cache.get(key)
+    """
+    # Bump when the format of the cached data changes
+    version = 2
+
+    def __init__(self, cache_dir=None, max_entries=128):
+        """
+        @param cache_dir: directory for storing entries on disk
+        @type cache_dir: C{str}
+        @param max_entries: number of entries to keep in memory
+        @type max_entries: C{int}
+        """
+        self._entries = OrderedDict()
+        self._max_entries = max_entries
+        self._cache_dir = None
+        self.set_cache_dir(cache_dir)
+
+    def set_cache_dir(self, cache_dir):
+        """
+        Set the directory for storing cache entries on disk, C{None} disables
+        the disk cache
+        """
+        self._cache_dir = os.path.join(cache_dir, 'spec') if cache_dir else None
+
+    @staticmethod
+    def make_key(content, environment):
+        """
+        Create a cache key for spec file I{content} parsed in the macro
+        I{environment}. The content is hashed like a git blob so the first
+        part of the key is the blob SHA1 of the spec file.
+        """
+        blob_sha = hashlib.sha1('blob %d\0%s' % (len(content),
+                                                  content)).hexdigest()
+        env_sha = hashlib.sha1(environment).hexdigest()
+        return '%s-%s' % (blob_sha, env_sha)
+
+    def _path(self, key):
+        """Path of the on-disk cache entry"""
+        return os.path.join(self._cache_dir, 'v%d-%s' % (self.version, key))
+
+    def get(self, key):
+        """Get a cached entry, C{None} if not found"""
+        if key in self._entries:
+            info = self._entries.pop(key)
+            self._entries[key] = info
+            return info
+        if self._cache_dir:
+            try:
+                with open(self._path(key), 'rb') as cache_file:
+                    info = pickle.load(cache_file)
+            except (IOError, OSError):
+                return None
+            except Exception as err:
+                gbp.log.debug("Ignoring broken spec cache entry %s: %s" %
+                              (key, err))
+                return None
+            self._remember(key, info)
+            return info
+        return None
+
+    def _remember(self, key, info):
+        """Keep an entry in memory, dropping the least recently used one"""
+        self._entries.pop(key, None)
+        self._entries[key] = info
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def keys(self):
+        """Keys of the entries held in memory"""
+        return list(self._entries.keys())
+
+    def put(self, key, info):
+        """Add an entry to the cache"""
+        self._remember(key, info)
+        if self._cache_dir:
+            try:
+                if not os.path.isdir(self._cache_dir):
+                    os.makedirs(self._cache_dir)
+                tmp = tempfile.NamedTemporaryFile(dir=self._cache_dir,
+                                                  delete=False)
+                with tmp:
+                    pickle.dump(info, tmp, pickle.HIGHEST_PROTOCOL)
+                os.rename(tmp.name, self._path(key))
+            except (IOError, OSError) as err:
+                gbp.log.debug("Failed to write spec cache entry %s: %s" %
+                              (key, err))
+
+    def clear(self):
+        """Drop all in-memory entries"""
+        self._entries.clear()
+
+# vim:et:ts=4:sw=4:et:sts=4:ai:set list listchars=tab\:»·,trail\:·:
@@ -0,0 +1,195 @@
+# vim: set fileencoding=utf-8 :
+#
+# (C) 2026 agent <agent@local>
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""Compare RPM versions like rpm does"""
+
+import re
+
+
+class RpmVersion(object):
+    """
+    An RPM version, i.e. epoch, version and release
+
+    Versions compare like I{rpmvercmp()} and I{rpm.labelCompare()} do it:
+    a missing epoch is 0 and a missing release sorts before any release.
+    The version is turned into a sort key once so comparing versions and
+    sorting lists of them doesn't need to parse them again.
+
+    >>> v = RpmVersion.parse('1:2.0~rc1-3.1')
+    >>> (v.epoch, v.upstreamversion, v.release)
+    ('1', '2.0~rc1', '3.1')
+    >>> RpmVersion.parse('2.0~rc1') < RpmVersion.parse('2.0')
+    True
+    >>> RpmVersion.parse('2.0') < RpmVersion.parse('2.0-1')
+    True
+    >>> RpmVersion.parse('0:1.0_1-1') == RpmVersion.parse('1.0.1-1')
+    True
+    """
+    _segment_re = re.compile(r'([0-9]+)|([a-zA-Z]+)|(~)|(\^)')
+    # Order of the segment types
+    _tilde, _end, _caret, _alpha, _num = range(5)
+
+    def __init__(self, upstreamversion, epoch=None, release=None):
+        """
+        @param upstreamversion: the version
+        @type upstreamversion: C{str}
+        @param epoch: the epoch, C{None} for no epoch
+        @type epoch: C{str}
+        @param release: the release, C{None} for no release
+        @type release: C{str}
+        """
+        self.upstreamversion = upstreamversion or None
+        self.epoch = epoch or None
+        self.release = release or None
+        self.key = (self.part_key(self.epoch or '0'),
+                    self.part_key(self.upstreamversion),
+                    self.part_key(self.release))
+
+    @classmethod
+    def parse(cls, version):
+        """
+        Create a version from a full version string
+
+        @param version: version in the form I{[epoch:]version[-release]}
+        @type version: C{str}
+        @rtype: L{RpmVersion}
+        """
+        epoch = None
+        if ':' in version:
+            epoch, version = version.split(':', 1)
+        upstreamversion, _sep, release = version.partition('-')
+        return cls(upstreamversion, epoch, release)
+
+    @classmethod
+    def from_fields(cls, fields):
+        """
+        Create a version from version components as returned by
+        L{gbp.rpm.split_version_str}
+
+        @param fields: the version components
+        @type fields: C{dict}
+        @rtype: L{RpmVersion}
+        """
+        return cls(fields.get('upstreamversion'), fields.get('epoch'),
+                   fields.get('release'))
+
+    @classmethod
+    def part_key(cls, part):
+        """
+        Sort key of the version or release
+
+        The key is a tuple of alphabetic and numeric segments, the tilde and
+        caret separators, and the end of the string. Other characters only
+        separate segments. A missing part sorts before all others.
+
+        >>> RpmVersion.part_key('1.0a~rc1')
+        ((4, 1), (4, 0), (3, 'a'), (0,), (3, 'rc'), (4, 1), (1,))
+        >>> RpmVersion.part_key(None)
+        ()
+        """
+        if part is None:
+            return ()
+        key = []
+        for num, alpha, tilde, caret in cls._segment_re.findall(part):
+            if num:
+                key.append((cls._num, int(num)))
+            elif alpha:
+                key.append((cls._alpha, alpha))
+            elif tilde:
+                key.append((cls._tilde,))
+            else:
+                key.append((cls._caret,))
+        key.append((cls._end,))
+        return tuple(key)
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+    def __ne__(self, other):
+        return self.key != other.key
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+    def __le__(self, other):
+        return self.key <= other.key
+
+    def __gt__(self, other):
+        return self.key > other.key
+
+    def __ge__(self, other):
+        return self.key >= other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __str__(self):
+        version = self.upstreamversion or ''
+        if self.epoch:
+            version = "%s:%s" % (self.epoch, version)
+        if self.release:
+            version += "-%s" % self.release
+        return version
+
+    def __repr__(self):
+        return "<gbp.rpm.version.RpmVersion '%s'>" % self
+
+
+def compare_versions(version1, version2):
+    """
+    Compare two full RPM versions
+
+    >>> compare_versions('1.0', '1.0~rc1')
+    1
+    >>> compare_versions('1:1.0', '2.0')
+    1
+    >>> compare_versions('1.0-1', '1.0-1.1')
+    -1
+    >>> compare_versions('1.0^git1', '1.0.1')
+    -1
+
+    @return: -1 if I{version1} is lower than I{version2}, 0 if they are
+        equal and 1 otherwise
+    @rtype: C{int}
+    """
+    key1 = RpmVersion.parse(version1).key
+    key2 = RpmVersion.parse(version2).key
+    return (key1 > key2) - (key1 < key2)
+
+
+def sort_versions(items, key=None, reverse=False):
+    """
+    Sort a list by RPM version, each version is parsed only once
+
+    >>> sort_versions(['1.0', '1.0~rc1', '0.9-1', '1:0.1', '1.0a'])
+    ['0.9-1', '1.0~rc1', '1.0', '1.0a', '1:0.1']
+
+    @param items: the items to sort
+    @type items: C{list}
+    @param key: function returning the full version of an item, the item
+        is the version if not given
+    @type key: C{callable}
+    @param reverse: sort from highest to lowest version
+    @type reverse: C{bool}
+    @return: the sorted items
+    @rtype: C{list}
+    """
+    if key is None:
+        key = lambda item: item
+    return sorted(items, key=lambda item: RpmVersion.parse(key(item)).key,
+                  reverse=reverse)
+
+# vim:et:ts=4:sw=4:et:sts=4:ai:set list listchars=tab\:»·,trail\:·:
@@ -21,7 +21,6 @@
 import ConfigParser
 import os
 import re
-import shutil
 import sys
 from datetime import datetime
 
@@ -32,14 +31,16 @@ from gbp.command_wrappers import Command, RunAtCommand, CommandExecFailed
 from gbp.config import GbpOptionParserRpm, GbpOptionGroup
 from gbp.errors import GbpError
 from gbp.format import format_str
-from gbp.pkg import compressor_opts
+from gbp.pkg import compressor_opts, compressor_cmd, compressor_threads
+from gbp.pkg.tarballcache import TarballCache, unshare_file
 from gbp.rpm.git import GitRepositoryError, RpmGitRepository
 from gbp.rpm.policy import RpmPkgPolicy
-from gbp.tmpfile import init_tmpdir, del_tmpdir, tempfile
+from gbp.tmpfile import init_tmpdir, del_tmpdir
 from gbp.scripts.common.buildpackage import (index_name, wc_names,
                                              git_archive_submodules,
-                                             git_archive_single, dump_tree,
-                                             write_wc, drop_index)
+                                             git_archive_single,
+                                             dump_tree_files, write_wc,
+                                             drop_index)
 from gbp.scripts.pq_rpm import parse_spec, update_patch_series
 from gbp.scripts.common.pq import is_pq_branch, pq_branch_name, pq_branch_base
 
@@ -58,32 +59,70 @@ def makedir(path):
     return path
 
 
+def orig_tarball_cache(options):
+    """Get the tarball cache, C{None} if caching is not enabled"""
+    if not options.orig_cache_dir:
+        return None
+    try:
+        max_size = rpm.string_to_int(options.orig_cache_size)
+    except ValueError:
+        raise GbpError("Invalid orig-cache-size '%s'" %
+                       options.orig_cache_size)
+    return TarballCache(options.orig_cache_dir, max_size)
+
+
+def orig_comp_threads(options):
+    """Get the number of threads to use for compressing tarballs"""
+    if options.deterministic_tarballs:
+        return 1
+    return compressor_threads(options.comp_threads)
+
+
 def git_archive(repo, spec, output_dir, treeish, prefix, comp_level,
-                with_submodules):
+                with_submodules, cache=None, comp_threads=1):
     "Create a compressed orig tarball in output_dir using git_archive"
     comp_opts = ''
+    comp_cmd = ''
     if spec.orig_src['compression']:
         comp_opts = compressor_opts[spec.orig_src['compression']][0]
+        # Different compressor implementations give different output
+        cmd, thread_opts = compressor_cmd(spec.orig_src['compression'],
+                                          comp_threads)
+        comp_cmd = ' '.join([cmd] + thread_opts)
 
     output = os.path.join(output_dir, spec.orig_src['filename'])
 
     # Remove extra slashes from prefix, will be added by git_archive_x funcs
     prefix = prefix.strip('/')
     try:
-        if repo.has_submodules(treeish) and with_submodules:
+        submodules = repo.has_submodules(treeish) and with_submodules
+        if cache:
+            cache_key = cache.make_key(repo.rev_parse('%s^{tree}' % treeish),
+                                       prefix, spec.orig_src['archive_fmt'],
+                                       spec.orig_src['compression'],
+                                       comp_level, ' '.join(comp_opts),
+                                       submodules, comp_cmd)
+            if cache.get(cache_key, output):
+                gbp.log.info("Using cached tarball for '%s'" %
+                             spec.orig_src['filename'])
+                return True
+        if submodules:
             repo.update_submodules()
             git_archive_submodules(repo, treeish, output, prefix,
                                    spec.orig_src['compression'],
                                    comp_level, comp_opts,
-                                   spec.orig_src['archive_fmt'])
+                                   spec.orig_src['archive_fmt'], comp_threads)
 
         else:
             git_archive_single(repo, treeish, output, prefix,
                                spec.orig_src['compression'], comp_level,
-                               comp_opts, spec.orig_src['archive_fmt'])
+                               comp_opts, spec.orig_src['archive_fmt'],
+                               comp_threads)
     except (GitRepositoryError, CommandExecFailed):
         gbp.log.err("Error generating submodules' archives")
         return False
+    if cache:
+        cache.put(cache_key, output)
     return True
 
 
@@ -106,6 +145,7 @@ def prepare_upstream_tarball(repo, spec, options, output_dir):
     # pre-existing) if user forces it
     if options.force_create or (not options.no_create_orig and not
                                 RpmPkgPolicy.has_orig(orig_file, output_dir)):
+        unshare_file(os.path.join(output_dir, orig_file))
         if not pristine_tar_build_orig(repo, orig_file, output_dir, options):
             upstream_tree = git_archive_build_orig(repo, spec, output_dir,
                                                    options)
@@ -269,7 +309,9 @@ def git_archive_build_orig(repo, spec, output_dir, options):
                                         options.comp_level))
         if not git_archive(repo, spec, output_dir, upstream_tree,
                            options.orig_prefix, options.comp_level,
-                           options.with_submodules):
+                           options.with_submodules,
+                           orig_tarball_cache(options),
+                           orig_comp_threads(options)):
             raise GbpError("Cannot create upstream tarball at '%s'" % \
                             output_dir)
     except (GitRepositoryError, GbpError) as err:
@@ -473,8 +515,17 @@ def build_parser(name, prefix=None, git_treeish=None):
                     dest="comp_level",
                     help="Compression level, default is "
                          "'%(compression-level)s'")
+    orig_group.add_config_file_option(option_name="compression-threads",
+                    dest="comp_threads")
+    orig_group.add_boolean_config_file_option(
+                    option_name="deterministic-tarballs",
+                    dest="deterministic_tarballs")
     orig_group.add_config_file_option(option_name="orig-prefix",
                     dest="orig_prefix")
+    orig_group.add_config_file_option(option_name="orig-cache-dir",
+                    dest="orig_cache_dir", type="path")
+    orig_group.add_config_file_option(option_name="orig-cache-size",
+                    dest="orig_cache_size")
     branch_group.add_config_file_option(option_name="upstream-branch",
                     dest="upstream_branch")
     branch_group.add_config_file_option(option_name="packaging-branch",
@@ -524,6 +575,8 @@ def build_parser(name, prefix=None, git_treeish=None):
                     dest="packaging_dir")
     export_group.add_config_file_option(option_name="spec-file",
                     dest="spec_file")
+    export_group.add_boolean_config_file_option(option_name="spec-cache",
+                    dest="spec_cache")
     export_group.add_config_file_option("spec-vcs-tag", dest="spec_vcs_tag")
     export_group.add_boolean_config_file_option("patch-export",
                     dest="patch_export")
@@ -597,6 +650,10 @@ def main(argv):
 
     branch = get_current_branch(repo)
 
+    if options.spec_cache:
+        rpm.SpecFile.cache.set_cache_dir(os.path.join(repo.git_dir,
+                                                      'gbp-cache'))
+
     try:
         init_tmpdir(options.tmp_dir, prefix='buildpackage-rpm_')
 
@@ -618,47 +675,42 @@ def main(argv):
                 raise GbpError("Use --git-ignore-branch to ignore or "
                                "--git-packaging-branch to set the branch name.")
 
-        # Dump from git to a temporary directory:
-        packaging_tree = '%s:%s' % (tree, options.packaging_dir)
-        dump_dir = tempfile.mkdtemp(prefix='packaging_')
-        gbp.log.debug("Dumping packaging files to '%s'" % dump_dir)
-        if not dump_tree(repo, dump_dir, packaging_tree, False, False):
-            raise GbpError
-        # Re-parse spec from dump dir to get version etc.
-        spec = rpm.SpecFile(os.path.join(dump_dir, spec.specfile))
-
         if not options.tag_only:
             # Setup builder opts
             setup_builder(options, builder_args)
 
-            # Generate patches, if requested
-            if options.patch_export and not is_native(repo, options):
-                if options.patch_export_rev:
-                    patch_tree = get_tree(repo, options.patch_export_rev)
-                else:
-                    patch_tree = tree
-                export_patches(repo, spec, patch_tree, options)
-
             # Prepare final export dirs
             export_dir = makedir(options.export_dir)
             source_dir = makedir(os.path.join(export_dir,
                                  options.export_sourcedir))
             spec_dir = makedir(os.path.join(export_dir, options.export_specdir))
 
-            # Move packaging files to final export dir
-            gbp.log.debug("Exporting packaging files from '%s' to '%s'" %
-                          (dump_dir, export_dir))
-            for fname in os.listdir(dump_dir):
-                src = os.path.join(dump_dir, fname)
-                if fname == spec.specfile:
-                    dst = os.path.join(spec_dir, fname)
+            # Export packaging files from git directly to the final export dir
+            packaging_tree = '%s:%s' % (tree, options.packaging_dir)
+            gbp.log.debug("Exporting packaging files to '%s'" % export_dir)
+            route = lambda fname: (spec_dir if fname == spec.specfile else
+                                   source_dir)
+            if not dump_tree_files(repo, packaging_tree, route):
+                raise GbpError("Error exporting packaging files")
+            # Re-parse spec from export dir
+            spec = rpm.SpecFile(os.path.join(spec_dir, spec.specfile))
+
+            # Generate patches, if requested
+            if options.patch_export and not is_native(repo, options):
+                if options.patch_export_rev:
+                    patch_tree = get_tree(repo, options.patch_export_rev)
                 else:
-                    dst = os.path.join(source_dir, fname)
-                try:
-                    shutil.copy2(src, dst)
-                except IOError as err:
-                    raise GbpError("Error exporting packaging files: %s" % err)
-            spec.specdir = os.path.abspath(spec_dir)
+                    patch_tree = tree
+                # Patches are written next to the spec file, i.e. temporarily
+                # make the spec live in the sources dir
+                spec.specdir = os.path.abspath(source_dir)
+                export_patches(repo, spec, patch_tree, options)
+                spec.specdir = os.path.abspath(spec_dir)
+                stray_spec = os.path.join(source_dir, spec.specfile)
+                if (os.path.abspath(source_dir) != spec.specdir and
+                        os.path.exists(stray_spec)):
+                    os.unlink(stray_spec)
+                spec.write_spec_file()
 
             if options.orig_prefix != 'auto':
                 orig_prefix_fields = dict(spec.version,
@@ -682,7 +734,9 @@ def main(argv):
                                        options.comp_level))
                     if not git_archive(repo, spec, source_dir, tree,
                                        options.orig_prefix, options.comp_level,
-                                       options.with_submodules):
+                                       options.with_submodules,
+                                       orig_tarball_cache(options),
+                                       orig_comp_threads(options)):
                         raise GbpError("Cannot create source tarball at '%s'" %
                                         source_dir)
             # Non-native packages: create orig tarball from upstream
@@ -737,7 +791,8 @@ def main(argv):
 
         # Put 'VCS:' tag to .spec
         spec.set_tag('VCS', None, format_str(options.spec_vcs_tag, vcs_info))
-        spec.write_spec_file()
+        if not options.tag_only:
+            spec.write_spec_file()
 
     except CommandExecFailed:
         retval = 1
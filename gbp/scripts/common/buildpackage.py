@@ -28,6 +28,8 @@ import subprocess
 from gbp.command_wrappers import (CatenateTarArchive, CatenateZipArchive)
 from gbp.git.repository import GitRepository, GitRepositoryError
 from gbp.errors import GbpError
+from gbp.pkg import compressor_cmd
+from gbp.pkg.tarballcache import unshare_file
 import gbp.log
 
 # when we want to reference the index in a treeish context we call it:
@@ -59,30 +61,48 @@ def compress(cmd, options, output, input_data=None):
     """
     Filter data through a compressor cmd.
 
-    For better performance input_data should feed data in bigger chunks.
+    I{input_data} is either an iterable, which for better performance should
+    feed data in bigger chunks, or a function that is given the stdin of the
+    compressor as a file object, e.g. for connecting the output of another
+    process directly to the compressor.
     """
     stdin = subprocess.PIPE if input_data else None
     try:
+      # Don't write to cached tarballs through hardlinks
+      unshare_file(output)
       with open(output, 'w') as fobj:
             popen = subprocess.Popen([cmd] + options, stdin=stdin, stdout=fobj)
+            input_err = None
+            try:
+                if callable(input_data):
+                    input_data(popen.stdin)
+                elif stdin:
+                    for chunk in input_data:
+                        popen.stdin.write(chunk)
+            except (GitRepositoryError, GbpError, OSError, IOError) as err:
+                input_err = err
             if stdin:
-                for chunk in input_data:
-                    popen.stdin.write(chunk)
                 popen.stdin.close()
             if popen.wait():
-                raise GbpError("Error creating %s: running '%s' failed" %
-                                (output, ' '.join([cmd] + options)))
+                msg = "Error creating %s: running '%s' failed" % \
+                        (output, ' '.join([cmd] + options))
+                if input_err:
+                    msg += " (input: %s)" % input_err
+                raise GbpError(msg)
+            if input_err:
+                raise input_err
     except (OSError, IOError) as err:
         raise GbpError("Error creating %s: %s" % (output, err))
 
 
 def git_archive_submodules(repo, treeish, output, prefix, comp_type, comp_level,
-                           comp_opts, format='tar'):
+                           comp_opts, format='tar', comp_threads=1):
     """
     Create a source tree archive with submodules.
 
     Since git-archive always writes an end of tarfile trailer we concatenate
-    the generated archives using tar and compress the result.
+    the generated archives using tar and compress the result. A
+    multi-threaded compressor is used if I{comp_threads} is more than one.
 
     Exception handling is left to the caller.
     """
@@ -110,8 +130,9 @@ def git_archive_submodules(repo, treeish, output, prefix, comp_type, comp_level,
 
         # compress the output
         if comp_type:
-            compress(comp_type, ['--stdout', '-%s' % comp_level] + comp_opts +
-                     [main_archive], output)
+            cmd, thread_opts = compressor_cmd(comp_type, comp_threads)
+            compress(cmd, ['--stdout', '-%s' % comp_level] + comp_opts +
+                     thread_opts + [main_archive], output)
         else:
             shutil.move(main_archive, output)
     finally:
@@ -119,21 +140,23 @@ def git_archive_submodules(repo, treeish, output, prefix, comp_type, comp_level,
 
 
 def git_archive_single(repo, treeish, output, prefix, comp_type, comp_level,
-                       comp_opts, format='tar'):
+                       comp_opts, format='tar', comp_threads=1):
     """
-    Create an archive without submodules
+    Create an archive without submodules. A multi-threaded compressor is
+    used if I{comp_threads} is more than one.
 
     Exception handling is left to the caller.
     """
     prefix = sanitize_prefix(prefix)
     if comp_type:
-        cmd = comp_type
-        opts = ['--stdout', '-%s' % comp_level] + comp_opts
+        # Connect git-archive directly to the compressor
+        archive = lambda stdin: repo.archive(format, prefix, stdin, treeish)
+        cmd, thread_opts = compressor_cmd(comp_type, comp_threads)
+        compress(cmd, ['--stdout', '-%s' % comp_level] + comp_opts +
+                 thread_opts, output, archive)
     else:
-        cmd= 'cat'
-        opts = []
-    input_data = repo.archive(format, prefix, None, treeish)
-    compress(cmd, opts, output, input_data)
+        unshare_file(output)
+        repo.archive(format, prefix, os.path.abspath(output), treeish)
 
 def untar_data(outdir, data):
     """Extract tar provided as an iterable"""
@@ -146,6 +169,44 @@ def untar_data(outdir, data):
         raise GbpError("Error extracting tar to %s" % outdir)
 
 
+class IterReader(object):
+    """
+    Minimal read-only file object for data given as an iterable of strings,
+    e.g. the output of L{GitRepository.archive}
+
+    >>> reader = IterReader(['foo', 'bar', 'baz'])
+    >>> reader.read(2)
+    'fo'
+    >>> reader.read(5)
+    'obarb'
+    >>> reader.read()
+    'az'
+    >>> reader.read()
+    ''
+    """
+    def __init__(self, data):
+        self._iter = iter(data)
+        self._buf = ''
+
+    def read(self, size=-1):
+        """Read at most I{size} bytes, all of the remaining data by default"""
+        chunks = [self._buf]
+        length = len(self._buf)
+        while size < 0 or length < size:
+            try:
+                chunk = next(self._iter)
+            except StopIteration:
+                break
+            chunks.append(chunk)
+            length += len(chunk)
+        data = ''.join(chunks)
+        if size < 0:
+            self._buf = ''
+            return data
+        self._buf = data[size:]
+        return data[:size]
+
+
 #{ Functions to handle export-dir
 def dump_tree(repo, export_dir, treeish, with_submodules, recursive=True):
     """Dump a git tree-ish to output_dir"""
@@ -174,6 +235,46 @@ def dump_tree(repo, export_dir, treeish, with_submodules, recursive=True):
     return True
 
 
+def dump_tree_files(repo, treeish, route):
+    """
+    Dump the files in the top level of a git tree-ish directly to their
+    final location, streaming the output of git-archive
+
+    @param treeish: the tree-ish to export
+    @type treeish: C{str}
+    @param route: function giving the directory where a file is written to
+    @type route: C{callable} taking the filename as argument
+    @return: C{True} on success
+    @rtype: C{bool}
+    """
+    import tarfile
+
+    try:
+        paths = [nam for _mod, typ, _sha, nam in repo.list_tree(treeish) if
+                    typ == 'blob']
+        if not paths:
+            return True
+        # Respect umask, like tar(1) does
+        umask = os.umask(0)
+        os.umask(umask)
+        data = repo.archive('tar', '', None, treeish, paths)
+        archive = tarfile.open(fileobj=IterReader(data), mode='r|')
+        for member in archive:
+            member.mode &= ~umask
+            archive.extract(member, route(member.name))
+        archive.close()
+        # Consume rest of the output so that git-archive finishes
+        for _chunk in data:
+            pass
+    except GitRepositoryError as err:
+        gbp.log.err("Git error when dumping tree: %s" % err)
+        return False
+    except (tarfile.TarError, EnvironmentError) as err:
+        gbp.log.err("Error when dumping tree: %s" % err)
+        return False
+    return True
+
+
 def wc_index(repo):
     """Get path of the temporary index file used for exporting working copy"""
     return os.path.join(repo.git_dir, "gbp_index")
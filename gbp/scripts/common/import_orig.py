@@ -26,6 +26,7 @@ import gbp.log
 from gbp.pkg import parse_archive_filename
 from gbp.errors import GbpError
 from gbp.deb.upstreamsource import DebianUpstreamSource
+from gbp.git.treewriter import GitTreeWriter
 
 # Try to import readline, since that will cause raw_input to get fancy
 # line editing and history capabilities. However, if readline is not
@@ -164,6 +165,18 @@ def prepare_pristine_tar(source, pkg_name, pkg_version, pristine_commit_name,
     return pristine
 
 
+def _pristine_params(pkg_name, pkg_version, filters, filter_pristine, prefix):
+    """Determine filters and prefix for the pristine-tar archive"""
+    pristine_filters = filters if filters and filter_pristine else None
+    pristine_prefix = None
+    if prefix is not None and prefix != 'auto':
+        prefix_subst = {'name': pkg_name,
+                        'version': pkg_version,
+                        'upstreamversion': pkg_version}
+        pristine_prefix = prefix % prefix_subst
+    return pristine_filters, pristine_prefix
+
+
 def prepare_sources(source, pkg_name, pkg_version, pristine_commit_name,
                     filters, filter_pristine, prefix, tmpdir):
     """
@@ -192,14 +205,10 @@ def prepare_sources(source, pkg_name, pkg_version, pristine_commit_name,
     @rtype: C{tuple} of C{str}
     """
     pristine = None
-    # Determine parameters for pristine tar
-    pristine_filters = filters if filters and filter_pristine else None
-    pristine_prefix = None
-    if prefix is not None and prefix != 'auto':
-        prefix_subst = {'name': pkg_name,
-                        'version': pkg_version,
-                        'upstreamversion': pkg_version}
-        pristine_prefix = prefix % prefix_subst
+    pristine_filters, pristine_prefix = _pristine_params(pkg_name, pkg_version,
+                                                         filters,
+                                                         filter_pristine,
+                                                         prefix)
     # Handle unpacked sources, i.e. importing a directory
     if source.is_dir():
         if pristine_commit_name:
@@ -234,3 +243,50 @@ def prepare_sources(source, pkg_name, pkg_version, pristine_commit_name,
     pristine_path = pristine.path if pristine else ''
     return (filtered.unpacked, pristine_path)
 
+
+def import_sources(repo, source, pkg_name, pkg_version, pristine_commit_name,
+                   filters, filter_pristine, prefix, tmpdir):
+    """
+    Import upstream sources into a git tree
+
+    Source archives are read directly into the repository, without unpacking
+    them. They are only unpacked (and repacked) if the archive for
+    pristine-tar needs to be filtered or prefixed. Arguments are the same as
+    for L{prepare_sources}.
+
+    @return: the imported tree and tarball to commit to pristine-tar
+    @rtype: C{tuple} of C{str}
+    """
+    if source.is_dir():
+        unpacked, pristine_path = prepare_sources(source, pkg_name,
+                                                  pkg_version,
+                                                  pristine_commit_name,
+                                                  filters, filter_pristine,
+                                                  prefix, tmpdir)
+        # Don't mess up our repo with git metadata from an upstream tarball
+        if os.path.isdir(os.path.join(unpacked, '.git/')):
+            raise GbpError("The orig tarball contains .git metadata - "
+                           "giving up.")
+        return repo.create_tree(unpacked), pristine_path
+
+    gbp.log.debug("Importing '%s' to git" % source.path)
+    writer = GitTreeWriter(repo)
+    try:
+        source.import_tree(writer, filters)
+        tree = writer.write()
+    finally:
+        writer.close()
+
+    pristine_path = ''
+    if pristine_commit_name:
+        pristine_filters, pristine_prefix = _pristine_params(pkg_name,
+                                                             pkg_version,
+                                                             filters,
+                                                             filter_pristine,
+                                                             prefix)
+        pristine = prepare_pristine_tar(source, pkg_name, pkg_version,
+                                        pristine_commit_name,
+                                        pristine_filters, pristine_prefix,
+                                        tmpdir)
+        pristine_path = pristine.path
+    return tree, pristine_path
@@ -20,16 +20,14 @@
 
 import re
 import os
+import shutil
 import subprocess
+import tempfile
 import datetime
 import pwd
-import socket
 import time
-from email.message import Message
-from email.header import Header
-from email.charset import Charset, QP
 
-from gbp.git import GitRepositoryError
+from gbp.git import GitRepositoryError, FastImport, rfc822_date_to_git
 from gbp.git.modifier import GitModifier, GitTz
 from gbp.errors import GbpError
 import gbp.log
@@ -222,6 +220,12 @@ def patch_path_filter(file_status, exclude_regex=None):
 
 def write_patch_file(filename, commit_info, diff):
     """Write patch file"""
+    # The email package pulls in many modules, don't load it for
+    # commands that never write a patch
+    from email.message import Message
+    from email.header import Header
+    from email.charset import Charset, QP
+
     if not diff:
         gbp.log.debug("I won't generate empty diff %s" % filename)
         return None
@@ -265,8 +269,15 @@ def write_patch_file(filename, commit_info, diff):
 
 
 def format_patch(outdir, repo, commit_info, series, numbered=True,
-                 path_exclude_regex=None, topic=''):
-    """Create patch of a single commit"""
+                 path_exclude_regex=None, topic='', diff=None):
+    """
+    Create patch of a single commit
+
+    @param diff: the complete diff of the commit, if already known (see
+        L{gbp.git.GitRepository.diff_commits}). Only used if no files are
+        excluded by I{path_exclude_regex}.
+    @type diff: C{str}
+    """
 
     # Determine filename and path
     outdir = os.path.join(outdir, topic)
@@ -291,8 +302,10 @@ def format_patch(outdir, repo, commit_info, series, numbered=True,
     # Finally, create the patch
     patch = None
     if paths:
-        diff = repo.diff('%s^!' % commit_info['id'], paths=paths, stat=80,
-                         summary=True, text=True)
+        num_files = sum([len(files) for files in commit_info['files'].values()])
+        if diff is None or (path_exclude_regex and len(paths) != num_files):
+            diff = repo.diff('%s^!' % commit_info['id'], paths=paths, stat=80,
+                             summary=True, text=True)
         patch = write_patch_file(filepath, commit_info, diff)
         if patch:
             series.append(patch)
@@ -339,6 +352,7 @@ def get_author(repo):
         if 'EMAIL' in os.environ:
             author.email = os.environ['EMAIL']
         else:
+            import socket
             author.email = "%s@%s" % (passwd_data.pw_name, socket.getfqdn())
 
     return author
@@ -388,8 +402,8 @@ def apply_single_patch(repo, branch, patch, fallback_author, options):
     gbp.log.info("Applied %s" % os.path.basename(patch.path))
 
 
-def apply_and_commit_patch(repo, patch, fallback_author, topic=None):
-    """apply a single patch 'patch', add topic 'topic' and commit it"""
+def _patch_author(patch, fallback_author):
+    """Get the author of a patch, I{fallback_author} if it has none"""
     author = {'name': patch.author,
               'email': patch.email,
               'date': patch.date }
@@ -403,12 +417,94 @@ def apply_and_commit_patch(repo, patch, fallback_author, topic=None):
                                         author['email']))
         else:
             gbp.log.warn("Patch '%s' has no authorship information" % patch_fn)
+    return author
 
-    repo.apply_patch(patch.path, strip=patch.strip)
-    tree = repo.write_tree()
+
+def _patch_msg(patch, topic):
+    """Commit message of a patch"""
     msg = "%s\n\n%s" % (patch.subject, patch.long_desc)
     if topic:
         msg += "\nGbp-Pq: Topic %s" % topic
+    return msg
+
+
+def _git_date(repo, date):
+    """Convert a patch date to git raw format"""
+    if not date or re.match(r'^\d+ [+-]\d{4}$', date):
+        return date
+    try:
+        return rfc822_date_to_git(date)
+    except (TypeError, ValueError):
+        # Let git parse the more exotic formats
+        out, err, ret = repo._git_inout('var', ['GIT_AUTHOR_IDENT'],
+                                        extra_env={'GIT_AUTHOR_DATE': date},
+                                        capture_stderr=True)
+        if ret:
+            raise GbpError("Invalid date '%s': %s" % (date, err.strip()))
+        return ' '.join(out.split()[-2:])
+
+
+def import_patch_series(repo, branch, base, patches, fallback_author):
+    """
+    Apply a series of patches on top of I{base} and commit them to branch
+    I{branch} in one go. The patches are applied against a private index,
+    leaving the working copy alone, and the commits are written in a single
+    I{git fast-import} stream. The branch is only updated after all the
+    patches have been applied, nothing is committed if one of them fails.
+
+    @param branch: the branch to commit to, created if it doesn't exist.
+        An existing branch must be I{base} or an ancestor of it
+    @type branch: C{str}
+    @param base: commit to apply the patches to
+    @type base: C{str}
+    @param patches: the patches to apply, commits get the topic of the patch
+    @type patches: C{list} of L{Patch}
+    @param fallback_author: author of patches that have no author
+    @type fallback_author: C{dict}
+    @return: sha1 of the last commit
+    @rtype: C{str}
+    """
+    # git can't start from an empty index file, so use a private directory
+    # to not clash with concurrent imports
+    index_dir = tempfile.mkdtemp(prefix='gbp_pq_', dir=repo.git_dir)
+    index_file = os.path.join(index_dir, 'index')
+    commits = []
+    try:
+        repo.read_tree(base, index_file=index_file)
+        for patch in patches:
+            gbp.log.debug("Applying %s" % patch.path)
+            try:
+                repo.apply_patch(patch.path, strip=patch.strip, cached=True,
+                                 index_file=index_file)
+            except GitRepositoryError as err:
+                raise GbpError("Failed to apply '%s': %s" % (patch.path, err))
+            author = dict(_patch_author(patch, fallback_author).items())
+            author['date'] = _git_date(repo, author.get('date'))
+            commits.append((repo.write_tree(index_file), author,
+                            _patch_msg(patch, patch.topic)))
+    finally:
+        shutil.rmtree(index_dir)
+
+    fastimport = FastImport(repo)
+    fastimport.reset('refs/heads/%s' % branch, base)
+    head = base
+    for tree, author, msg in commits:
+        head = fastimport.start_commit(branch, None, msg, author=author,
+                                       parents=[head])
+        fastimport.modify('', fastimport.m_tree, tree)
+    if commits:
+        head = fastimport.get_mark(head)
+    fastimport.close()
+    return head
+
+
+def apply_and_commit_patch(repo, patch, fallback_author, topic=None):
+    """apply a single patch 'patch', add topic 'topic' and commit it"""
+    author = _patch_author(patch, fallback_author)
+
+    repo.apply_patch(patch.path, strip=patch.strip)
+    tree = repo.write_tree()
+    msg = _patch_msg(patch, topic)
     commit = repo.commit_tree(tree, msg, [repo.head], author=author)
     repo.update_ref('HEAD', commit, msg="gbp-pq import %s" % patch.path)
 
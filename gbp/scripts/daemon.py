@@ -0,0 +1,503 @@
+# vim: set fileencoding=utf-8 :
+#
+# (C) 2026 agent <agent@local>
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+"""Run a server that speeds up other gbp commands"""
+
+import errno
+import fcntl
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from six.moves import configparser
+from six.moves import cPickle as pickle
+
+from gbp.config import GbpOptionParser
+from gbp.daemon import (socket_path, code_identity, read_request,
+                        read_frame, send_frame, STDOUT, STDERR, EXIT, LOCAL,
+                        SIGNAL)
+from gbp.git.repository import GitRepository, GitRepositoryError
+from gbp.scripts.supercommand import (get_available_commands, import_command,
+                                      run_command)
+import gbp.log
+
+
+def _ref_stamp(git_dir):
+    """
+    Stat information of the files that store the refs of a repository,
+    changes whenever a ref is updated. Git replaces ref files on updates
+    so the inode number changes even if the time stamp doesn't.
+    """
+    common_dir = git_dir
+    try:
+        with open(os.path.join(git_dir, 'commondir')) as commondir:
+            common_dir = os.path.join(git_dir, commondir.read().strip())
+    except IOError:
+        pass
+    paths = [os.path.join(git_dir, 'HEAD'),
+             os.path.join(common_dir, 'packed-refs')]
+    for root, dirs, files in os.walk(os.path.join(common_dir, 'refs')):
+        paths.append(root)
+        paths.extend([os.path.join(root, name) for name in files])
+    stamp = []
+    for path in sorted(paths):
+        try:
+            info = os.stat(path)
+            stamp.append((path, info.st_ino, info.st_size, info.st_mtime))
+        except OSError:
+            stamp.append((path, None))
+    return stamp
+
+
+# Environment variables that change the repository git finds
+_GIT_LAYOUT_VARS = ['GIT_DIR', 'GIT_WORK_TREE', 'GIT_COMMON_DIR']
+
+
+def _set_cloexec(fd):
+    """Don't let programs run by commands inherit I{fd}"""
+    flags = fcntl.fcntl(fd, fcntl.F_GETFD)
+    fcntl.fcntl(fd, fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+
+
+class _WarmRepository(object):
+    """A repository whose refs are kept up to date by the server"""
+
+    def __init__(self, path):
+        self.repo = GitRepository(path)
+        self._stamp = None
+
+    def refresh(self):
+        """
+        Re-read the refs if they changed since the last call
+
+        @raises GitRepositoryError: if the repository is gone
+        """
+        stamp = _ref_stamp(self.repo.git_dir)
+        if stamp != self._stamp:
+            # Take the stamp first so changes done while reading the
+            # refs cause another refresh
+            self.repo.invalidate_refs()
+            self.repo._ref_snapshot
+            self._stamp = stamp
+
+
+class Server(object):
+    """
+    Server running gbp commands for clients connecting to a UNIX socket
+
+    The server has all command modules (and the rpm bindings) imported and
+    keeps the layout and refs of the repositories it has seen as well as
+    parsed spec files warm. Every command runs in a process forked off the
+    server so commands can't affect each other. Clients only pass the
+    command line, working directory and environment (see
+    L{gbp.daemon.forward}) and get the output of the command relayed back.
+    Commands don't get the client's standard input. Clients of different
+    gbp versions or installations are told to run their commands locally.
+
+    @ivar path: path of the socket
+    @type path: C{str}
+    @ivar idle_timeout: exit after this many seconds without requests,
+        C{None} for never
+    @type idle_timeout: C{float}
+    @ivar max_repos: number of repositories to keep warm
+    @type max_repos: C{int}
+    """
+
+    def __init__(self, path, idle_timeout=None, max_repos=64):
+        self.path = path
+        self.idle_timeout = idle_timeout
+        self.max_repos = max_repos
+        self._sock = None
+        # Warm repositories, indexed by the client's working directories,
+        # least recently used first
+        self._repos = OrderedDict()
+        # Running workers, indexed by the fd of their result pipe
+        self._workers = {}
+        self._running = False
+        self._identity = code_identity()
+
+    @staticmethod
+    def preload():
+        """Import all gbp commands so workers don't need to"""
+        path = os.path.dirname(os.path.abspath(__file__))
+        for cmd, dummy in get_available_commands(path):
+            try:
+                import_command(cmd)
+            except Exception:
+                # Missing dependencies are reported when the command runs
+                pass
+        lib_rpm = sys.modules.get('gbp.rpm.lib_rpm')
+        if lib_rpm:
+            try:
+                lib_rpm.load_librpm()
+            except ImportError:
+                pass
+
+    def _bind(self):
+        """Create the listening socket, replacing a stale one"""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if os.path.exists(self.path):
+            try:
+                sock.connect(self.path)
+            except socket.error:
+                os.unlink(self.path)
+            else:
+                sock.close()
+                raise socket.error(errno.EADDRINUSE,
+                                   "Server already running at %s" % self.path)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o077)
+        try:
+            sock.bind(self.path)
+        finally:
+            os.umask(umask)
+        sock.listen(64)
+        self._sock = sock
+
+    def stop(self, *dummy):
+        """Stop serving, can be used as a signal handler"""
+        self._running = False
+
+    def serve(self):
+        """Serve clients until stopped or idle for too long"""
+        self._bind()
+        self._running = True
+        last_active = time.time()
+        try:
+            while self._running:
+                timeout = None
+                if self.idle_timeout is not None and not self._workers:
+                    timeout = max(0, last_active + self.idle_timeout -
+                                  time.time())
+                    if not timeout:
+                        break
+                try:
+                    ready = select.select([self._sock] + list(self._workers),
+                                          [], [], timeout)[0]
+                except select.error as err:
+                    if err.args[0] == errno.EINTR:
+                        continue
+                    raise
+                for fd in ready:
+                    if fd is self._sock:
+                        self._accept()
+                    else:
+                        self._collect(fd)
+                if ready:
+                    last_active = time.time()
+        finally:
+            self._sock.close()
+            os.unlink(self.path)
+            for fd in list(self._workers):
+                self._collect(fd)
+
+    def _accept(self):
+        """Read a request and fork a worker for it"""
+        conn = self._sock.accept()[0]
+        try:
+            request = read_request(conn)
+            if request and request[0] != self._identity:
+                send_frame(conn, LOCAL, '')
+            elif request:
+                self._spawn(conn, request[1:])
+        finally:
+            conn.close()
+
+    def _forget_repository(self, path):
+        """Drop the warm state of the repository used from I{path}"""
+        repo = self._repos.pop(path, None)
+        GitRepository.set_warm(path, None)
+        if repo and not any(other.repo.path == repo.repo.path
+                            for other in self._repos.values()):
+            GitRepository.set_warm(repo.repo.path, None)
+
+    def _warm_repository(self, path):
+        """Bring the warm state of the repository at I{path} up to date"""
+        # Don't keep removed checkouts, e.g. those of CI jobs, around
+        for known in list(self._repos):
+            if not os.path.isdir(known):
+                self._forget_repository(known)
+        try:
+            repo = self._repos.pop(path, None) or _WarmRepository(path)
+            self._repos[path] = repo
+            repo.refresh()
+        except GitRepositoryError:
+            # Not (or no more) a repository
+            self._forget_repository(path)
+            return
+        GitRepository.set_warm(path, repo.repo)
+        GitRepository.set_warm(repo.repo.path, repo.repo)
+        while len(self._repos) > self.max_repos:
+            self._forget_repository(next(iter(self._repos)))
+
+    def _spawn(self, conn, request):
+        """Fork a worker running the request"""
+        cwd, env = request[0], request[3]
+        # The warm state is what git finds in the server's environment
+        warm = all(env.get(var) == os.environ.get(var) for var in
+                   _GIT_LAYOUT_VARS)
+        if warm:
+            self._warm_repository(cwd)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        result_r, result_w = os.pipe()
+        # Programs outliving the worker mustn't keep the pipe open, the
+        # server reads the result until EOF
+        for fd in (result_r, result_w, conn.fileno()):
+            _set_cloexec(fd)
+        pid = os.fork()
+        if pid:
+            os.close(result_w)
+            self._workers[result_r] = pid
+            return
+        os.close(result_r)
+        status = 1
+        try:
+            self._sock.close()
+            for fd in self._workers:
+                os.close(fd)
+            if not warm:
+                for path in list(self._repos):
+                    self._forget_repository(path)
+            status = _Worker(conn, result_w).run(*request)
+        finally:
+            os._exit(status)
+
+    def _collect(self, fd):
+        """Read the result of a finished worker"""
+        chunks = []
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        os.close(fd)
+        os.waitpid(self._workers.pop(fd), 0)
+        try:
+            specs = pickle.loads(''.join(chunks))
+        except Exception:
+            return
+        if specs and 'gbp.rpm' in sys.modules:
+            cache = sys.modules['gbp.rpm'].SpecFile.cache
+            for key, info in specs.items():
+                cache.put(key, info)
+
+
+class _Worker(object):
+    """
+    Runs one request in a process forked off the server. The worker is the
+    leader of a process group of its own, so that the command and the
+    programs it runs can be signalled together.
+    """
+
+    def __init__(self, conn, result_fd):
+        self._conn = conn
+        self._result_fd = result_fd
+        self._connected = True
+        self._done = threading.Event()
+
+    def _disconnect(self):
+        """Stop talking to the client, kill the command if it's running"""
+        self._connected = False
+        if not self._done.is_set():
+            os.killpg(0, signal.SIGTERM)
+
+    def _send(self, channel, data):
+        """Send a frame to the client, unless it went away"""
+        if self._connected:
+            try:
+                send_frame(self._conn, channel, data)
+            except socket.error:
+                self._disconnect()
+
+    def _receive(self):
+        """Pass a signal sent by the client on to the command"""
+        try:
+            frame = read_frame(self._conn)
+        except socket.error:
+            frame = None
+        if frame is None:
+            self._disconnect()
+        elif frame[0] == SIGNAL and not self._done.is_set():
+            os.killpg(0, int(frame[1]))
+
+    def _relay(self, pipes):
+        """
+        Send the output of the command to the client, receive signals from
+        the client
+        """
+        conn = self._conn.fileno()
+        while pipes:
+            fds = list(pipes) + ([conn] if self._connected else [])
+            ready = select.select(fds, [], [], 0.05)[0]
+            if not ready and self._done.is_set():
+                # Only background processes of the command are left
+                break
+            for fd in ready:
+                if fd == conn:
+                    self._receive()
+                    continue
+                data = os.read(fd, 65536)
+                if data:
+                    self._send(pipes[fd], data)
+                else:
+                    del pipes[fd]
+
+    def _setup(self, cwd, umask, env):
+        """Take the environment of the client into use"""
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        os.environ.clear()
+        os.environ.update(env)
+        os.umask(umask)
+        os.chdir(cwd)
+        if 'gbp.rpm.lib_rpm' in sys.modules:
+            # Don't share the log file with other workers
+            sys.modules['gbp.rpm.lib_rpm'].open_librpm_log()
+
+    def run(self, cwd, umask, argv, env):
+        """
+        Run the command and report its exit status to the client
+
+        @return: the exit status of the worker process
+        @rtype: C{int}
+        """
+        os.setpgid(0, 0)
+        devnull = os.open(os.devnull, os.O_RDWR)
+        os.dup2(devnull, 0)
+        pipes = {}
+        for fd, channel in ((1, STDOUT), (2, STDERR)):
+            read_fd, write_fd = os.pipe()
+            os.dup2(write_fd, fd)
+            os.close(write_fd)
+            pipes[read_fd] = channel
+        # The server's own streams may not point to fds 1 and 2
+        sys.stdout = sys.__stdout__ = os.fdopen(1, 'w', 1)
+        sys.stderr = sys.__stderr__ = os.fdopen(2, 'w', 0)
+        relay = threading.Thread(target=self._relay, args=(pipes,))
+        relay.start()
+
+        specs = None
+        if 'gbp.rpm' in sys.modules:
+            specs = sys.modules['gbp.rpm'].SpecFile.cache
+        known = set(specs.keys()) if specs is not None else set()
+        try:
+            self._setup(cwd, umask, env)
+            status = run_command(argv)
+        except SystemExit as err:
+            status = err.code
+        except:
+            traceback.print_exc()
+            status = 1
+        if status is None:
+            status = 0
+        elif not isinstance(status, int):
+            # Like sys.exit() with a message
+            sys.stderr.write('%s\n' % status)
+            status = 1
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(devnull, 1)
+        os.dup2(devnull, 2)
+        self._done.set()
+        relay.join()
+        self._send(EXIT, str(status))
+
+        # Let the server keep what the command parsed
+        new_specs = {}
+        if specs is not None:
+            for key in set(specs.keys()) - known:
+                new_specs[key] = specs.get(key)
+        try:
+            result = pickle.dumps(new_specs, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            result = pickle.dumps({})
+        while result:
+            result = result[os.write(self._result_fd, result):]
+        os.close(self._result_fd)
+        return 0
+
+
+def build_parser(name):
+    try:
+        parser = GbpOptionParser(command=os.path.basename(name), prefix='',
+                                 usage='%prog [options] - run gbp commands '
+                                       'in a long-running server')
+    except configparser.ParsingError as err:
+        gbp.log.err(err)
+        return None
+
+    parser.add_option("--socket", dest="socket", default=None,
+                      help="path of the server socket, default is "
+                           "$GBP_DAEMON_SOCKET or "
+                           "$XDG_RUNTIME_DIR/gbp-daemon-UID.sock")
+    parser.add_option("--idle-timeout", dest="idle_timeout", type="float",
+                      default=None, metavar="SECONDS",
+                      help="exit after SECONDS without requests")
+    parser.add_option("-v", "--verbose", action="store_true", dest="verbose",
+                      default=False, help="verbose command execution")
+    parser.add_config_file_option(option_name="color", dest="color",
+                                  type='tristate')
+    parser.add_config_file_option(option_name="color-scheme",
+                                  dest="color_scheme")
+    return parser
+
+
+def parse_args(argv):
+    parser = build_parser(argv[0])
+    if not parser:
+        return None, None
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    gbp.log.initialize()
+
+    (options, args) = parse_args(argv)
+    if not options:
+        return 1
+    gbp.log.setup(options.color, options.verbose, options.color_scheme)
+
+    if len(args) > 1:
+        gbp.log.err("Too many arguments")
+        return 2
+    path = options.socket or socket_path()
+    if not path:
+        gbp.log.err("No socket path given")
+        return 2
+
+    server = Server(path, options.idle_timeout)
+    signal.signal(signal.SIGTERM, server.stop)
+    signal.signal(signal.SIGINT, server.stop)
+    Server.preload()
+    gbp.log.info("Serving gbp commands at %s" % path)
+    try:
+        server.serve()
+    except socket.error as err:
+        gbp.log.err(err)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
+
+# vim:et:ts=4:sw=4:et:sts=4:ai:set list listchars=tab\:»·,trail\:·:
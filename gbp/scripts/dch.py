@@ -29,7 +29,7 @@ import gbp.dch as dch
 import gbp.log
 from gbp.config import GbpOptionParserDebian, GbpOptionGroup
 from gbp.errors import GbpError
-from gbp.deb import compare_versions
+from gbp.deb import compare_versions, DebianVersionError
 from gbp.deb.source import DebianSource, DebianSourceError
 from gbp.deb.git import GitRepositoryError, DebianGitRepository
 from gbp.deb.changelog import ChangeLog, NoChangeLogError
@@ -190,9 +190,8 @@ def do_snapshot(changelog, repo, next_snapshot):
     mangle_changelog(changelog, cp, commit)
     return snapshot, commit
 
-def parse_commit(repo, commitid, opts, last_commit=False):
+def parse_commit(repo, commit_info, opts, last_commit=False):
     """Parse a commit and return message, author, and author email"""
-    commit_info = repo.get_commit_info(commitid)
     author = commit_info['author'].name
     email = commit_info['author'].email
     format_entry = user_customizations.get('format_changelog_entry')
@@ -445,8 +444,8 @@ def main(argv):
 
         if args:
             gbp.log.info("Only looking for changes on '%s'" % " ".join(args))
-        commits = repo.get_commits(since=since, until=until, paths=args,
-                                   options=options.git_log.split(" "))
+        commits = repo.get_commits_info(since=since, until=until, paths=args,
+                                        options=options.git_log.split(" "))
         commits.reverse()
 
         # add a new changelog section if:
@@ -544,6 +543,7 @@ def main(argv):
             GbpError,
             GitRepositoryError,
             DebianSourceError,
+            DebianVersionError,
             NoChangeLogError) as err:
         if str(err):
             gbp.log.err(err)
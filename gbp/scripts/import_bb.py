@@ -349,12 +349,15 @@ def main(argv):
         ver_str = RpmPkgPolicy.compose_full_version(version_dict)
 
         # Check if the same version of the package is already imported
-        if repo.find_version(options.packaging_tag, tag_str_fields):
+        packaging_tag = repo.version_index(options.packaging_tag).find_tag(
+                                tag_str_fields)
+        if packaging_tag:
             gbp.log.warn("Version %s already imported." % ver_str)
             if options.allow_same_version:
                 gbp.log.info("Moving tag of version '%s' since import forced" %
                              ver_str)
-                move_tag_stamp(repo, options.packaging_tag, tag_str_fields)
+                move_tag_stamp(repo, packaging_tag, options.packaging_tag,
+                               tag_str_fields)
             else:
                 raise SkipImport
 
@@ -21,7 +21,7 @@ import os
 import sys
 import tempfile
 import gbp.command_wrappers as gbpc
-from gbp.deb import DpkgCompareVersions
+from gbp.deb import sort_versions, DebianVersionError
 from gbp.deb.dscfile import DscFile
 from gbp.errors import GbpError
 from gbp.git import GitRepository, GitRepositoryError
@@ -29,14 +29,6 @@ from gbp.scripts import import_dsc
 from gbp.config import GbpOptionParser
 import gbp.log
 
-class DscCompareVersions(DpkgCompareVersions):
-    def __init__(self):
-        DpkgCompareVersions.__init__(self)
-
-    def __call__(self, dsc1, dsc2):
-        return DpkgCompareVersions.__call__(self, dsc1.version, dsc2.version)
-
-
 class GitImportDsc(object):
     def __init__(self, args):
         self.args = args
@@ -94,7 +86,6 @@ def main(argv):
     ret = 0
     verbose = False
     gbp.log.initialize()
-    dsc_cmp = DscCompareVersions()
     use_debsnap = False
 
     try:
@@ -131,7 +122,7 @@ def main(argv):
             dirs['tmp'] = os.path.abspath(tempfile.mkdtemp())
             dscs = [ DscFile.parse(f) for f in fetch_snapshots(pkg, dirs['tmp']) ]
 
-        dscs.sort(cmp=dsc_cmp)
+        dscs = sort_versions(dscs, key=lambda dsc: dsc.version)
         importer = GitImportDsc(import_args)
 
         try:
@@ -155,7 +146,8 @@ def main(argv):
             if importer.importdsc(dsc):
                 raise GbpError("Failed to import '%s'" % dscs[0].dscfile)
 
-    except (GbpError, gbpc.CommandExecFailed, GitRepositoryError) as err:
+    except (GbpError, gbpc.CommandExecFailed, GitRepositoryError,
+            DebianVersionError) as err:
         if str(err):
             gbp.log.err(err)
         ret = 1
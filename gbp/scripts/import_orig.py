@@ -33,7 +33,7 @@ import gbp.log
 from gbp.pkg import compressor_opts
 from gbp.scripts.common.import_orig import (ask_package_name,
                                             ask_package_version, download_orig,
-                                            prepare_sources)
+                                            import_sources)
 from gbp.tmpfile import init_tmpdir, del_tmpdir, tempfile
 
 
@@ -296,17 +296,6 @@ def main(argv):
         # Prepare sources for importing
         pristine_name = pristine_tarball_name(source, pkg_name, version)
         prepare_pristine = pristine_name if options.pristine_tar else None
-        unpacked_orig, pristine_orig = prepare_sources(
-                source, pkg_name, version, prepare_pristine, options.filters,
-                options.filter_pristine_tar, None, tmpdir)
-
-        # Don't mess up our repo with git metadata from an upstream tarball
-        try:
-            if os.path.isdir(os.path.join(unpacked_orig, '.git/')):
-                raise GbpError("The orig tarball contains .git metadata - giving up.")
-        except OSError:
-            pass
-
         try:
             upstream_branch = [ options.upstream_branch, 'master' ][is_empty]
             filter_msg = ["", " (filtering out %s)"
@@ -317,6 +306,10 @@ def main(argv):
             gbp.log.info("Source package is %s" % pkg_name)
             gbp.log.info("Upstream version is %s" % version)
 
+            orig_tree, pristine_orig = import_sources(
+                    repo, source, pkg_name, version, prepare_pristine,
+                    options.filters, options.filter_pristine_tar, None, tmpdir)
+
             import_branch = [ options.upstream_branch, None ][is_empty]
             msg = upstream_import_commit_msg(options, version)
 
@@ -325,7 +318,7 @@ def main(argv):
             else:
                 parents = None
 
-            commit = repo.commit_dir(unpacked_orig,
+            commit = repo.commit_tree_to_branch(orig_tree,
                         msg=msg,
                         branch=import_branch,
                         other_parents=parents,
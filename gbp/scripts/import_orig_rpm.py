@@ -34,7 +34,7 @@ from gbp.errors import GbpError
 import gbp.log
 from gbp.scripts.common.import_orig import (ask_package_name,
                                             ask_package_version,
-                                            prepare_sources)
+                                            import_sources)
 from gbp.scripts.import_srpm import download_file
 from gbp.tmpfile import init_tmpdir, del_tmpdir, tempfile
 
@@ -266,16 +266,6 @@ def main(argv):
                                                   options.pristine_tarball_name)
         else:
             prepare_pristine = None
-        unpacked_orig, pristine_orig = \
-                prepare_sources(source, sourcepackage, version,
-                                prepare_pristine, options.filters,
-                                options.filter_pristine_tar,
-                                options.orig_prefix, tmpdir)
-
-        # Don't mess up our repo with git metadata from an upstream tarball
-        if os.path.isdir(os.path.join(unpacked_orig, '.git/')):
-            raise GbpError("The orig tarball contains .git metadata - "
-                           "giving up.")
         try:
             filter_msg = ["", " (filtering out %s)"
                               % options.filters][len(options.filters) > 0]
@@ -285,6 +275,11 @@ def main(argv):
             gbp.log.info("Source package is %s" % sourcepackage)
             gbp.log.info("Upstream version is %s" % version)
 
+            orig_tree, pristine_orig = \
+                    import_sources(repo, source, sourcepackage, version,
+                                   prepare_pristine, options.filters,
+                                   options.filter_pristine_tar,
+                                   options.orig_prefix, tmpdir)
             msg = upstream_import_commit_msg(options, version)
 
             if options.vcs_tag:
@@ -292,7 +287,7 @@ def main(argv):
             else:
                 parents = None
 
-            commit = repo.commit_dir(unpacked_orig,
+            commit = repo.commit_tree_to_branch(orig_tree,
                         msg=msg,
                         branch=options.upstream_branch,
                         other_parents=parents,
@@ -25,7 +25,6 @@ import glob
 import time
 import shutil
 import errno
-import urllib2
 
 import gbp.command_wrappers as gbpc
 from gbp.tmpfile import init_tmpdir, del_tmpdir, tempfile
@@ -33,12 +32,13 @@ from gbp.rpm import (parse_srpm, guess_spec, SpecFile, NoSpecError,
                      RpmUpstreamSource, compose_version_str)
 from gbp.rpm.git import (RpmGitRepository, GitRepositoryError)
 from gbp.git.modifier import GitModifier
+from gbp.git.treewriter import GitTreeWriter
 from gbp.config import (GbpOptionParserRpm, GbpOptionGroup,
                        no_upstream_branch_msg)
 from gbp.errors import GbpError
 import gbp.log
 from gbp.scripts.pq_rpm import safe_patches, rm_patch_files, get_packager
-from gbp.scripts.common.pq import apply_and_commit_patch
+from gbp.scripts.common.pq import import_patch_series
 from gbp.pkg import parse_archive_filename
 
 no_packaging_branch_msg = """
@@ -64,6 +64,9 @@ class PatchImportError(Exception):
 
 def download_file(target_dir, url):
     """Download a remote file"""
+    # Only imported when needed, urllib2 takes long to load
+    import urllib2
+
     gbp.log.info("Downloading '%s'..." % url)
     try:
         urlobj = urllib2.urlopen(url)
@@ -104,12 +107,11 @@ def committer_from_author(author, options):
     return committer
 
 
-def move_tag_stamp(repo, tag_format, tag_str_fields):
+def move_tag_stamp(repo, tag, tag_format, tag_str_fields):
     "Move tag out of the way appending the current timestamp"
-    old = repo.version_to_tag(tag_format, tag_str_fields)
     new = repo.version_to_tag('%s~%d' % (tag_format, int(time.time())),
                               tag_str_fields)
-    repo.move_tag(old, new)
+    repo.move_tag(tag, new)
 
 
 def set_bare_repo_options(options):
@@ -136,21 +138,21 @@ def import_spec_patches(repo, spec):
 
     # Put patches in a safe place
     queue = safe_patches(queue)
-    for patch in queue:
-        gbp.log.debug("Applying %s" % patch.path)
-        try:
-            apply_and_commit_patch(repo, patch, packager)
-        except (GbpError, GitRepositoryError):
-            repo.force_head(orig_head, hard=True)
-            raise PatchImportError("Patch(es) didn't apply, you need apply "
-                                   "and commit manually")
+    try:
+        import_patch_series(repo, repo.get_branch(), orig_head, queue,
+                            packager)
+        repo.force_head('HEAD', hard=True)
+    except (GbpError, GitRepositoryError):
+        repo.force_head(orig_head, hard=True)
+        raise PatchImportError("Patch(es) didn't apply, you need apply "
+                               "and commit manually")
 
     # Remove patches from spec and packaging directory
     gbp.log.info("Removing imported patch files from spec and packaging dir")
     rm_patch_files(spec)
     try:
-        spec.update_patches([], {})
-        spec.write_spec_file()
+        if spec.update_patches([], {}):
+            spec.write_spec_file()
     except GbpError:
         repo.force_head('HEAD', hard=True)
         raise PatchImportError("Unable to update spec file, you need to edit"
@@ -158,6 +160,18 @@ def import_spec_patches(repo, spec):
     repo.commit_all(msg=PATCH_AUTODELETE_COMMIT_MSG % spec.specfile)
 
 
+def create_tag(repo, transaction, name, msg, commit, options):
+    """
+    Create a version tag, in a ref transaction unless the tag is to be
+    signed
+    """
+    if options.sign_tags:
+        repo.create_tag(name=name, msg=msg, commit=commit, sign=True,
+                        keyid=options.keyid)
+    else:
+        transaction.create_tag(name, commit, msg)
+
+
 def force_to_branch_head(repo, branch):
     """Checkout branch and reset --hard"""
     if repo.get_branch() == branch:
@@ -327,7 +341,6 @@ def main(argv):
             set_bare_repo_options(options)
 
         # Create more tempdirs
-        dirs['origsrc'] = tempfile.mkdtemp(prefix='origsrc_')
         dirs['packaging_base'] = tempfile.mkdtemp(prefix='packaging_')
         dirs['packaging'] = os.path.join(dirs['packaging_base'],
                                          options.packaging_dir)
@@ -359,11 +372,10 @@ def main(argv):
                 gbp.log.err("File '%s' listed in spec not found" % fname)
                 raise GbpError
 
-        # Unpack orig source archive
+        # Orig source archive
         if spec.orig_src:
             orig_tarball = os.path.join(dirs['src'], spec.orig_src['filename'])
             sources = RpmUpstreamSource(orig_tarball)
-            sources = sources.unpack(dirs['origsrc'], options.filters)
         else:
             sources = None
 
@@ -380,13 +392,15 @@ def main(argv):
                                   'upstreamversion': spec.upstreamversion}
         src_tag = repo.version_to_tag(src_tag_format, src_tag_str_fields)
 
-        if repo.find_version(options.packaging_tag, packaging_tag_str_fields):
+        packaging_tag = repo.version_index(options.packaging_tag).find_tag(
+                                packaging_tag_str_fields)
+        if packaging_tag:
             gbp.log.warn("Version %s already imported." %
                          packaging_tag_str_fields['version'])
             if options.allow_same_version:
                 gbp.log.info("Moving tag of version '%s' since import forced" %
                              packaging_tag_str_fields['version'])
-                move_tag_stamp(repo, options.packaging_tag,
+                move_tag_stamp(repo, packaging_tag, options.packaging_tag,
                                packaging_tag_str_fields)
             else:
                 raise SkipImport
@@ -423,25 +437,32 @@ def main(argv):
                         gbp.log.err(no_upstream_branch_msg % branch + "\n"
                             "Also check the --create-missing-branches option.")
                         raise GbpError
+                # Read the orig archive directly into the repo
+                tree_writer = GitTreeWriter(repo)
+                try:
+                    sources.import_tree(tree_writer, options.filters)
+                    src_tree = tree_writer.write()
+                finally:
+                    tree_writer.close()
                 src_vendor = "Native" if options.native else "Upstream"
                 msg = "%s version %s" % (src_vendor, spec.upstreamversion)
                 if options.vcs_tag:
                     parents = [repo.rev_parse("%s^{}" % options.vcs_tag)]
                 else:
                     parents = None
-                src_commit = repo.commit_dir(sources.unpacked,
+                # Update the branch and the tag together
+                with repo.ref_transaction("gbp import-srpm") as trans:
+                    src_commit = repo.commit_tree_to_branch(src_tree,
                         "Imported %s" % msg,
                         branch,
                         other_parents=parents,
                         author=author,
                         committer=committer,
-                        create_missing_branch=options.create_missing_branches)
-                if not (options.native and options.skip_packaging_tag):
-                    repo.create_tag(name=src_tag,
-                                    msg=msg,
-                                    commit=src_commit,
-                                    sign=options.sign_tags,
-                                    keyid=options.keyid)
+                        create_missing_branch=options.create_missing_branches,
+                        transaction=trans)
+                    if not (options.native and options.skip_packaging_tag):
+                        create_tag(repo, trans, src_tag, msg, src_commit,
+                                   options)
 
                 if not options.native:
                     if options.pristine_tar:
@@ -472,6 +493,7 @@ def main(argv):
 
             msg = "%s release %s" % (options.vendor,
                                      packaging_tag_str_fields['version'])
+            trans = repo.ref_transaction("gbp import-srpm")
 
             if options.orphan_packaging or not sources:
                 commit = repo.commit_dir(dirs['packaging_base'],
@@ -479,20 +501,18 @@ def main(argv):
                         branch,
                         author=author,
                         committer=committer,
-                        create_missing_branch=options.create_missing_branches)
+                        create_missing_branch=options.create_missing_branches,
+                        transaction=trans)
             else:
-                # Copy packaging files to the unpacked sources dir
-                try:
-                    pkgsubdir = os.path.join(sources.unpacked,
-                                             options.packaging_dir)
-                    os.mkdir(pkgsubdir)
-                except OSError as err:
-                    if err.errno != errno.EEXIST:
-                        raise
-                for fname in os.listdir(dirs['packaging']):
-                    shutil.copy2(os.path.join(dirs['packaging'], fname),
-                                 pkgsubdir)
-                commit = repo.commit_dir(sources.unpacked,
+                # Add packaging files to the source tree, in a temporary
+                # index so that git converts them like the sources
+                index_file = os.path.join(repo.git_dir, 'gbp_index')
+                repo.read_tree(src_commit, index_file)
+                repo.add_files([os.path.join(options.packaging_dir, fname)
+                                for fname in os.listdir(dirs['packaging'])],
+                               force=True, index_file=index_file,
+                               work_tree=dirs['packaging_base'])
+                commit = repo.commit_tree_to_branch(repo.write_tree(index_file),
                         "Imported %s" % msg,
                         branch,
                         other_parents=[src_commit],
@@ -512,11 +532,8 @@ def main(argv):
             if not options.skip_packaging_tag:
                 tag = repo.version_to_tag(options.packaging_tag,
                                           packaging_tag_str_fields)
-                repo.create_tag(name=tag,
-                                msg=msg,
-                                commit=commit,
-                                sign=options.sign_tags,
-                                keyid=options.keyid)
+                create_tag(repo, trans, tag, msg, commit, options)
+            trans.commit()
 
         force_to_branch_head(repo, options.packaging_branch)
 
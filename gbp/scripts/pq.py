@@ -32,7 +32,7 @@ from gbp.patch_series import (PatchSeries, Patch)
 from gbp.scripts.common.pq import (is_pq_branch, pq_branch_name, pq_branch_base,
                                  parse_gbp_commands, format_patch,
                                  switch_to_pq_branch, apply_single_patch,
-                                 apply_and_commit_patch, switch_pq,
+                                 import_patch_series, switch_pq,
                                  drop_pq, get_maintainer_from_control)
 from gbp.dch import extract_bts_cmds
 from gbp.tmpfile import init_tmpdir, del_tmpdir, tempfile
@@ -276,25 +276,17 @@ def import_quilt_patches(repo, branch, series, tries, options):
     for commit in commits:
         if len(commits) > 1:
             gbp.log.info("%d %s left" % (i, 'tries' if i > 1 else 'try'))
+        gbp.log.info("Trying to apply patches at '%s'" % commit)
         try:
-            gbp.log.info("Trying to apply patches at '%s'" % commit)
-            repo.create_branch(pq_branch, commit)
-        except GitRepositoryError:
-            raise GbpError("Cannot create patch-queue branch '%s'." % pq_branch)
-
-        repo.set_branch(pq_branch)
-        for patch in queue:
-            gbp.log.debug("Applying %s" % patch.path)
-            try:
-                apply_and_commit_patch(repo, patch, maintainer, patch.topic)
-            except (GbpError, GitRepositoryError) as e:
-                gbp.log.err("Failed to apply '%s': %s" % (patch.path, e))
-                repo.force_head('HEAD', hard=True)
-                repo.set_branch(branch)
-                repo.delete_branch(pq_branch)
-                break
+            # The branch is only created if all patches apply
+            import_patch_series(repo, pq_branch, commit, queue, maintainer)
+        except GitRepositoryError as e:
+            raise GbpError("Cannot create patch-queue branch '%s': %s" %
+                           (pq_branch, e))
+        except GbpError as e:
+            gbp.log.err(e)
         else:
-            # All patches applied successfully
+            repo.set_branch(pq_branch)
             break
         i-=1
     else:
@@ -312,6 +304,7 @@ def rebase_pq(repo, branch, options):
         switch_to_pq_branch(repo, branch, options)
         base = branch
     GitCommand("rebase")([base])
+    repo.invalidate_refs()
 
 
 def build_parser(name):
@@ -33,7 +33,8 @@ import gbp.log
 from gbp.patch_series import PatchSeries, Patch
 from gbp.rpm import string_to_int
 from gbp.scripts.common.pq import (is_pq_branch, pq_branch_name, pq_branch_base,
-                                   apply_and_commit_patch, drop_pq)
+                                   apply_and_commit_patch,
+                                   import_patch_series, drop_pq)
 from gbp.scripts.pq_rpm import (generate_patches, safe_patches,
                                 import_extra_files)
 from gbp.bb import bb, init_tinfoil, parse_bb, pkg_version
@@ -206,9 +207,9 @@ def import_bb_patches(cfg, repo, options):
             return
         gbp.log.info("Trying to apply patches from branch '%s' onto '%s'" %
                         (base, upstream_commit))
-        for patch in queue:
-            gbp.log.debug("Applying %s" % patch.path)
-            apply_and_commit_patch(repo, patch, fallback_author=None)
+        import_patch_series(repo, pq_branch, repo.head, queue,
+                            fallback_author=None)
+        repo.force_head('HEAD', hard=True)
     except (GbpError, GitRepositoryError) as err:
         gbp.log.err('Import failed: %s' % err)
         repo.force_head('HEAD', hard=True)
@@ -234,6 +235,7 @@ def rebase_pq(cfg, repo, options):
 
     switch_to_pq_branch(cfg, repo, base, options)
     GitCommand("rebase")([upstream_commit])
+    repo.invalidate_refs()
 
 
 def switch_pq(cfg, repo, options):
@@ -18,7 +18,7 @@
 #
 """manage patches in a patch queue"""
 
-from six.moves import configparser
+from six.moves import configparser, zip
 import bz2
 import errno
 import gzip
@@ -41,7 +41,7 @@ from gbp.rpm import (SpecFile, NoSpecError, guess_spec, guess_spec_repo,
                      spec_from_repo, string_to_int)
 from gbp.scripts.common.pq import (is_pq_branch, pq_branch_name, pq_branch_base,
             parse_gbp_commands, format_patch, format_diff,
-            apply_and_commit_patch, drop_pq)
+            apply_and_commit_patch, import_patch_series, drop_pq)
 from gbp.scripts.common.buildpackage import dump_tree
 
 
@@ -75,19 +75,52 @@ def is_ancestor(repo, parent, child):
     return merge_base == parent_sha1
 
 
+def gzip_patch(patch):
+    """
+    Compress a patch file with I{gzip -n}, replacing it with I{<patch>.gz}.
+    No file name or timestamp is stored in the gzip header so the output
+    only depends on the content of the patch. The mode and modification
+    time of the patch are kept.
+
+    @return: path to the compressed patch
+    @rtype: C{str}
+    """
+    gbp.log.debug("Compressing %s" % os.path.basename(patch))
+    try:
+        popen = subprocess.Popen(['gzip', '-n', patch],
+                                 stderr=subprocess.PIPE)
+        stderr = popen.communicate()[1]
+    except OSError as err:
+        raise GbpError("Failed to compress %s: %s" % (patch, err))
+    if popen.returncode:
+        raise GbpError("Failed to compress %s: %s" % (patch, stderr.strip()))
+    return patch + '.gz'
+
+
 def compress_patches(patches, compress_size=0):
     """
-    Rename and/or compress patches
+    Rename and/or compress patches. Patches are compressed by parallel gzip
+    processes, zlib's output differs from gzip's for bigger patches and
+    compressed patches must not change when exported again.
     """
+    # Compress if patch file is larger than "threshold" value
+    to_compress = [patch for patch in patches if compress_size and
+                        os.path.getsize(patch) > compress_size]
+    if len(to_compress) > 1:
+        from multiprocessing import cpu_count
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(min(len(to_compress), cpu_count()))
+        try:
+            pool.map(gzip_patch, to_compress)
+        finally:
+            pool.close()
+            pool.join()
+    elif to_compress:
+        gzip_patch(to_compress[0])
+
     ret_patches = []
     for patch in patches:
-        # Compress if patch file is larger than "threshold" value
-        suffix = ''
-        if compress_size and os.path.getsize(patch) > compress_size:
-            gbp.log.debug("Compressing %s" % os.path.basename(patch))
-            subprocess.Popen(['gzip', '-n', patch]).communicate()
-            suffix = '.gz'
-
+        suffix = '.gz' if patch in to_compress else ''
         ret_patches.append(os.path.basename(patch) + suffix)
     return ret_patches
 
@@ -165,9 +198,9 @@ def generate_patches(repo, start, squash, end, outdir, options):
             patches.append(patch_fn)
             start = merge_sha1
 
-    # Generate patches
-    for commit in reversed(repo.get_commits(start, end_commit)):
-        info = repo.get_commit_info(commit)
+    # Parse gbp commands of all commits
+    export = []
+    for info in reversed(repo.get_commits_info(start, end_commit)):
         cmds = {}
         _cmds, info['body'] = parse_gbp_commands(info,
                                                  'gbp',
@@ -180,14 +213,20 @@ def generate_patches(repo, start, squash, end, outdir, options):
                                                  ('if', 'ifarch'))
         cmds.update(_cmds)
         if not 'ignore' in cmds:
-            patch_fn = format_patch(outdir, repo, info, patches,
-                                    options.patch_numbers,
-                                    options.patch_ignore_path)
-            if patch_fn:
-                commands[os.path.basename(patch_fn)] = cmds
+            export.append((info, cmds))
         else:
             gbp.log.info('Ignoring commit %s' % info['id'])
 
+    # Generate patches, diffs of all commits come from one git process
+    diffs = repo.diff_commits([info['id'] for info, _cmds in export],
+                              stat=80, summary=True, text=True)
+    for (info, cmds), (_commit, diff) in zip(export, diffs):
+        patch_fn = format_patch(outdir, repo, info, patches,
+                                options.patch_numbers,
+                                options.patch_ignore_path, diff=diff)
+        if patch_fn:
+            commands[os.path.basename(patch_fn)] = cmds
+
     # Generate diff to the tree-ish object
     if end_commit != end:
         gbp.log.info("Generating diff file %s..%s" % (end_commit, end))
@@ -234,8 +273,10 @@ def update_patch_series(repo, spec, start, end, options):
 
     patches, commands = generate_patches(repo, start, squash, end,
                                          spec.specdir, options)
-    spec.update_patches(patches, commands)
-    spec.write_spec_file()
+    if spec.update_patches(patches, commands):
+        spec.write_spec_file()
+    else:
+        gbp.log.info("Patches not changed, not updating %s" % spec.specfile)
     return patches
 
 
@@ -436,10 +477,10 @@ def import_spec_patches(repo, options):
             return
         gbp.log.info("Trying to apply patches from branch '%s' onto '%s'" %
                         (base, upstream_commit))
-        for patch in queue:
-            gbp.log.debug("Applying %s" % patch.path)
-            apply_and_commit_patch(repo, patch, packager)
+        import_patch_series(repo, pq_branch, repo.head, queue, packager)
+        repo.force_head('HEAD', hard=True)
     except (GbpError, GitRepositoryError) as err:
+        repo.force_head('HEAD', hard=True)
         repo.set_branch(base)
         repo.delete_branch(pq_branch)
         raise GbpError('Import failed: %s' % err)
@@ -462,6 +503,7 @@ def rebase_pq(repo, options):
 
     switch_to_pq_branch(repo, base, options)
     GitCommand("rebase")([upstream_commit])
+    repo.invalidate_refs()
 
 
 def switch_pq(repo, options):
@@ -598,6 +640,8 @@ def convert_with_history(repo, upstream, commits, new_branch, spec_fn, options):
         tip_commit = repo.commit_tree(new_tree, msg, [tip_commit])
 
     # Import rest of the commits
+    commits_info = dict((info['id'], info) for info in
+                        repo.get_commits_info(commits[0], commits[-1]))
     for commit in commits[1:]:
         shutil.rmtree(dump_packaging_dir)
         packaging_tree = '%s:%s' % (commit, options.packaging_dir)
@@ -614,7 +658,7 @@ def convert_with_history(repo, upstream, commits, new_branch, spec_fn, options):
             gbp.log.info("Skipping commit '%s' which generated no change" %
                          commit)
         else:
-            info = repo.get_commit_info(commit)
+            info = commits_info.get(commit) or repo.get_commit_info(commit)
             msg = "%s\n\n%sAuto-imported by gbp from '%s'" % (info['subject'],
                         info['body'], commit)
             tip_commit = repo.commit_tree(new_tree, msg, [tip_commit])
@@ -658,6 +702,8 @@ switch         Switch to patch-queue branch and vice versa.""")
     parser.add_config_file_option(option_name="color-scheme",
             dest="color_scheme")
     parser.add_config_file_option(option_name="tmp-dir", dest="tmp_dir")
+    parser.add_boolean_config_file_option(option_name="spec-cache",
+            dest="spec_cache")
     parser.add_config_file_option(option_name="upstream-tag",
             dest="upstream_tag")
     parser.add_config_file_option(option_name="spec-file", dest="spec_file")
@@ -740,6 +786,9 @@ def main(argv):
         gbp.log.warn("Switching to topdir before running commands")
         os.chdir(repo.path)
 
+    if options.spec_cache:
+        SpecFile.cache.set_cache_dir(os.path.join(repo.git_dir, 'gbp-cache'))
+
     try:
         # Create base temporary directory for this run
         init_tmpdir(options.tmp_dir, prefix='pq-rpm_')
@@ -24,7 +24,6 @@ import os.path
 import pwd
 import re
 import sys
-import socket
 
 import gbp.command_wrappers as gbpc
 import gbp.log
@@ -217,8 +216,7 @@ def guess_commit(section, repo, options):
         tag_str_fields['upstreamversion'] = fields['upstreamversion']
         if 'release' in fields:
             tag_str_fields['release'] = fields['release']
-    commit = repo.find_version(options.packaging_tag,
-                                   tag_str_fields)
+    commit = repo.version_index(options.packaging_tag).find(tag_str_fields)
     if commit:
         return commit
     else:
@@ -273,16 +271,19 @@ def get_author(repo, use_git_config):
         if 'EMAIL' in os.environ:
             email = os.environ['EMAIL']
         else:
+            import socket
             email = "%s@%s" % (passwd_data.pw_name, socket.getfqdn())
 
     return author, email
 
 
 def entries_from_commits(changelog, repo, commits, options):
-    """Generate a list of formatted changelog entries from a list of commits"""
+    """
+    Generate a list of formatted changelog entries from a list of commit
+    infos (see L{gbp.git.GitRepository.get_commits_info})
+    """
     entries = []
-    for commit in commits:
-        info = repo.get_commit_info(commit)
+    for info in commits:
         entry_text = ChangelogEntryFormatter.compose(info, full=options.full,
                         ignore_re=options.ignore_regex, id_len=options.idlen,
                         meta_bts=options.meta_bts)
@@ -314,8 +315,8 @@ def generate_new_entries(changelog, repo, options, args):
         since = get_start_commit(changelog, repo, options)
         if args:
             gbp.log.info("Only looking for changes in '%s'" % ", ".join(args))
-        commits = repo.get_commits(since=since, until='HEAD', paths=args,
-                                   options=options.git_log.split(" "))
+        commits = repo.get_commits_info(since=since, until='HEAD', paths=args,
+                                        options=options.git_log.split(" "))
         commits.reverse()
         if not commits:
             gbp.log.info("No changes detected from %s to %s." % (since, 'HEAD'))
@@ -413,6 +414,8 @@ def build_parser(name):
     parser.add_config_file_option(option_name="color-scheme",
                     dest="color_scheme")
     parser.add_config_file_option(option_name="tmp-dir", dest="tmp_dir")
+    parser.add_boolean_config_file_option(option_name="spec-cache",
+                    dest="spec_cache")
     parser.add_config_file_option(option_name="vendor", action="store",
                     dest="vendor")
     parser.add_config_file_option(option_name="git-log", dest="git_log",
@@ -513,6 +516,9 @@ def main(argv):
 
         repo = RpmGitRepository('.')
         check_repo_state(repo, options)
+        if options.spec_cache:
+            SpecFile.cache.set_cache_dir(os.path.join(repo.git_dir,
+                                                      'gbp-cache'))
 
         # Find and parse spec file
         spec = parse_spec_file(repo, options)
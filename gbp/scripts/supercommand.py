@@ -78,6 +78,29 @@ def pymod_to_cmd(mod):
     return os.path.basename(mod.rsplit('.', 1)[0]).replace('_','-')
 
 
+def command_description(path):
+    """
+    Get the description of a command, i.e. the docstring of its module,
+    without importing the module and everything it depends on
+
+    @param path: path of the module implementing the command
+    @type path: C{str}
+    @return: the description, C{None} if the module has no docstring
+    @rtype: C{str}
+    """
+    import ast
+    import tokenize
+
+    with open(path) as module:
+        for tok in tokenize.generate_tokens(module.readline):
+            if tok[0] in (tokenize.COMMENT, tokenize.NL, tokenize.NEWLINE):
+                continue
+            elif tok[0] == tokenize.STRING:
+                return ast.literal_eval(tok[1])
+            break
+    return None
+
+
 def get_available_commands(path):
     cmds = []
     for f in glob.glob(os.path.join(path, '*.py')):
@@ -98,8 +121,7 @@ def list_available_commands():
         if len(cmd[0]) > maxlen:
             maxlen = len(cmd[0])
     for cmd in cmds:
-        mod = import_command(cmd[0])
-        doc = mod.__doc__
+        doc = command_description(cmd[1])
         print("    %s - %s" % (cmd[0].rjust(maxlen), doc))
     print('')
 
@@ -111,8 +133,7 @@ def supercommand(argv=None):
         usage()
         return 1
 
-    prg, cmd = argv[0:2]
-    args = argv[1:]
+    cmd = argv[1]
 
     if cmd in ['--help', '-h', 'help' ]:
         usage()
@@ -124,6 +145,29 @@ def supercommand(argv=None):
         list_available_commands()
         return 0
 
+    # Commands that may use the standard input, e.g. interactive use, run
+    # here, see gbp.daemon.forward
+    if cmd != 'daemon':
+        import gbp.daemon
+        ret = gbp.daemon.forward(argv)
+        if ret is not None:
+            return ret
+
+    return run_command(argv)
+
+
+def run_command(argv):
+    """
+    Run a gbp command in this process
+
+    @param argv: the command line, starting with the program name
+    @type argv: C{list} of C{str}
+    @return: the exit status of the command
+    @rtype: C{int}
+    """
+    cmd = argv[1]
+    args = argv[1:]
+
     try:
         module = import_command(cmd)
     except ImportError as e:
@@ -241,6 +241,7 @@ done
 %{python_sitelib}/gbp/scripts/__init__.py*
 %{python_sitelib}/gbp/scripts/clone.py*
 %{python_sitelib}/gbp/scripts/config.py*
+%{python_sitelib}/gbp/scripts/daemon.py*
 %{python_sitelib}/gbp/scripts/pull.py*
 %{python_sitelib}/gbp/scripts/supercommand.py*
 %{python_sitelib}/gbp/scripts/common/*.py*
@@ -251,6 +252,7 @@ done
 %{_mandir}/man1/gbp.1*
 %{_mandir}/man1/gbp-clone.1*
 %{_mandir}/man1/gbp-config.1*
+%{_mandir}/man1/gbp-daemon.1*
 %{_mandir}/man1/gbp-pull.1*
 %{_mandir}/man5/*.5*
 %endif
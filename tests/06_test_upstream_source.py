@@ -15,6 +15,8 @@ except ImportError:
 import tempfile
 import zipfile
 
+from gbp.errors import GbpError
+from gbp.git import GitRepository, GitTreeWriter
 from gbp.pkg import UpstreamSource
 
 class TestDir(unittest.TestCase):
@@ -119,3 +121,109 @@ class TestZip(unittest.TestCase):
         source.unpack(str(self.tmpdir))
         self.assertNotEqual(source.unpacked, None)
 
+
+class TestImportTree(unittest.TestCase):
+    """Test importing archives into git without unpacking them"""
+    def setUp(self):
+        self.tmpdir = context.new_tmpdir(__name__)
+        self.repo = GitRepository.create(self.tmpdir.join('repo'))
+
+    def tearDown(self):
+        context.teardown()
+
+    def _tarball(self, files):
+        """Create a tarball with I{files}, a C{dict} of names and content"""
+        path = self.tmpdir.join('test-1.0.tar.gz')
+        src_dir = self.tmpdir.join('src')
+        with tarfile.open(path, 'w:gz') as tar:
+            for name, content in sorted(files.items()):
+                fpath = os.path.join(src_dir, name)
+                if not os.path.isdir(os.path.dirname(fpath)):
+                    os.makedirs(os.path.dirname(fpath))
+                with open(fpath, 'w') as fobj:
+                    fobj.write(content)
+                tar.add(fpath, name)
+        return UpstreamSource(path)
+
+    def _import(self, source):
+        """Import a source, return the paths in the resulting tree"""
+        writer = GitTreeWriter(self.repo)
+        try:
+            source.import_tree(writer)
+            self._tree = writer.write()
+        finally:
+            writer.close()
+        return sorted(entry[3] for entry in
+                      self.repo.list_tree(self._tree, recurse=True))
+
+    def test_git_metadata(self):
+        """Nested git metadata is dropped, top-level metadata is refused"""
+        source = self._tarball({'test-1.0/foo': 'foo\n',
+                                'test-1.0/sub/.git/config': ''})
+        self.assertEqual(self._import(source), ['foo'])
+
+        source = self._tarball({'test-1.0/foo': 'foo\n',
+                                'test-1.0/.git/config': ''})
+        self.assertRaises(GbpError, self._import, source)
+
+    def _blob(self, tree_path):
+        """Content of a file in the last imported tree"""
+        return self.repo.show('%s:%s' % (self._tree, tree_path))
+
+    def test_conversion(self):
+        """Git attributes and line ending conversion are applied"""
+        source = self._tarball({'test-1.0/.gitattributes': '*.txt text\n',
+                                'test-1.0/a.txt': 'a\r\n',
+                                'test-1.0/b.bin': 'b\r\n'})
+        self.assertEqual(self._import(source),
+                         ['.gitattributes', 'a.txt', 'b.bin'])
+        self.assertEqual(self._blob('a.txt'), 'a\n')
+        self.assertEqual(self._blob('b.bin'), 'b\r\n')
+
+        source = self._tarball({'test-1.0/a.txt': 'a\r\n'})
+        self.assertEqual(self._import(source), ['a.txt'])
+        self.assertEqual(self._blob('a.txt'), 'a\r\n')
+        self.repo._git_command('config', ['core.autocrlf', 'input'])
+        self.assertEqual(self._import(source), ['a.txt'])
+        self.assertEqual(self._blob('a.txt'), 'a\n')
+
+    def test_empty(self):
+        """An archive with all files filtered out gives the empty tree"""
+        source = self._tarball({'test-1.0/foo': 'foo\n'})
+        writer = GitTreeWriter(self.repo)
+        source.import_tree(writer, ['foo'])
+        # Git must not wait for input from our stdin
+        read_fd, write_fd = os.pipe()
+        stdin_fd = os.dup(0)
+        os.dup2(read_fd, 0)
+        try:
+            self.assertEqual(writer.write(),
+                             '4b825dc642cb6eb9a060e54bf8d69288fbee4904')
+        finally:
+            os.dup2(stdin_fd, 0)
+            for fd in (read_fd, write_fd, stdin_fd):
+                os.close(fd)
+            writer.close()
+
+    def test_filtered_hard_link(self):
+        """Hard links to filtered files are imported like tar extracts them"""
+        src_dir = self.tmpdir.join('test-1.0')
+        os.mkdir(src_dir)
+        with open(os.path.join(src_dir, 'foo'), 'w') as fobj:
+            fobj.write('foo\n')
+        os.link(os.path.join(src_dir, 'foo'), os.path.join(src_dir, 'bar'))
+        os.link(os.path.join(src_dir, 'foo'), os.path.join(src_dir, 'baz'))
+        path = self.tmpdir.join('test-1.0.tar')
+        with tarfile.open(path, 'w') as tar:
+            for name in ['foo', 'bar', 'baz']:
+                tar.add(os.path.join(src_dir, name), 'test-1.0/' + name)
+        source = UpstreamSource(path)
+
+        writer = GitTreeWriter(self.repo)
+        source.import_tree(writer, ['foo'])
+        tree = writer.write()
+        writer.close()
+        self.assertEqual(self.repo.list_tree(tree),
+                         [['100644', 'blob',
+                           '257cc5642cb1a054f08cc83f2d943e56fd3ebe99', name]
+                          for name in ['bar', 'baz']])
@@ -5,12 +5,15 @@
 from . import context
 
 import os
+from StringIO import StringIO
 
 import gbp.log
 import gbp.git
+from gbp.git.modifier import GitModifier
 
 repo = None
 fastimport = None
+marks = None
 tf_name = 'testfile'
 tl_name = 'a_testlink'
 
@@ -45,6 +48,38 @@ def test_add_symlink():
     fastimport.start_commit('master', author, "a 2nd commit")
     fastimport.add_symlink(tl_name, tf_name)
 
+def test_marks():
+    """Refer to marked blobs and commits, read back the sha1s"""
+    global marks
+    blob = fastimport.add_blob(StringIO('foo\n'), 4)
+    author = GitModifier('Joe Author', 'joe@example.com', '1000000000 +0200')
+    committer = repo.get_author_info()
+    commit = fastimport.start_commit('master', committer, "marked commit",
+                                     author=author)
+    fastimport.modify('foo', fastimport.m_exec, blob)
+    side = fastimport.start_commit('side', committer, "root commit",
+                                   parents=[])
+    fastimport.modify('bar', fastimport.m_regular, blob)
+    fastimport.modify('baz', fastimport.m_regular, blob)
+    fastimport.delete('baz')
+    merge = fastimport.start_commit('master', committer, "merge commit",
+                                    parents=[commit, side])
+    fastimport.modify('bar', fastimport.m_regular, blob)
+    tag = fastimport.create_tag('v1.0', merge, "a tag")
+    marks = dict(blob=blob, commit=commit, side=side, merge=merge, tag=tag)
+    for key, mark in marks.items():
+        marks[key] = fastimport.get_mark(mark)
+        assert len(marks[key]) == 40, "Invalid sha1 for %s" % key
+    assert fastimport.cat_blob(blob) == 'foo\n'
+    assert fastimport.cat_blob(marks['blob']) == 'foo\n'
+
+def test_checkpoint():
+    """Refs are updated on checkpoint"""
+    fastimport.checkpoint()
+    assert repo.has_tag('v1.0')
+    assert repo.rev_parse('master') == marks['merge']
+    assert repo.rev_parse('side') == marks['side']
+
 def test_close():
     fastimport.close()
 
@@ -58,3 +93,18 @@ def test_result():
     assert os.path.lexists(testlink), "%s doesn't exist" % testlink
     assert os.readlink(testlink) == tf_name
 
+def test_result_marks():
+    info = repo.get_commit_info(marks['commit'])
+    assert info['author'].name == 'Joe Author'
+    assert info['author'].date == '1000000000 +0200'
+    parents = repo._git_getoutput('rev-list', ['--parents', '-n1',
+                                               marks['merge']])[0][0].split()
+    assert parents == [marks['merge'], marks['commit'], marks['side']]
+    assert repo._git_getoutput('rev-list', ['--parents', '-n1',
+                                            marks['side']])[0][0].split() == \
+            [marks['side']]
+    assert repo.list_tree(marks['side']) == \
+            [['100644', 'blob', marks['blob'], 'bar']]
+    assert ['100755', 'blob', marks['blob'], 'foo'] in \
+            repo.list_tree(marks['commit'])
+    assert repo.rev_parse('v1.0^{}') == marks['merge']
@@ -42,3 +42,22 @@ class TestPatch(unittest.TestCase):
                          "It can span several lines.\n",
                          p.long_desc)
         self.assertEqual('Sat, 24 Dec 2011 12:05:53 +0100', p.date)
+
+    def test_mail_header(self):
+        """Get the patch information from a format-patch style header"""
+        patchfile = os.path.join(self.data_dir, "patch2.patch")
+        p = Patch(patchfile)
+        self.assertEqual('Fix f\xc3\xb6o', p.subject)
+        self.assertEqual('Guido G\xc3\xbcnther', p.author)
+        self.assertEqual('agx@sigxcpu.org', p.email)
+        self.assertEqual("This is the long description.\n", p.long_desc)
+
+    def test_mailinfo_compat(self):
+        """Check that the patch information matches git-mailinfo's"""
+        for name in ["patch1.diff", "patch2.patch", "patch3.patch"]:
+            p = Patch(os.path.join(self.data_dir, name))
+            p._read_info()
+            info, long_desc = p.info, p.long_desc
+            p._read_mailinfo()
+            self.assertEqual(p.info, info)
+            self.assertEqual(p.long_desc, long_desc)
@@ -367,3 +367,10 @@ class TestScriptDch(DebianGitTestRepo):
         self.assertEqual(header.lastindex, 1)
         self.assertIsNotNone(re.search(snap_mark + header.group(1), lines[2]))
         self.assertIn("""  * added debian/control\n""", lines)
+
+
+    def test_dch_main_invalid_upstream_version(self):
+        """Test dch.py like gbp dch script does: invalid upstream version"""
+        self.add_file("baz", "foo")
+        self.repo.create_tag("upstream/1.1a%", msg="upstream version 1.1a%")
+        self.assertEqual(dch.main(self.options), 1)
@@ -4,6 +4,7 @@
 
 from . import context
 
+import itertools
 import os, tempfile
 # Try unittest2 for CentOS
 try:
@@ -86,3 +87,52 @@ class TestDpkgCompareVersions(unittest.TestCase):
     def testBadVersion(self):
         self.assertRaises(CommandExecFailed, self.cmp, '_', '_ _')
 
+
+class TestDebianVersion(unittest.TestCase):
+    """Test L{gbp.deb.version.DebianVersion}"""
+
+    def test_compare(self):
+        """Compare versions"""
+        self.assertEqual(gbp.deb.compare_versions('1.0', '1.0'), 0)
+        self.assertEqual(gbp.deb.compare_versions('1.0', '1.0-0'), 0)
+        self.assertEqual(gbp.deb.compare_versions('1.0~rc1', '1.0'), -1)
+        self.assertEqual(gbp.deb.compare_versions('1:0.1', '2.0'), 1)
+        self.assertEqual(gbp.deb.compare_versions('1.0a', '1.0+'), -1)
+        self.assertEqual(gbp.deb.compare_versions('1.010', '1.9'), 1)
+
+    def test_bad_version(self):
+        """Invalid versions can't be compared"""
+        for version in ['', '_ _', ':1', 'a:1', '1:', '1-']:
+            self.assertRaises(gbp.deb.DebianVersionError,
+                              gbp.deb.DebianVersion, version)
+
+    def test_sort(self):
+        """Sort items by version"""
+        dscs = [ ('foo', '1.0-1'), ('bar', '1.0~rc1-2'), ('baz', '1:0.9') ]
+        self.assertEqual(gbp.deb.sort_versions(dscs, key=lambda d: d[1]),
+                         [ ('bar', '1.0~rc1-2'), ('foo', '1.0-1'),
+                           ('baz', '1:0.9') ])
+
+    @unittest.skipIf(not os.path.exists('/usr/bin/dpkg'), 'Dpkg not found')
+    def test_dpkg_conformance(self):
+        """Check that all versions of a small alphabet sort like in dpkg"""
+        alphabet = ['0', '1', '01', 'a', 'B', '~', '.', '+', '-', ':']
+        versions = set()
+        for length in range(1, 4):
+            for chars in itertools.product(alphabet, repeat=length):
+                version = ''.join(chars)
+                if version.startswith('-'):
+                    # Taken as an option by dpkg
+                    continue
+                try:
+                    gbp.deb.DebianVersion(version)
+                except gbp.deb.DebianVersionError:
+                    continue
+                versions.add(version)
+        versions = gbp.deb.sort_versions(versions)
+        dpkg = gbp.deb.DpkgCompareVersions()
+        for version1, version2 in zip(versions, versions[1:]):
+            self.assertEqual(gbp.deb.compare_versions(version1, version2),
+                             dpkg(version1, version2),
+                             "%s vs. %s" % (version1, version2))
+
@@ -29,6 +29,7 @@ except ImportError:
 from gbp.scripts.pq import generate_patches, export_patches
 import gbp.scripts.common.pq as pq
 import gbp.patch_series
+import gbp.errors
 
 class TestApplyAndCommit(testutils.DebianGitTestRepo):
     """Test L{gbp.pq}'s apply_and_commit"""
@@ -83,6 +84,44 @@ class TestApplyAndCommit(testutils.DebianGitTestRepo):
         self.assertEqual(info['author'].email, 'gg@godiug.net')
         self.assertIn('foo', self.repo.list_files())
 
+class TestImportPatchSeries(testutils.DebianGitTestRepo):
+    """Test L{gbp.pq}'s import_patch_series"""
+
+    def setUp(self):
+        testutils.DebianGitTestRepo.setUp(self)
+        self.add_file('bar')
+
+    def test_import_patch_series(self):
+        """Test importing a series onto a new branch"""
+        patch = gbp.patch_series.Patch(_patch_path('foo.patch'),
+                                       topic='foobar')
+        base = self.repo.head
+
+        head = pq.import_patch_series(self.repo, 'pq', base, [patch], None)
+        self.assertEqual(self.repo.rev_parse('pq'), head)
+        self.assertEqual(self.repo.get_merge_base(base, head), base)
+        self.assertIn('foo', [obj[3] for obj in self.repo.list_tree('pq')])
+        info = self.repo.get_commit_info(head)
+        self.assertEqual(info['author'].email, patch.email)
+        self.assertIn('Gbp-Pq: Topic foobar', info['body'])
+        # Working copy and index are left alone
+        self.assertEqual(self.repo.head, base)
+        self.assertNotIn('foo', self.repo.list_files())
+        self.assertTrue(self.repo.is_clean()[0])
+
+    def test_failed_patch(self):
+        """Test that nothing is committed if a patch doesn't apply"""
+        patch = gbp.patch_series.Patch(_patch_path('foo.patch'))
+        self.add_file('foo', 'conflict')
+
+        with self.assertRaises(gbp.errors.GbpError):
+            pq.import_patch_series(self.repo, 'pq', self.repo.head,
+                                   [patch], None)
+        self.assertFalse(self.repo.has_branch('pq'))
+        # The private index is removed
+        self.assertEqual([name for name in os.listdir(self.repo.git_dir)
+                            if name.startswith('gbp_pq_')], [])
+
 class TestApplySinglePatch(testutils.DebianGitTestRepo):
     """Test L{gbp.pq}'s apply_single_patch"""
 
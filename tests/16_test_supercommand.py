@@ -15,6 +15,10 @@
 #    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 """Test L{gbp} command wrapper"""
 
+from . import context
+
+import os
+import subprocess
 import sys
 # Try unittest2 for CentOS
 try:
@@ -57,3 +61,60 @@ class TestSuperCommand(unittest.TestCase):
         self.assertEqual(gbp.scripts.supercommand.supercommand(
                          ['argv0']), 1)
 
+    def test_command_description(self):
+        """Test getting the description of a command without importing it"""
+        path = os.path.join(context.projectdir, 'gbp', 'scripts', 'config.py')
+        self.assertEqual(gbp.scripts.supercommand.command_description(path),
+                         "Query and display config file values")
+
+
+class TestStartup(unittest.TestCase):
+    """
+    Test the startup time budget of the commands: starting a command must
+    not import modules that take long to load and are only needed by some
+    code paths
+    """
+    heavy = set(['rpm', 'rpm_tizen', 'bb', 'email.message', 'urllib2',
+                 'tarfile', 'zipfile', 'multiprocessing', 'socket',
+                 'tokenize'])
+    # Heavy modules a command can't do without
+    allowed = {'daemon': set(['socket'])}
+
+    def _loaded_modules(self, code):
+        """Run code in a new interpreter, return the modules it loaded"""
+        env = dict(os.environ)
+        pythonpath = [context.projectdir]
+        if env.get('PYTHONPATH'):
+            pythonpath.append(env['PYTHONPATH'])
+        env['PYTHONPATH'] = os.pathsep.join(pythonpath)
+        env['GBP_DAEMON_SOCKET'] = os.path.join(context.projectdir, 'nosocket')
+        code += ("\nimport sys\n"
+                 "print('\\n'.join([m for m in sys.modules if sys.modules[m]]))")
+        popen = subprocess.Popen([sys.executable, '-c', code], env=env,
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = popen.communicate()
+        self.assertEqual(popen.returncode, 0, err)
+        return set(out.split())
+
+    def test_import_command(self):
+        """Test the modules loaded when starting a command"""
+        path = os.path.dirname(gbp.scripts.supercommand.__file__)
+        for cmd, dummy in gbp.scripts.supercommand.get_available_commands(path):
+            loaded = self._loaded_modules(
+                "import gbp.scripts.supercommand as s\n"
+                "import gbp.daemon\n"
+                "gbp.daemon.forward(['gbp', %r])\n"
+                "s.import_command(%r)" % (cmd, cmd))
+            over_budget = loaded & (self.heavy - self.allowed.get(cmd, set()))
+            self.assertEqual(over_budget, set(),
+                             "Starting '%s' loads %s" % (cmd, sorted(over_budget)))
+
+    def test_list_commands(self):
+        """Test that listing commands doesn't import them"""
+        loaded = self._loaded_modules(
+            "import gbp.scripts.supercommand as s\n"
+            "s.supercommand(['gbp', 'list-cmds'])")
+        self.assertIn('gbp.scripts.supercommand', loaded)
+        self.assertEqual([mod for mod in loaded
+                            if mod.startswith('gbp.scripts.')],
+                         ['gbp.scripts.supercommand'])
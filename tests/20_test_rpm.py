@@ -25,6 +25,8 @@ from nose.tools import assert_raises, eq_, ok_ # pylint: disable=E0611
 from gbp.errors import GbpError
 from gbp.rpm import (SpecFile, SrcRpmFile, NoSpecError, guess_spec,
                      guess_spec_repo, spec_from_repo)
+from gbp.rpm.git import RpmGitRepository
+from gbp.rpm.version import RpmVersion, compare_versions, sort_versions
 from gbp.git.repository import GitRepository
 
 # Disable "Method could be a function"
@@ -173,6 +175,62 @@ class TestSpecFile(RpmTestBase):
         eq_(spec.specdir, None)
         eq_(spec.name, 'gbp-test')
 
+    def test_forward_macro_refs(self):
+        """Test detection of macros used before their definition"""
+        # pylint: disable=W0212
+        check = SpecFile._has_forward_macro_refs
+        spec_filepath = os.path.join(SPEC_DIR, 'gbp-test2.spec')
+        with open(spec_filepath, 'r') as spec_fd:
+            eq_(check(spec_fd.readlines()), False)
+        eq_(check(['Source: %{name}.tar.gz\n', 'Name: foo\n']), True)
+        eq_(check(['%define foo %{?bar}\n', '%global bar 1\n']), True)
+        eq_(check(['%global bar 1\n', '%define foo %{?bar}\n']), False)
+        eq_(check(['%include common.inc\n']), True)
+        eq_(check(['%{lua:\n', 'rpm.define("foo 1")\n', '}\n']), True)
+
+        # Forward references must be expanded in any case
+        spec = SpecFile(filedata='Version: %{ver}\n%define ver 1.0\n'
+                                 'Name: foo\nRelease: 1\nLicense: GPL\n'
+                                 'Summary: foo\n%description\nfoo\n')
+        eq_(spec.upstreamversion, '1.0')
+        ok_(spec.parse_time >= 0)
+
+    def test_parse_cache(self):
+        """Test caching of librpm parse results"""
+        spec_filepath = os.path.join(SPEC_DIR, 'gbp-test.spec')
+        with open(spec_filepath, 'r') as spec_fd:
+            spec_data = spec_fd.read()
+        SpecFile.cache.clear()
+        spec = SpecFile(spec_filepath)
+        keys = SpecFile.cache.keys()
+        eq_(len(keys), 1)
+        eq_(SpecFile(spec_filepath).name, spec.name)
+        eq_(SpecFile.cache.keys(), keys)
+
+        # Spec files running programs are never cached
+        SpecFile.cache.clear()
+        SpecFile(filedata='%global shell %(echo 1)\n' + spec_data)
+        eq_(SpecFile.cache.keys(), [])
+        # Nor ones depending on the environment
+        SpecFile(filedata='%global user %{expand:%%{getenv:USER}}\n' +
+                          spec_data)
+        eq_(SpecFile.cache.keys(), [])
+
+        # Changes to the macro files invalidate the cache
+        old_home = os.environ.get('HOME')
+        os.environ['HOME'] = os.path.abspath(self.tmpdir)
+        try:
+            # pylint: disable=W0212
+            stamp = SpecFile._macro_files_stamp()
+            with open(os.path.join(self.tmpdir, '.rpmmacros'), 'w') as macros:
+                macros.write('%foo bar\n')
+            ok_(SpecFile._macro_files_stamp() != stamp)
+        finally:
+            if old_home is None:
+                del os.environ['HOME']
+            else:
+                os.environ['HOME'] = old_home
+
     def test_update_spec(self):
         """Test spec autoupdate functionality"""
         # Create temporary spec file
@@ -181,10 +239,17 @@ class TestSpecFile(RpmTestBase):
 
         reference_spec = os.path.join(SPEC_DIR, 'gbp-test-reference.spec')
         spec = SpecFile(tmp_spec)
-        spec.update_patches(['new.patch'], {})
+        eq_(spec.update_patches(['new.patch'], {}), True)
         spec.write_spec_file()
         eq_(filecmp.cmp(tmp_spec, reference_spec), True)
 
+        # Updating with the same patches again should not change anything
+        spec = SpecFile(tmp_spec)
+        eq_(spec.update_patches(['new.patch'], {}), False)
+        eq_(spec.update_patches(['new.patch', 'new2.patch'], {}), True)
+        eq_(spec.update_patches(['new.patch'], {}), True)
+        eq_(spec.update_patches(['new.patch'], {}), False)
+
         # Test adding the VCS tag and adding changelog
         reference_spec = os.path.join(SPEC_DIR, 'gbp-test-reference2.spec')
         spec.set_tag('VCS', None, 'myvcstag')
@@ -405,4 +470,92 @@ class TestUtilityFunctions(RpmTestBase):
         spec = spec_from_repo(repo, 'HEAD', 'packaging/gbp-test.spec')
         eq_(spec.specfile, 'gbp-test.spec')
 
+
+class TestRpmVersion(object):
+    """Test L{gbp.rpm.version}"""
+
+    def test_compare(self):
+        """Test version comparison against rpmvercmp() results"""
+        vectors = [('1.0', '1.0', 0), ('1.0', '2.0', -1), ('2.0.1', '2.0', 1),
+                   ('5.5p1', '5.5p2', -1), ('10xyz', '10.1xyz', -1),
+                   ('xyz10', 'xyz10.1', -1), ('1.0', '1.0a', -1),
+                   ('1.0a', '1.0.1', -1), ('a', '1', -1), ('1.0_1', '1.0.1', 0),
+                   ('1.0~rc1', '1.0', -1), ('1.0~rc1', '1.0~rc1~git', 1),
+                   ('1.0^', '1.0', 1), ('1.0^git1', '1.01', -1),
+                   ('1.0^git1~pre', '1.0^git1', -1), ('1:1.0', '2.0', 1),
+                   ('0:1.0', '1.0', 0), ('1.0', '1.0-1', -1),
+                   ('1.0-1', '1.0-1.1', -1)]
+        for ver1, ver2, result in vectors:
+            eq_(compare_versions(ver1, ver2), result,
+                "%s vs. %s" % (ver1, ver2))
+            eq_(compare_versions(ver2, ver1), -result,
+                "%s vs. %s" % (ver2, ver1))
+
+    def test_fields(self):
+        """Test creating versions from version components"""
+        ver = RpmVersion.from_fields(dict(epoch='2', upstreamversion='1.0',
+                                          release='3'))
+        eq_(str(ver), '2:1.0-3')
+        eq_(ver, RpmVersion.parse('2:1.0-3'))
+        ver = RpmVersion.from_fields(dict(upstreamversion='1.0', release=''))
+        eq_(ver.release, None)
+        eq_(str(ver), '1.0')
+
+    def test_sort(self):
+        """Test sorting by version"""
+        items = [('b', '1.0-1'), ('a', '1.0~rc1'), ('c', '1:0.1')]
+        eq_(sort_versions(items, key=lambda item: item[1]),
+            [('a', '1.0~rc1'), ('b', '1.0-1'), ('c', '1:0.1')])
+        eq_(sort_versions(['1.0', '1.1'], reverse=True), ['1.1', '1.0'])
+
+
+class TestRpmTagIndex(RpmTestBase):
+    """Test L{gbp.rpm.git.RpmTagIndex}"""
+
+    def test_version_index(self):
+        """Test looking up versions from the tags of a repository"""
+        repo = RpmGitRepository.create(self.tmpdir)
+        with open(os.path.join(repo.path, 'foo.txt'), 'w') as fobj:
+            fobj.write('bar\n')
+        repo.add_files('foo.txt')
+        repo.commit_all('First')
+        first = repo.head
+        repo.create_tag('vendor/1.0_rc1-1', msg='Annotated')
+        repo.create_tag('vendor/1%1.0-1_1400000000')
+        with open(os.path.join(repo.path, 'foo.txt'), 'w') as fobj:
+            fobj.write('baz\n')
+        repo.commit_all('Second')
+        second = repo.head
+        repo.create_tag('vendor/1.0-1')
+        repo.create_tag('unrelated')
+
+        index = repo.version_index('%(vendor)s/%(version)s')
+        # Versions order like the tag names, '_' may stand for a real '_'
+        eq_([str(ver) for ver in index.versions()],
+            ['1.0-1', '1.0_rc1-1', '1:1.0-1_1400000000'])
+        eq_(index.find(dict(upstreamversion='1.0~rc1', release='1')), first)
+        # Versions that rpm considers equal but are tagged differently
+        for upstreamversion, release in (('1.0rc1', '1'), ('1.0.rc1', '1'),
+                                         ('1.0', '01')):
+            eq_(index.find_tag(dict(upstreamversion=upstreamversion,
+                                    release=release)), None)
+        repo.create_tag('vendor/1.0.rc1-1')
+        index = repo.version_index('%(vendor)s/%(version)s')
+        eq_(index.find_tag(dict(upstreamversion='1.0.rc1', release='1')),
+            'vendor/1.0.rc1-1')
+        eq_(index.find_tag(dict(upstreamversion='1.0~rc1', release='1')),
+            'vendor/1.0_rc1-1')
+        # Epoch 0 equals a missing epoch
+        eq_(index.find_tag(dict(epoch='0', upstreamversion='1.0',
+                                release='1')), 'vendor/1.0-1')
+        eq_(index.find(dict(upstreamversion='1.0', release='2')), None)
+        eq_(index.find(dict(upstreamversion='1.0', release='1',
+                            vendor='other')), None)
+
+        # Time-stamped tags are found with their time stamp
+        index = repo.version_index('%(vendor)s/%(version)s~%(stamp)s')
+        eq_(index.find_tag(dict(epoch='1', upstreamversion='1.0',
+                                release='1')),
+            'vendor/1%1.0-1_1400000000')
+
 # vim:et:ts=4:sw=4:et:sts=4:ai:set list listchars=tab\:»·,trail\:·:
@@ -0,0 +1,111 @@
+# vim: set fileencoding=utf-8 :
+# (C) 2026 agent <agent@local>
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""Test the process I/O of L{GitRepository} with big amounts of data"""
+
+from . import context
+from . import testutils
+
+import hashlib
+import signal
+import time
+
+import gbp.log
+import gbp.git
+
+
+class TestGitInout(testutils.DebianGitTestRepo):
+    """Test passing multi-megabyte data to and from git commands"""
+
+    # Size of the test data and number of files in the test tree
+    data_size = 8 * 1024 * 1024
+    num_files = 100000
+
+    def _big_blob(self):
+        """Write a big blob to the repository"""
+        data = ''.join(['line %d\n' % i for i in
+                        range(self.data_size // 10)])
+        out, err, ret = self.repo._git_inout('hash-object',
+                                             ['-w', '--stdin'],
+                                             data, capture_stderr=True)
+        self.assertEqual(ret, 0, err)
+        return data, out.strip()
+
+    def _big_tree(self):
+        """Write a tree with lots of entries to the repository"""
+        blob = self.repo._git_inout('hash-object', ['-w', '--stdin'],
+                                    'foo\n')[0].strip()
+        entries = ''.join(['100644 blob %s\tfile%06d\0' % (blob, i) for i in
+                           range(self.num_files)])
+        out, err, ret = self.repo._git_inout('mktree', ['-z'], entries,
+                                             capture_stderr=True)
+        self.assertEqual(ret, 0, err)
+        return blob, out.strip()
+
+    def test_big_input_output(self):
+        """Write and read back multi-megabyte data"""
+        data, sha1 = self._big_blob()
+        self.assertEqual(sha1, hashlib.sha1('blob %d\0%s' %
+                                            (len(data), data)).hexdigest())
+        start = time.time()
+        out, err, ret = self.repo._git_inout('cat-file', ['blob', sha1],
+                                             capture_stderr=True)
+        gbp.log.debug("Read %d bytes in %.3fs" % (len(out),
+                                                  time.time() - start))
+        self.assertEqual(ret, 0)
+        self.assertEqual(out, data)
+        self.assertEqual(err, '')
+
+    def test_output_lines(self):
+        """Stream output of a git command line by line"""
+        data, sha1 = self._big_blob()
+        lines = list(self.repo._git_inout_lines('cat-file', ['blob', sha1]))
+        self.assertEqual(lines, data.splitlines())
+
+    def test_output_error(self):
+        """Error of a git command that is streamed"""
+        with self.assertRaises(gbp.git.GitRepositoryError) as ctx:
+            list(self.repo._git_inout_lines('cat-file', ['blob', 'foo'],
+                                            capture_stderr=True))
+        self.assertTrue('foo' in ctx.exception.stderr)
+
+    def test_list_big_tree(self):
+        """List a tree with lots of entries"""
+        blob, tree = self._big_tree()
+        start = time.time()
+        entries = self.repo.list_tree(tree)
+        gbp.log.debug("Listed %d files in %.3fs" % (len(entries),
+                                                    time.time() - start))
+        self.assertEqual(len(entries), self.num_files)
+        self.assertEqual(entries[0], ['100644', 'blob', blob, 'file000000'])
+        self.assertEqual(entries[-1][3], 'file%06d' % (self.num_files - 1))
+
+    def test_bidirectional(self):
+        """Write lots of input to a command producing lots of output"""
+        def timeout(*dummy):
+            raise AssertionError("Deadlock in passing data to git")
+
+        blob = self.repo._git_inout('hash-object', ['-w', '--stdin'],
+                                    'foo\n')[0].strip()
+        old_handler = signal.signal(signal.SIGALRM, timeout)
+        signal.alarm(30)
+        try:
+            out, err, ret = self.repo._git_inout('cat-file', ['--batch'],
+                                                 (blob + '\n') * 20000)
+        finally:
+            signal.alarm(0)
+            signal.signal(signal.SIGALRM, old_handler)
+        self.assertEqual(ret, 0)
+        self.assertEqual(out, '%s blob 4\nfoo\n\n' % blob * 20000)
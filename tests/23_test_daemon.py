@@ -0,0 +1,288 @@
+# vim: set fileencoding=utf-8 :
+# (C) 2026 agent <agent@local>
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""Test L{gbp.daemon}"""
+
+from . import context
+
+import os
+import pty
+import select
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+# Try unittest2 for CentOS
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+from six import StringIO
+
+import gbp.daemon
+import gbp.scripts.daemon
+from gbp.git.repository import GitRepository
+from gbp.scripts.daemon import Server
+
+
+class TestDaemon(unittest.TestCase):
+    """Test forwarding commands to L{gbp.scripts.daemon.Server}"""
+
+    def setUp(self):
+        self.tmpdir = context.new_tmpdir(__name__)
+        self.socket = self.tmpdir.join('gbp.sock')
+        self.repo = GitRepository.create(self.tmpdir.join('repo'))
+        self.cwd = os.getcwd()
+        self.server = None
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        if self.server:
+            os.kill(self.server, signal.SIGTERM)
+            os.waitpid(self.server, 0)
+        context.teardown()
+
+    def _start_server(self, run_command=None):
+        """Start a server, running commands with I{run_command} if given"""
+        self.server = os.fork()
+        if not self.server:
+            if run_command:
+                gbp.scripts.daemon.run_command = run_command
+            status = 0
+            try:
+                server = Server(self.socket, idle_timeout=60)
+                signal.signal(signal.SIGTERM, server.stop)
+                server.serve()
+            except BaseException:
+                status = 1
+            os._exit(status)
+        for dummy in range(100):
+            if os.path.exists(self.socket):
+                break
+            time.sleep(0.05)
+
+    def _forward(self, argv):
+        """Forward a command, return its status, stdout and stderr"""
+        old_stdout, old_stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = StringIO(), StringIO()
+        # Only commands without input are forwarded
+        stdin = os.dup(0)
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        try:
+            ret = gbp.daemon.forward(argv, self.socket)
+            return ret, sys.stdout.getvalue(), sys.stderr.getvalue()
+        finally:
+            sys.stdout, sys.stderr = old_stdout, old_stderr
+            os.dup2(stdin, 0)
+            os.close(stdin)
+            os.close(devnull)
+
+    @staticmethod
+    def _wait_exit(pid):
+        """Wait for a process that isn't our child to exit"""
+        for dummy in range(100):
+            try:
+                with open('/proc/%d/stat' % pid) as stat:
+                    if stat.read().split(') ')[1].startswith('Z'):
+                        return True
+            except IOError:
+                return True
+            time.sleep(0.05)
+        return False
+
+    def test_no_server(self):
+        """Test that commands aren't forwarded without a server"""
+        self.assertIsNone(gbp.daemon.forward(['gbp', 'config'], self.socket))
+        self.assertIsNone(gbp.daemon.forward(['gbp', 'config'], ''))
+
+    def test_interactive(self):
+        """Test that commands that may read input aren't forwarded"""
+        # A server that never answers, forwarding would hang
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.socket)
+        sock.listen(1)
+        master, slave = pty.openpty()
+        pipe_r, pipe_w = os.pipe()
+        env = dict(os.environ, GBP_DAEMON_SOCKET=self.socket,
+                   PYTHONPATH=context.projectdir)
+        try:
+            # From a terminal or a pipe
+            for stdin in (slave, pipe_r):
+                proc = subprocess.Popen([sys.executable, '-c',
+                                         'import sys\n'
+                                         'from gbp.scripts.supercommand '
+                                         'import supercommand\n'
+                                         'sys.exit(supercommand(["gbp", '
+                                         '"config", "pq.color"]))'],
+                                        stdin=stdin, stdout=subprocess.PIPE,
+                                        cwd=self.repo.path, env=env)
+                for dummy in range(200):
+                    if proc.poll() is not None:
+                        break
+                    time.sleep(0.05)
+                else:
+                    proc.kill()
+                    proc.wait()
+                self.assertEqual((proc.returncode, proc.stdout.read()),
+                                 (0, 'pq.color=auto\n'))
+                self.assertEqual(select.select([sock], [], [], 0)[0], [])
+        finally:
+            for fd in (master, slave, pipe_r, pipe_w):
+                os.close(fd)
+            sock.close()
+
+    def test_forward(self):
+        """Test running commands in the server"""
+        self._start_server()
+        os.chdir(self.repo.path)
+        self.assertEqual(self._forward(['gbp', 'config', 'pq.color']),
+                         (0, 'pq.color=auto\n', ''))
+        ret, out, err = self._forward(['gbp', 'notacommand'])
+        self.assertEqual(ret, 2)
+        self.assertIn("'notacommand' is not a valid command", err)
+        # The server survives the commands and cleans up on exit
+        server, self.server = self.server, None
+        os.kill(server, signal.SIGTERM)
+        self.assertEqual(os.waitpid(server, 0)[1], 0)
+        self.assertFalse(os.path.exists(self.socket))
+
+    def test_background_process(self):
+        """Test that programs outliving a command don't block the server"""
+        def run_command(argv):
+            subprocess.Popen(['sleep', '30'], close_fds=False)
+            return 0
+
+        def timeout(*dummy):
+            raise AssertionError("Server doesn't respond")
+
+        self._start_server(run_command)
+        old_handler = signal.signal(signal.SIGALRM, timeout)
+        signal.alarm(10)
+        try:
+            self.assertEqual(self._forward(['gbp', 'config']), (0, '', ''))
+            # Let the server collect the result of the first command
+            time.sleep(0.5)
+            self.assertEqual(self._forward(['gbp', 'config']), (0, '', ''))
+        finally:
+            signal.alarm(0)
+            signal.signal(signal.SIGALRM, old_handler)
+
+    def test_other_code(self):
+        """Test that clients using other gbp code run commands locally"""
+        self._start_server()
+        orig_code_identity = gbp.daemon.code_identity
+        gbp.daemon.code_identity = lambda: 'other'
+        try:
+            self.assertEqual(self._forward(['gbp', 'config']),
+                             (None, '', ''))
+        finally:
+            gbp.daemon.code_identity = orig_code_identity
+
+    def test_signals(self):
+        """Test that commands are killed with their client"""
+        pidfile = self.tmpdir.join('pid')
+
+        def run_command(argv):
+            proc = subprocess.Popen(['sleep', '30'])
+            with open(pidfile, 'w') as fobj:
+                fobj.write(str(proc.pid))
+            return proc.wait()
+
+        def wait_command():
+            for dummy in range(100):
+                if os.path.exists(pidfile):
+                    with open(pidfile) as fobj:
+                        pid = fobj.read()
+                    if pid:
+                        os.unlink(pidfile)
+                        return int(pid)
+                time.sleep(0.05)
+
+        self._start_server(run_command)
+        # Signals are passed on to the command
+        timer = threading.Thread(target=lambda: (wait_command(),
+                                 os.kill(os.getpid(), signal.SIGTERM)))
+        timer.start()
+        try:
+            self.assertEqual(self._forward(['gbp', 'config'])[0], 143)
+        finally:
+            timer.join()
+
+        # The command is killed when the client goes away
+        client = os.fork()
+        if not client:
+            self._forward(['gbp', 'config'])
+            os._exit(0)
+        pid = wait_command()
+        os.kill(client, signal.SIGKILL)
+        os.waitpid(client, 0)
+        self.assertTrue(self._wait_exit(pid))
+
+    def test_git_environment(self):
+        """Test that warm repositories are not used for other git dirs"""
+        repo2 = GitRepository.create(self.tmpdir.join('repo2'))
+
+        def run_command(argv):
+            sys.stdout.write(GitRepository(os.getcwd()).git_dir)
+            return 0
+
+        self._start_server(run_command)
+        os.chdir(self.repo.path)
+        self.assertEqual(self._forward(['gbp', 'config']),
+                         (0, self.repo.git_dir, ''))
+        os.environ['GIT_DIR'] = repo2.git_dir
+        try:
+            self.assertEqual(self._forward(['gbp', 'config']),
+                             (0, repo2.git_dir, ''))
+        finally:
+            del os.environ['GIT_DIR']
+
+    def test_warm_repository(self):
+        """Test that new repository objects adopt a warm repository"""
+        self.repo.commit_dir(self.tmpdir.join('repo'), 'initial', 'master',
+                             create_missing_branch=True)
+        GitRepository.set_warm(self.repo.path, self.repo)
+        try:
+            repo = GitRepository(self.repo.path)
+            self.assertEqual(repo.git_dir, self.repo.git_dir)
+            self.assertEqual(repo._refs, self.repo._ref_snapshot)
+            self.assertTrue(repo.has_branch('master'))
+        finally:
+            GitRepository.set_warm(self.repo.path, None)
+        self.assertEqual(GitRepository._warm, {})
+
+    def test_forget_repositories(self):
+        """Test that the server doesn't keep repositories forever"""
+        repo2 = GitRepository.create(self.tmpdir.join('repo2'))
+        repo3 = GitRepository.create(self.tmpdir.join('repo3'))
+        server = Server(self.socket, max_repos=2)
+        try:
+            for repo in (self.repo, repo2, repo3):
+                server._warm_repository(repo.path)
+            self.assertEqual(sorted(GitRepository._warm),
+                             [repo2.path, repo3.path])
+            shutil.rmtree(repo2.path)
+            server._warm_repository(self.tmpdir.path)
+            self.assertEqual(list(GitRepository._warm), [repo3.path])
+        finally:
+            for path in list(server._repos):
+                server._forget_repository(path)
+        self.assertEqual(GitRepository._warm, {})
+
+# vim:et:ts=4:sw=4:et:sts=4:ai:set list listchars=tab\:»·,trail\:·:
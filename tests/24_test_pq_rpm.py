@@ -0,0 +1,89 @@
+# vim: set fileencoding=utf-8 :
+# (C) 2026 agent <agent@local>
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""Test L{gbp.scripts.pq_rpm}"""
+
+from . import context
+
+import hashlib
+import os
+import subprocess
+# Try unittest2 for CentOS
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from gbp.scripts.pq_rpm import compress_patches
+
+
+class TestCompressPatches(unittest.TestCase):
+    """Test L{gbp.scripts.pq_rpm.compress_patches}"""
+
+    def setUp(self):
+        self.tmpdir = context.new_tmpdir(__name__)
+
+    def tearDown(self):
+        context.teardown()
+
+    def _write_patch(self, name, lines, mode, mtime):
+        """Create a patch file, return its path and content"""
+        path = self.tmpdir.join(name)
+        data = ''.join('+%d %s\n' % (i, hashlib.md5(str(i % 977)).hexdigest()
+                                              [:i % 23])
+                       for i in range(lines))
+        with open(path, 'w') as patch:
+            patch.write(data)
+        os.chmod(path, mode)
+        os.utime(path, (mtime, mtime))
+        return path, data
+
+    @staticmethod
+    def _gzip(data):
+        """Compress data with gzip -n"""
+        popen = subprocess.Popen(['gzip', '-n', '-c'], stdin=subprocess.PIPE,
+                                 stdout=subprocess.PIPE)
+        return popen.communicate(data)[0]
+
+    def test_compress_patches(self):
+        """Test that patches are compressed exactly like gzip -n does it"""
+        # Big enough for zlib's output to differ from gzip's
+        big1, data1 = self._write_patch('0001-big.patch', 20000, 0o640,
+                                        1400000000)
+        big2, data2 = self._write_patch('0002-big.patch', 10000, 0o600,
+                                        1300000000)
+        small, data3 = self._write_patch('0003-small.patch', 10, 0o644,
+                                         1200000000)
+
+        self.assertEqual(compress_patches([big1, big2, small], 1000),
+                         ['0001-big.patch.gz', '0002-big.patch.gz',
+                          '0003-small.patch'])
+        for path, data, mode, mtime in ((big1, data1, 0o640, 1400000000),
+                                        (big2, data2, 0o600, 1300000000)):
+            self.assertFalse(os.path.exists(path))
+            with open(path + '.gz') as compressed:
+                self.assertEqual(hashlib.sha1(compressed.read()).hexdigest(),
+                                 hashlib.sha1(self._gzip(data)).hexdigest())
+            info = os.stat(path + '.gz')
+            self.assertEqual(info.st_mode & 0o777, mode)
+            self.assertEqual(info.st_mtime, mtime)
+        with open(small) as patch:
+            self.assertEqual(patch.read(), data3)
+
+        # Nothing is compressed without a threshold
+        self.assertEqual(compress_patches([small]), ['0003-small.patch'])
+        self.assertFalse(os.path.exists(small + '.gz'))
+
+# vim:et:ts=4:sw=4:et:sts=4:ai:set list listchars=tab\:»·,trail\:·:
@@ -27,6 +27,7 @@ import subprocess
 from nose.tools import assert_raises, eq_, ok_ # pylint: disable=E0611
 
 from gbp.git import GitRepository
+from gbp.pkg import compressor_cmd
 from gbp.scripts.buildpackage_rpm import main as gbp_rpm
 from tests.component.rpm import RpmRepoTestBase, RPM_TEST_DATA_DIR
 from tests.testutils import ls_dir, ls_tar, ls_zip
@@ -321,6 +322,25 @@ class TestGbpRpm(RpmRepoTestBase):
         eq_(mock_gbp(['--git-orig-prefix=%(foo)s', '--git-no-build']), 1)
         self._check_log(-1, ".*Missing value 'foo' in")
 
+    def test_option_compression_threads(self):
+        """Test that parallel compression is only used on request"""
+        self.init_test_repo('gbp-test')
+
+        with mock.patch('gbp.scripts.buildpackage_rpm.compressor_cmd',
+                        wraps=compressor_cmd) as comp_cmd:
+            # Standard single-threaded compressor by default
+            eq_(mock_gbp([]), 0)
+            eq_(comp_cmd.call_args[0], ('bzip2', 1))
+            shutil.rmtree('../rpmbuild')
+
+            eq_(mock_gbp(['--git-compression-threads=4']), 0)
+            eq_(comp_cmd.call_args[0], ('bzip2', 4))
+            shutil.rmtree('../rpmbuild')
+
+            eq_(mock_gbp(['--git-compression-threads=4',
+                          '--git-deterministic-tarballs']), 0)
+            eq_(comp_cmd.call_args[0], ('bzip2', 1))
+
     def test_pristine_tar(self):
         """Test pristine-tar"""
         repo = self.init_test_repo('gbp-test')
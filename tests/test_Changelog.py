@@ -215,6 +215,57 @@ def test_parse_sections():
     '0.5.31'
     """
 
+def test_parse_dpkg_fallback():
+    """
+    Test that changelogs dpkg warns about are still parsed by dpkg
+
+    Methods tested:
+         - L{gbp.deb.changelog.ChangeLog.__init__}
+         - L{gbp.deb.changelog._TopEntry.parse}
+
+    >>> import gbp.deb.changelog
+    >>> contents = cl_upstream.replace('urgency=low', 'urgency=low, foo=bar')
+    >>> gbp.deb.changelog._TopEntry.parse(contents)
+    >>> cl = gbp.deb.changelog.ChangeLog(contents)
+    >>> cl.version
+    '1.0-1'
+    >>> cl['Urgency']
+    'low'
+    >>> gbp.deb.changelog.ChangeLog('garbage\\n') # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    ParseChangeLogError: Failed to parse changelog. dpkg-parsechangelog said:
+    ...
+    """
+
+def test_parse_closes():
+    """
+    Test the fields parsed from the header and the changes
+
+    >>> import gbp.deb.changelog
+    >>> cl = gbp.deb.changelog.ChangeLog(cl_debian)
+    >>> cl['Closes']
+    '645477'
+    >>> cl['Urgency']
+    'low'
+    >>> cl['Distribution']
+    'unstable'
+    >>> cl['Timestamp']
+    '1318839322'
+    """
+
+def test_parse_sections_lazily():
+    """
+    Test that sections are only parsed as far as they are iterated
+
+    >>> import gbp.deb.changelog
+    >>> cl = gbp.deb.changelog.ChangeLog(cl_debian + "garbage (\\n")
+    >>> next(cl.sections_iter).version
+    '0.5.32'
+    >>> [section.version for section in cl.sections]
+    ['0.5.32', '0.5.31']
+    """
+
 def test_add_section():
     """
     Test if we can add a section to an existant changelog
@@ -370,6 +370,177 @@ def test_get_obj_type():
     >>> repo.delete_tag("tag3")
     """
 
+def test_object_reader():
+    """
+    Look up objects through the persistent object reader
+
+    Methods tested:
+         - L{gbp.git.GitRepository.show}
+         - L{gbp.git.GitRepository.rev_parse}
+         - L{gbp.git.GitRepository.close}
+         - L{gbp.git.GitCatFile.info}
+         - L{gbp.git.GitCatFile.read}
+
+    >>> import gbp.git
+    >>> repo = gbp.git.GitRepository(repo_dir)
+    >>> sha1, obj_type, size = repo.object_reader.info('HEAD:testfile')
+    >>> obj_type
+    'blob'
+    >>> sha1, obj_type, data = repo.object_reader.read('HEAD:testfile')
+    >>> len(data) == size
+    True
+    >>> repo.show('HEAD:testfile') == data
+    True
+    >>> repo.object_reader.info('HEAD:doesnotexist')
+    >>> repo.object_reader.read('HEAD:no file')
+    >>> repo.get_obj_type('HEAD:no file')
+    Traceback (most recent call last):
+    ...
+    GitRepositoryError: Not a Git repository object: 'HEAD:no file'
+    >>> repo.rev_parse('HEAD:no file') # doctest:+ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    GitRepositoryError: ...
+    >>> repo.rev_parse('HEAD') == repo.rev_parse('HEAD', short=40)
+    True
+    >>> repo.show('HEAD:doesnotexist') # doctest:+ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    GitRepositoryError: can't get HEAD:doesnotexist: fatal: ...
+    >>> repo.close()
+    >>> repo.get_obj_type('HEAD')
+    'commit'
+    >>> repo.close()
+    """
+
+def test_refs():
+    """
+    Look up refs through the ref snapshot
+
+    Methods tested:
+         - L{gbp.git.GitRepository.get_ref}
+         - L{gbp.git.GitRepository.invalidate_refs}
+         - L{gbp.git.GitRepository.create_tag}
+         - L{gbp.git.GitRepository.delete_tag}
+         - L{gbp.git.GitRepository.create_branch}
+         - L{gbp.git.GitRepository.delete_branch}
+         - L{gbp.git.GitRepository.update_ref}
+
+    >>> import gbp.git, subprocess
+    >>> repo = gbp.git.GitRepository(repo_dir)
+    >>> head = repo.rev_parse('HEAD')
+    >>> repo.get_ref('refs/heads/master') == head
+    True
+    >>> repo.create_tag('reftag', msg='foo')
+    >>> repo.get_ref('refs/tags/reftag') == repo.rev_parse('reftag')
+    True
+    >>> repo._ref_commit('refs/tags/reftag') == head
+    True
+    >>> repo.get_tags('ref*')
+    ['reftag']
+    >>> repo.create_branch('refbranch')
+    >>> repo.has_branch('refbranch')
+    True
+    >>> repo.update_ref('refs/tags/reftree', 'reftag^{tree}')
+    >>> repo.get_ref('refs/tags/reftree') == repo.rev_parse('HEAD^{tree}')
+    True
+    >>> repo.delete_tag('reftree')
+    >>> repo.delete_branch('refbranch')
+    >>> repo.has_branch('refbranch')
+    False
+    >>> repo.delete_tag('reftag')
+    >>> repo.get_ref('refs/tags/reftag')
+    >>> subprocess.check_call(['git', 'tag', 'exttag'], cwd=repo.path)
+    0
+    >>> repo.has_tag('exttag')
+    False
+    >>> repo.invalidate_refs()
+    >>> repo.has_tag('exttag')
+    True
+    >>> repo.delete_tag('exttag')
+    >>> branch = repo.branch
+    >>> repo.add_remote_repo('dwim', repo.path)
+    >>> repo.update_ref('refs/remotes/dwim/dwimbranch', 'HEAD')
+    >>> repo.has_branch('dwimbranch')
+    False
+    >>> repo.set_branch('dwimbranch')
+    >>> repo.has_branch('dwimbranch')
+    True
+    >>> repo.set_branch(branch)
+    >>> repo.delete_branch('dwimbranch')
+    >>> repo.remove_remote_repo('dwim')
+    """
+
+def test_ref_transaction():
+    """
+    Update refs atomically
+
+    Methods tested:
+         - L{gbp.git.GitRepository.ref_transaction}
+         - L{gbp.git.GitRefTransaction.update}
+         - L{gbp.git.GitRefTransaction.delete}
+         - L{gbp.git.GitRefTransaction.create_tag}
+         - L{gbp.git.GitRefTransaction.commit}
+
+    >>> import gbp.git
+    >>> repo = gbp.git.GitRepository(repo_dir)
+    >>> head = repo.rev_parse('HEAD')
+    >>> with repo.ref_transaction('test') as trans:
+    ...     trans.update('refs/heads/transbranch', head, '')
+    ...     trans.create_tag('transtag', head, 'A message')
+    ...     trans.create_tag('translight', head)
+    ...     trans.get('refs/heads/transbranch') == head
+    True
+    >>> repo.has_branch('transbranch')
+    True
+    >>> repo.get_obj_type('transtag')
+    'tag'
+    >>> repo.get_obj_type('translight')
+    'commit'
+    >>> repo.rev_parse('transtag^0') == head
+    True
+    >>> trans = repo.ref_transaction()
+    >>> trans.delete('refs/tags/translight')
+    >>> trans.create_tag('transtag', head)
+    >>> trans.commit()
+    Traceback (most recent call last):
+    ...
+    GitRepositoryError: Failed to update refs: fatal: cannot lock ref 'refs/tags/transtag': reference already exists
+    >>> repo.invalidate_refs()
+    >>> repo.has_tag('translight')
+    True
+    >>> repo.move_tag('translight', 'transmoved')
+    >>> repo.has_tag('translight'), repo.has_tag('transmoved')
+    (False, True)
+    >>> with repo.ref_transaction() as trans:
+    ...     trans.delete('refs/heads/transbranch')
+    ...     trans.delete('refs/tags/transtag')
+    ...     trans.delete('refs/tags/transmoved', head)
+    >>> repo.get_tags('trans*'), repo.has_branch('transbranch')
+    ([], False)
+    """
+
+def test_archive():
+    """
+    Create archives
+
+    Methods tested:
+         - L{gbp.git.GitRepository.archive}
+
+    >>> import gbp.git, os, tempfile
+    >>> repo = gbp.git.GitRepository(repo_dir)
+    >>> data = ''.join(repo.archive('tar', 'foo/', None, 'HEAD'))
+    >>> tmp = tempfile.TemporaryFile()
+    >>> repo.archive('tar', 'foo/', tmp, 'HEAD')
+    >>> _pos = tmp.seek(0)
+    >>> tmp.read() == data
+    True
+    >>> repo.archive('tar', 'foo/', tmp, 'doesnotexist') # doctest:+ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    GitRepositoryError: Unable to archive doesnotexist: fatal: ...
+    """
+
 def test_list_files():
     """
     List files in the index
@@ -480,6 +651,36 @@ def test_get_commit_info():
     'foo'
     """
 
+def test_get_commits_info():
+    """
+    Test inspecting a range of commits at once
+
+    Methods tested:
+         - L{gbp.git.GitRepository.get_commits_info}
+
+    >>> import gbp.git
+    >>> repo = gbp.git.GitRepository(repo_dir)
+    >>> commits = repo.get_commits()
+    >>> infos = repo.get_commits_info()
+    >>> [info['id'] for info in infos] == commits
+    True
+    >>> for commit, info in zip(commits, infos):
+    ...     single = repo.get_commit_info(commit)
+    ...     single['id'] = commit
+    ...     single['author'] = single['author'].get_author_env()
+    ...     single['committer'] = single['committer'].get_committer_env()
+    ...     info['author'] = info['author'].get_author_env()
+    ...     info['committer'] = info['committer'].get_committer_env()
+    ...     assert single == info, (single, info)
+    >>> infos = repo.get_commits_info(since='HEAD^', paths=['testfile'])
+    >>> len(infos)
+    1
+    >>> infos[0]['files']                           # doctest:+ELLIPSIS
+    defaultdict(<... 'list'>, {'M': ['testfile']})
+    >>> repo.get_commits_info(since='HEAD', until='HEAD')
+    []
+    """
+
 def test_diff():
     """
     Test git-diff
@@ -501,6 +702,32 @@ def test_diff():
     True
     """
 
+def test_diff_commits():
+    """
+    Test diffing several commits with one git process
+
+    Methods tested:
+         - L{gbp.git.GitRepository.diff_commits}
+
+    >>> import gbp.git
+    >>> repo = gbp.git.GitRepository(repo_dir)
+    >>> commits = ['HEAD', 'HEAD~1']
+    >>> diffs = list(repo.diff_commits(commits, stat=80, summary=True,
+    ...                                text=True))
+    >>> [commit for commit, diff in diffs] == commits
+    True
+    >>> diffs[0][1] == repo.diff('HEAD^!', stat=80, summary=True, text=True)
+    True
+    >>> list(repo.diff_commits(['HEAD']))[0][1] == repo.diff('HEAD^!')
+    True
+    >>> list(repo.diff_commits([]))
+    []
+    >>> list(repo.diff_commits(['doesnotexist']))
+    Traceback (most recent call last):
+    ...
+    GitRepositoryError: revision 'doesnotexist^0' not found
+    """
+
 def test_diff_status():
     """
     Methods tested:
@@ -19,6 +19,7 @@ from . import context
 
 import glob
 import os
+import subprocess
 import tarfile
 import tempfile
 # Try unittest2 for CentOS
@@ -28,8 +29,9 @@ except ImportError:
     import unittest
 
 from gbp.errors import GbpError
+from gbp.git import GitRepository
 from gbp.pkg import UpstreamSource
-from gbp.scripts.common.import_orig import prepare_sources
+from gbp.scripts.common.import_orig import prepare_sources, import_sources
 from gbp.scripts.import_orig import find_source
 from tests.testutils import ls_dir, ls_tar
 
@@ -192,3 +194,70 @@ class TestPrepareSources(TestImportOrigBase):
         self.assertEqual(orig_ref, ls_dir(orig))
         self.assertEqual(prist_ref, ls_tar(prist))
 
+
+
+class TestImportSources(TestImportOrigBase):
+    """Test the import_sources() function"""
+
+    @classmethod
+    def setup_class(cls):
+        """Class set-up, run only once"""
+        super(TestImportSources, cls).setup_class()
+        cls._origs = TestPrepareSources._create_test_sources(cls._tmpdir)
+        srcdir = cls._origs['dir']
+        os.symlink('__init__.py', os.path.join(srcdir, 'link'))
+        os.link(os.path.join(srcdir, 'log.py'),
+                os.path.join(srcdir, 'hardlink'))
+        os.chmod(os.path.join(srcdir, 'pkg', '__init__.py'), 0o755)
+        os.makedirs(os.path.join(srcdir, 'empty', 'dir'))
+        subprocess.check_call(['tar', '-C', cls._tmpdir, '-czf',
+                               cls._origs['tar'], 'test-1.0'])
+        archive_fn = os.path.join(cls._tmpdir, 'test-1.0.tar.xz')
+        subprocess.check_call(['tar', '-C', cls._tmpdir, '-cJf', archive_fn,
+                               './test-1.0'])
+        cls._origs['tar.xz'] = archive_fn
+        archive_fn = os.path.join(cls._tmpdir, 'test-1.0.zip')
+        subprocess.check_call(['zip', '-q', '-r', '-y', archive_fn,
+                               'test-1.0'], cwd=cls._tmpdir)
+        cls._origs['zip'] = archive_fn
+        cls._repo = GitRepository.create(os.path.join(cls._tmpdir, 'repo'))
+
+    def _check_tree(self, source, filters):
+        """Compare import_sources() with committing unpacked sources"""
+        tmpdir = tempfile.mkdtemp(dir=self._tmpdir, prefix='import_')
+        tree, prist = import_sources(self._repo, source, 'test', '1.0', None,
+                                     filters, False, None, tmpdir)
+        unpacked = os.path.join(self._tmpdir, 'test-1.0')
+        if filters:
+            filtered = os.path.join(tmpdir, 'filtered')
+            subprocess.check_call(['cp', '-a', unpacked, filtered])
+            for fname in filters:
+                subprocess.check_call(['rm', '-rf',
+                                       os.path.join(filtered, fname)])
+            unpacked = filtered
+        self.assertEqual(self._repo.list_tree(tree, recurse=True),
+                         self._repo.list_tree(
+                            self._repo.create_tree(unpacked), recurse=True))
+        self.assertEqual(prist, '')
+
+    def test_tar(self):
+        """Import tarballs without unpacking"""
+        for fmt in ('tar', 'tar.xz'):
+            source = UpstreamSource(self._origs[fmt])
+            self._check_tree(source, None)
+            self._check_tree(source, ['pkg', 'log.py'])
+
+    def test_zip(self):
+        """Import zip archive without unpacking"""
+        source = UpstreamSource(self._origs['zip'])
+        self._check_tree(source, None)
+        self._check_tree(source, ['pkg'])
+
+    def test_pristine(self):
+        """Import tarball with pristine-tar prefix mangling"""
+        tmpdir = tempfile.mkdtemp(dir=self._tmpdir, prefix='pristine_')
+        source = UpstreamSource(self._origs['tar.xz'])
+        _tree, prist = import_sources(self._repo, source, 'test', '1.0',
+                                      'test.tar.gz', None, False, 'np',
+                                      tmpdir)
+        self.assertTrue('np/hardlink' in ls_tar(prist))
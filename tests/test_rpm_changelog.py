@@ -169,6 +169,37 @@ class TestChangelogParser(object):
         # Check that re-creating section doesn't mangle it
         eq_(str(section), changelog.sections[0])
 
+    def test_modify_changelog(self):
+        """Test that only modified sections are re-created"""
+        changelog = self.parser.raw_parse_string(self.cl_default_style)
+        sections = self.cl_default_style.split('\n\n')
+        eq_(changelog.sections[1], sections[1] + '\n\n')
+        eq_(changelog.sections[-1], sections[2])
+
+        # Replace the topmost section by a parsed one and modify it
+        section = self.parser.parse_section(changelog.sections[0])
+        changelog.sections[0] = section
+        eq_([str(entry) for entry in section.entries],
+            ["- Version bump\n", "- Drop foo.patch\n"])
+        section.append_entry(changelog.create_entry(author="John Doe",
+                                                    text=["- Bug fix"]))
+        changelog.add_section(time=datetime(2014, 1, 30), name="Jane Doe",
+                              email="j@doe.com", revision="0.4")
+        eq_(len(changelog.sections), 4)
+        eq_(str(changelog),
+            "* Thu Jan 30 2014 Jane Doe <j@doe.com> 0.4\n\n" +
+            self.cl_default_style.replace("foo.patch\n",
+                                          "foo.patch\n- Bug fix\n"))
+
+    def test_parse_line_endings(self):
+        """Test that line endings are normalized"""
+        changelog = self.parser.raw_parse_string(
+                        self.cl_default_style.replace('\n', '\r\n'))
+        eq_(str(changelog), self.cl_default_style)
+        changelog = self.parser.raw_parse_string(
+                        self.cl_default_style.rstrip())
+        eq_(str(changelog), self.cl_default_style)
+
     def test_parse_authors(self):
         """Test parsing of authors from changelog entries"""
         section = self.parser.parse_section(self.cl_with_authors)